@@ -0,0 +1,233 @@
+"""
+Import performance benchmarks
+
+Generates synthetic cards and measures discovery latency, import throughput, attach-to-first-byte latency
+and how much of imported data is left in page cache.
+Results are printed as JSON, so runs of different releases can be compared with --baseline.
+
+    python -m benchmarks.bench --scale 0.1 --output results.json
+"""
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchmarks import fixtures
+from dvrmanager.catalog import Catalog
+from dvrmanager.dedup import BlobStore
+from dvrmanager.engine import Engine
+from dvrmanager.fs import FSManager
+from dvrmanager.index import ImportIndex
+from dvrmanager.journal import TransferJournal
+from dvrmanager.metrics import MetricsRecorder
+from dvrmanager.retention import Retention, RetentionIndex
+from dvrmanager.settings import ExportItem, Settings, SettingsStore
+
+DRIVE_NAME = 'BENCH_CARD'
+
+
+class DirectoryFS(FSManager):
+    """
+    Presents a plain directory as an attached drive
+    """
+
+    def __init__(self, root: Path):
+        self._root = root
+
+    def drive_path(self, drive_name: str) -> Optional[Path]:
+        return self._root
+
+    def drive_exists(self, drive_name: str) -> bool:
+        return self._root.exists()
+
+    def unmount(self, drive_name: str):
+        pass
+
+
+def summarize(samples: List[float]) -> Optional[Dict[str, Any]]:
+    if not samples:
+        return None
+    return {
+        'median': statistics.median(samples),
+        'min': min(samples),
+        'max': max(samples),
+        'samples': samples,
+    }
+
+
+def bench_find_matches(card: Path, layout: fixtures.Layout) -> float:
+    fs = DirectoryFS(card)
+    fixtures.drop_cache(card)
+    start = time.perf_counter()
+    found = sum(1 for _ in fs.find_matches(DRIVE_NAME, Path(layout.pattern)))
+    elapsed = time.perf_counter() - start
+    assert found == layout.files, f'{layout.name}: found {found} files, expected {layout.files}'
+    return elapsed
+
+
+def bench_import(card: Path, layout: fixtures.Layout, workdir: Path, verify: bool, drop_cache: bool = True,
+                 direct_io: bool = False) -> Dict[str, float]:
+    target = Path(tempfile.mkdtemp(prefix='target-', dir=workdir))
+    settings = Settings(
+        target_directory=target,
+        export_items=(ExportItem(
+            drive_name=DRIVE_NAME, drive_path=Path(layout.pattern), delete=False, unmount=False, verify=verify,
+        ),),
+        progress_interval=0,
+        min_free_space=0,
+        drop_cache=drop_cache,
+        direct_io=direct_io,
+    )
+    index = ImportIndex(target.with_suffix('.sqlite3'))
+    metrics = MetricsRecorder(target.with_suffix('.stats'))
+    catalog = Catalog(target.with_suffix('.catalog'))
+    retention = Retention(RetentionIndex(target.with_suffix('.retention')))
+    blob_store = BlobStore(target.with_suffix('.blobs'))
+    journal = TransferJournal(target.with_suffix('.journal'))
+    engine = Engine(
+        SettingsStore(settings), fs=DirectoryFS(card), index=index, metrics=metrics, catalog=catalog,
+        retention=retention, blob_store=blob_store, journal=journal,
+    )
+    first_byte: List[float] = []
+
+    def on_bytes(path: str, done: int, total: int):
+        if done and not first_byte:
+            first_byte.append(time.perf_counter())
+
+    fixtures.drop_cache(card)
+    try:
+        resident_before = fixtures.resident_bytes([card, target])
+        cache_before = fixtures.page_cache_bytes()
+        start = time.perf_counter()
+        attached, _ = engine.scan_drives()
+        job = engine.create_job(attached[0])
+        job.bytes_progress = on_bytes
+        job.run()
+        elapsed = time.perf_counter() - start
+        # Card and imported files left in page cache, and growth of the whole page cache, which is noisy
+        resident_after = fixtures.resident_bytes([card, target])
+        cache_after = fixtures.page_cache_bytes()
+    finally:
+        engine.shutdown(wait=True)
+        index.close()
+        catalog.close()
+        retention.index.close()
+        blob_store.close()
+        journal.close()
+        shutil.rmtree(target, ignore_errors=True)
+        target.with_suffix('.sqlite3').unlink()
+        shutil.rmtree(target.with_suffix('.stats'), ignore_errors=True)
+        for path in [*workdir.glob(target.name + '.catalog*'), *workdir.glob(target.name + '.retention*'),
+                     *workdir.glob(target.name + '.blobs*'), *workdir.glob(target.name + '.journal*')]:
+            path.unlink()
+
+    return {
+        'seconds': elapsed,
+        'mb_per_s': layout.bytes / elapsed / 1e6,
+        'first_byte_seconds': first_byte[0] - start if first_byte else None,
+        'resident_before_mb': resident_before / 1e6 if resident_before is not None else None,
+        'resident_after_mb': resident_after / 1e6 if resident_after is not None else None,
+        'page_cache_growth_mb': (cache_after - cache_before) / 1e6 if cache_before is not None else None,
+    }
+
+
+def run(layouts: List[str], scale: float, repeat: int, workdir: Path, verify: bool, drop_cache: bool = True,
+        direct_io: bool = False) -> Dict[str, Any]:
+    results = []
+    for name in layouts:
+        card = Path(tempfile.mkdtemp(prefix=f'card-{name}-', dir=workdir))
+        try:
+            layout = fixtures.create_card(card, name, scale)
+            discovery = [bench_find_matches(card, layout) for _ in range(repeat)]
+            imports = [bench_import(card, layout, workdir, verify, drop_cache, direct_io) for _ in range(repeat)]
+        finally:
+            shutil.rmtree(card, ignore_errors=True)
+
+        results.append({
+            'layout': name,
+            'files': layout.files,
+            'bytes': layout.bytes,
+            'find_matches_seconds': summarize(discovery),
+            'import_seconds': summarize([i['seconds'] for i in imports]),
+            'import_mb_per_s': summarize([i['mb_per_s'] for i in imports]),
+            'first_byte_seconds': summarize([i['first_byte_seconds'] for i in imports if i['first_byte_seconds']]),
+            **{
+                metric: summarize([i[metric] for i in imports if i[metric] is not None])
+                for metric in ('resident_before_mb', 'resident_after_mb', 'page_cache_growth_mb')
+            },
+        })
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'scale': scale,
+            'repeat': repeat,
+            'verify': verify,
+            'drop_cache': drop_cache,
+            'direct_io': direct_io,
+        },
+        'results': results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """
+    Return relative change of median of each metric against baseline, per layout
+    """
+    changes: Dict[str, Dict[str, float]] = {}
+    baseline_results = {r['layout']: r for r in baseline['results']}
+    for result in current['results']:
+        base = baseline_results.get(result['layout'])
+        if base is None:
+            continue
+        changes[result['layout']] = {
+            metric: result[metric]['median'] / base[metric]['median'] - 1
+            for metric, value in result.items()
+            if isinstance(value, dict) and (base.get(metric) or {}).get('median')
+        }
+    return changes
+
+
+def parse_args(args: List[str] = None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench')
+    parser.add_argument('--layout', action='append', choices=sorted(fixtures.LAYOUTS), help='Layouts to run, all by default')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplier for file counts and sizes')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workdir', type=Path, default=None, help='Directory for cards and targets, e.g. a loopback mount')
+    parser.add_argument('--verify', action='store_true', help='Import with checksum verification')
+    parser.add_argument('--keep-cache', action='store_true', help='Leave copied data in page cache, as before')
+    parser.add_argument('--direct-io', action='store_true', help='Copy with O_DIRECT')
+    parser.add_argument('--output', type=Path, default=None, help='Write results to file instead of stdout')
+    parser.add_argument('--baseline', type=Path, default=None, help='Results of previous run to compare with')
+    return parser.parse_args(args)
+
+
+def main(args: List[str] = None):
+    args = parse_args(args)
+    workdir = args.workdir or Path(tempfile.gettempdir())
+    results = run(args.layout or list(fixtures.LAYOUTS), args.scale, args.repeat, workdir, args.verify,
+                  not args.keep_cache, args.direct_io)
+
+    if args.baseline:
+        results['baseline'] = {
+            'file': str(args.baseline),
+            'relative_change': compare(results, json.loads(args.baseline.read_text())),
+        }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Synthetic DVR card layouts
+"""
+import ctypes
+import mmap
+import os
+import random
+import sys
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional
+
+_BLOCK_SIZE = 1024 * 1024
+
+
+class Layout(NamedTuple):
+    name: str
+    pattern: str
+    files: int
+    bytes: int
+
+
+def _write_file(path: Path, size: int, block: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining:
+            chunk = min(remaining, len(block))
+            f.write(block[:chunk])
+            remaining -= chunk
+
+
+def many_small_files(root: Path, scale: float, block: bytes, rng: random.Random) -> Layout:
+    """
+    Thousands of small GPS/log/thumbnail files next to a few short segments
+    """
+    count = max(1, int(5000 * scale))
+    total = 0
+    for i in range(count):
+        size = rng.randint(4 * 1024, 64 * 1024)
+        _write_file(root / 'DCIM' / f'{i:06d}.jpg', size, block)
+        total += size
+    for i in range(max(1, count // 100)):
+        _write_file(root / 'GPS' / f'{i:06d}.log', 1024, block)
+    return Layout('many_small_files', 'DCIM/*.jpg', count, total)
+
+
+def huge_segments(root: Path, scale: float, block: bytes, rng: random.Random) -> Layout:
+    """
+    Few multi-hundred-megabyte AVI segments
+    """
+    count = 4
+    size = max(_BLOCK_SIZE, int(256 * 1024 * 1024 * scale))
+    for i in range(count):
+        _write_file(root / 'DCIM' / f'SEG{i:04d}.avi', size, block)
+    return Layout('huge_segments', 'DCIM/*.avi', count, count * size)
+
+
+def deep_tree(root: Path, scale: float, block: bytes, rng: random.Random, depth: int = 6, fanout: int = 3) -> Layout:
+    """
+    Segments spread over a deep directory tree with unrelated files along the way
+    """
+    size = max(64 * 1024, int(4 * 1024 * 1024 * scale))
+    count = 0
+
+    def fill(directory: Path, level: int):
+        nonlocal count
+        _write_file(directory / 'index.dat', 512, block)
+        if level == depth:
+            _write_file(directory / f'{count:06d}.avi', size, block)
+            count += 1
+            return
+        for i in range(fanout):
+            fill(directory / f'd{i}', level + 1)
+
+    fill(root / 'DCIM', 0)
+    return Layout('deep_tree', '**/*.avi', count, count * size)
+
+
+LAYOUTS = {
+    'many_small_files': many_small_files,
+    'huge_segments': huge_segments,
+    'deep_tree': deep_tree,
+}
+
+
+def create_card(root: Path, layout: str, scale: float = 1.0, seed: int = 0) -> Layout:
+    """
+    Create card with given layout under `root`. Content is generated from a fixed seed,
+    so every run copies the same data.
+    """
+    rng = random.Random(seed)
+    block = bytes(rng.getrandbits(8) for _ in range(_BLOCK_SIZE))
+    return LAYOUTS[layout](root, scale, block, rng)
+
+
+def drop_cache(root: Path):
+    """
+    Evict card files from page cache, so reads hit the device instead of memory
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    for directory, _, files in os.walk(root):
+        for name in files:
+            fd = os.open(os.path.join(directory, name), os.O_RDONLY)
+            try:
+                os.fdatasync(fd)
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+
+def resident_bytes(roots: Iterable[Path]) -> Optional[int]:
+    """
+    Return how much of files under `roots` is in page cache, or None where mincore(2) is not available
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    libc = ctypes.CDLL(None, use_errno=True)
+    page_size = mmap.PAGESIZE
+    resident = 0
+    for root in roots:
+        for directory, _, files in os.walk(root):
+            for name in files:
+                with open(os.path.join(directory, name), 'rb') as f:
+                    size = os.fstat(f.fileno()).st_size
+                    if not size:
+                        continue
+                    # Private mapping is writable for ctypes, and pages are not read by mapping them
+                    with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_COPY) as mapping:
+                        pages = (size + page_size - 1) // page_size
+                        vector = (ctypes.c_ubyte * pages)()
+                        address = ctypes.addressof(ctypes.c_char.from_buffer(mapping))
+                        if libc.mincore(ctypes.c_void_p(address), ctypes.c_size_t(size), vector) != 0:
+                            return None
+                        resident += sum(page & 1 for page in vector) * page_size
+    return resident
+
+
+def page_cache_bytes() -> Optional[int]:
+    """
+    Return size of page cache of the whole system, or None where /proc/meminfo is not available
+    """
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('Cached:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
@@ -1,16 +1,45 @@
+import argparse
+import multiprocessing
+
 from dvrmanager import logs
-from dvrmanager.application import application
 from dvrmanager.settings import Settings
-from dvrmanager.window import MainWindow
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='dvrmanager')
+    parser.add_argument('--headless', action='store_true', help='Import drives without starting UI')
+    parser.add_argument('--label', default='', help='Export label used in headless mode and plans')
+    parser.add_argument('--plan', nargs='*', metavar='DRIVE',
+                        help='Dry run: show what importing attached drives would copy and how long it would take')
+    parser.add_argument('--json', action='store_true', help='Print plan with its files as JSON')
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
     logs.configure()
     settings = Settings.load()
+
+    if args.plan is not None:
+        from dvrmanager import daemon
+        daemon.plan(settings, args.label, args.plan, args.json)
+        return
+
+    if args.headless:
+        from dvrmanager import daemon
+        daemon.run(settings, args.label)
+        return
+
+    # Qt is imported only when UI is requested
+    from dvrmanager.application import application
+    from dvrmanager.window import MainWindow
+
     with application() as app:
         window = MainWindow(app, settings)
         window.show()
 
 
 if __name__ == '__main__':
+    # Catalog metadata is parsed in worker processes, which frozen executable has to support
+    multiprocessing.freeze_support()
     main()
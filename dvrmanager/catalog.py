@@ -0,0 +1,155 @@
+"""
+Catalog of imported footage
+"""
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional
+
+from dvrmanager import config, riff
+
+logger = logging.getLogger(__name__)
+
+
+class FootageEntry(NamedTuple):
+    path: str
+    drive: str
+    label: str
+    recorded_at: float
+    duration: Optional[float]
+    width: Optional[int]
+    height: Optional[int]
+    size: int
+
+
+class Catalog:
+    """
+    SQLite catalog of archived files, indexed by recording time, drive and label.
+    A `read_only` catalog only queries a catalog created by another process, without writing to it.
+    """
+
+    def __init__(self, path: Path = None, read_only: bool = False):
+        self._path = path or self.default_path()
+        self._lock = threading.Lock()
+        if read_only:
+            self._connection = sqlite3.connect(
+                f'{self._path.absolute().as_uri()}?mode=ro', uri=True, check_same_thread=False,
+            )
+            return
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self._path), check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(
+            'CREATE TABLE IF NOT EXISTS footage ('
+            'path TEXT PRIMARY KEY, '
+            'drive TEXT NOT NULL, '
+            'label TEXT NOT NULL, '
+            'recorded_at REAL NOT NULL, '
+            'duration REAL, '
+            'width INTEGER, '
+            'height INTEGER, '
+            'size INTEGER NOT NULL, '
+            'cataloged_at REAL NOT NULL);'
+            'CREATE INDEX IF NOT EXISTS footage_recorded_at ON footage (recorded_at);'
+            'CREATE INDEX IF NOT EXISTS footage_drive ON footage (drive, recorded_at);'
+            'CREATE INDEX IF NOT EXISTS footage_label ON footage (label, recorded_at);'
+        )
+        self._connection.commit()
+
+    @staticmethod
+    def default_path() -> Path:
+        return config.APP_DATA_DIR / 'catalog.sqlite3'
+
+    def add(self, entries: Iterable[FootageEntry]):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO footage '
+                '(path, drive, label, recorded_at, duration, width, height, size, cataloged_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (tuple(entry) + (now,) for entry in entries)
+            )
+
+    def query(self, drive: str = None, label: str = None, start: float = None, end: float = None,
+              limit: int = 1000) -> List[FootageEntry]:
+        """
+        Return footage recorded in [start, end) time range, optionally only from given drive and label,
+        ordered by recording time
+        """
+        conditions, params = [], []
+        for column, value in (('drive', drive), ('label', label)):
+            if value:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        if start is not None:
+            conditions.append('recorded_at >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('recorded_at < ?')
+            params.append(end)
+
+        where = f'WHERE {" AND ".join(conditions)} ' if conditions else ''
+        with self._lock:
+            rows = self._connection.execute(
+                f'SELECT {", ".join(FootageEntry._fields)} FROM footage {where}ORDER BY recorded_at LIMIT ?',
+                params + [limit],
+            ).fetchall()
+        return [FootageEntry(*row) for row in rows]
+
+    def remove(self, directory: Path):
+        """
+        Remove all footage stored under `directory`
+        """
+        prefix = str(Path(directory) / '_')[:-1]
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM footage WHERE substr(path, 1, ?) = ?', (len(prefix), prefix))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class CatalogIndexer:
+    """
+    Parses imported files metadata in a process pool and adds them to catalog
+    """
+
+    def __init__(self, catalog: Catalog, max_workers: int = None):
+        self._catalog = catalog
+        self._max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def submit(self, drive: str, label: str, paths: Iterable[Path]):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+            for path in paths:
+                future = self._executor.submit(riff.parse_file, path)
+                future.add_done_callback(lambda f, path=path: self._on_parsed(drive, label, path, f))
+
+    def _on_parsed(self, drive: str, label: str, path: Path, future: Future):
+        try:
+            metadata = future.result()
+            self._catalog.add([FootageEntry(
+                path=str(path),
+                drive=drive,
+                label=label,
+                recorded_at=metadata.get('recorded_at') or metadata['mtime'],
+                duration=metadata.get('duration'),
+                width=metadata.get('width'),
+                height=metadata.get('height'),
+                size=metadata['size'],
+            )])
+        except:
+            logger.exception(f'Error cataloging {path}')
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
@@ -0,0 +1,98 @@
+"""
+Session containers: small files of one import stored in a single tar
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import tarfile
+import threading
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+CONTAINER_NAME = 'small-files.tar'
+
+
+class ContainerEntry(NamedTuple):
+    name: str
+    offset: int
+    size: int
+    mtime: float
+    digest: Optional[str]
+
+
+class SessionContainer:
+    """
+    Append-only uncompressed tar of small files, with JSON lines index of member data offsets next to it,
+    so a member can be read without walking the archive. Members may be added from any thread.
+    """
+
+    def __init__(self, path: Path, hash_name: Optional[str] = None):
+        self.path = path
+        self.index_path = path.with_name(path.name + '.index.jsonl')
+        self._hash_name = hash_name
+        self._lock = threading.Lock()
+        self._entries: List[ContainerEntry] = []
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._tar = tarfile.open(path, 'a', format=tarfile.PAX_FORMAT)
+
+    @property
+    def entries(self) -> List[ContainerEntry]:
+        return list(self._entries)
+
+    def add(self, name: str, data: bytes, stat: os.stat_result) -> ContainerEntry:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = stat.st_mtime
+        info.mode = stat.st_mode & 0o777
+        digest = hashlib.new(self._hash_name, data).hexdigest() if self._hash_name else None
+
+        with self._lock:
+            self._tar.addfile(info, io.BytesIO(data))
+            # Member data is padded to a block and followed by nothing else yet
+            padded_size = -(-info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+            entry = ContainerEntry(name, self._tar.offset - padded_size, info.size, info.mtime, digest)
+            self._entries.append(entry)
+        return entry
+
+    def close(self, verify: bool = False) -> List[ContainerEntry]:
+        """
+        Finish container and write its index. If `verify` is set, members are read back from disk and
+        entries whose data does not match their digest are returned.
+        """
+        with self._lock:
+            self._tar.close()
+            with open(self.index_path, 'a') as f:
+                for entry in self._entries:
+                    f.write(json.dumps(entry._asdict()) + '\n')
+            return self._verify() if verify else []
+
+    def _verify(self) -> List[ContainerEntry]:
+        failed = []
+        with open(self.path, 'rb', buffering=0) as f:
+            # Read back from device, not from page cache
+            if hasattr(os, 'posix_fadvise'):
+                os.fsync(f.fileno())
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            for entry in self._entries:
+                f.seek(entry.offset)
+                data = f.read(entry.size)
+                if len(data) != entry.size or hashlib.new(self._hash_name, data).hexdigest() != entry.digest:
+                    failed.append(entry)
+        return failed
+
+
+def read_index(path: Path) -> List[ContainerEntry]:
+    """
+    Return entries of container at `path`, later entries of the same name replace earlier ones
+    """
+    index_path = path.with_name(path.name + '.index.jsonl')
+    entries = {}
+    with open(index_path) as f:
+        for line in f:
+            entry = ContainerEntry(**json.loads(line))
+            entries[entry.name] = entry
+    return list(entries.values())
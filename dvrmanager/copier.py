@@ -0,0 +1,573 @@
+"""
+File copy engines
+"""
+import contextlib
+import errno
+import hashlib
+import logging
+import mmap
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from dvrmanager.fs import (SYNC_FILE_RANGE_WAIT_AFTER, SYNC_FILE_RANGE_WAIT_BEFORE, SYNC_FILE_RANGE_WRITE,
+                           fallocate, sync_directory, sync_file_range)
+from dvrmanager.throttle import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[int, int], None]
+#: Called with copied size and digest of copied data once it is flushed to disk
+CheckpointCallback = Callable[[int, Optional[str]], None]
+
+# Errors meaning that preallocation is not supported by destination filesystem
+_PREALLOCATE_UNSUPPORTED = {errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL, errno.ENOSYS}
+
+# Errors meaning that kernel-side copy is not supported for this pair of files
+_KERNEL_COPY_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ENOTSUP}
+
+# Errors meaning that O_DIRECT is not supported by filesystem or device
+_DIRECT_IO_UNSUPPORTED = {errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+#: Bytes of a streamed file kept in page cache behind the copy position
+CACHE_WINDOW = 32 * 1024 * 1024
+
+
+class CopyResult(NamedTuple):
+    size: int
+    digest: Optional[str] = None
+
+
+class ResumePoint(NamedTuple):
+    """
+    Size of partially copied data known to be on disk and digest of that data
+    """
+    offset: int
+    digest: Optional[str] = None
+
+
+class VerificationError(Exception):
+    pass
+
+
+def partial_path(path: Path) -> Path:
+    """
+    Return path file is written to until it is copied completely
+    """
+    return path.with_name(f'.{path.name}.part')
+
+
+class _CacheDropper:
+    """
+    Evicts pages of a streamed file from page cache behind the copy position, so copying a large file
+    does not push data of other programs out of memory.
+
+    Writeback of written data is started asynchronously once a window of it accumulates, and pages are dropped
+    a window later, by when their writeback has mostly completed, so copying rarely waits for the disk.
+    """
+
+    def __init__(self, fd: int, written: bool, start: int = 0, window: int = CACHE_WINDOW):
+        self._fd: Optional[int] = fd
+        self._written = written
+        self._window = window
+        self._flushing = start
+        self._dropped = start
+
+    def __call__(self, position: int, final: bool = False):
+        if self._fd is None or (not final and position - self._flushing < self._window):
+            return
+        try:
+            if self._written:
+                # Writeback of pages before `self._flushing` was started by previous call
+                end = position if final else self._flushing
+                if position > self._flushing:
+                    sync_file_range(self._fd, self._flushing, position - self._flushing, SYNC_FILE_RANGE_WRITE)
+                if end > self._dropped and not sync_file_range(
+                    self._fd, self._dropped, end - self._dropped,
+                    SYNC_FILE_RANGE_WAIT_BEFORE | SYNC_FILE_RANGE_WRITE | SYNC_FILE_RANGE_WAIT_AFTER,
+                ):
+                    _fdatasync(self._fd)
+            else:
+                # Read pages are clean and can be dropped right away
+                end = position
+            if end > self._dropped:
+                os.posix_fadvise(self._fd, self._dropped, end - self._dropped, os.POSIX_FADV_DONTNEED)
+            self._dropped = end
+            self._flushing = position
+        except OSError as e:
+            logger.debug(f'Not dropping cached pages of file {self._fd}: {e}')
+            self._fd = None
+
+
+def _cache_droppers(fds: Sequence[int], written: bool, start: int) -> List[_CacheDropper]:
+    if not hasattr(os, 'posix_fadvise'):
+        return []
+    return [_CacheDropper(fd, written, start) for fd in fds]
+
+
+class _Progress:
+    """
+    Called after every copied chunk: waits for bandwidth limiter, drops copied data from page cache,
+    reports progress at most once per `interval` and calls `checkpoint` every `checkpoint_size` bytes
+    """
+
+    def __init__(self, callback: Optional[ProgressCallback], total: int, interval: float,
+                 limiter: Optional[TokenBucket] = None, start: int = 0,
+                 checkpoint: Optional[Callable[[int], None]] = None, checkpoint_size: int = 0,
+                 droppers: Sequence[_CacheDropper] = ()):
+        self._callback = callback
+        self._total = total
+        self._interval = interval
+        self._limiter = limiter
+        self._last = 0.0
+        self._done = start
+        self.checkpoint = checkpoint
+        self._checkpoint_size = checkpoint_size
+        self._checkpointed = start
+        self._droppers = list(droppers)
+
+    def __call__(self, done: int, force: bool = False):
+        if self._limiter is not None and done > self._done:
+            self._limiter.consume(done - self._done)
+        self._done = done
+        for dropper in self._droppers:
+            dropper(done)
+        if self.checkpoint is not None and self._checkpoint_size and done - self._checkpointed >= self._checkpoint_size:
+            self._checkpointed = done
+            self.checkpoint(done)
+        if self._callback is None:
+            return
+        now = time.monotonic()
+        if force or now - self._last >= self._interval:
+            self._last = now
+            self._callback(done, self._total)
+
+
+class CopyEngine:
+    """
+    Copies single file contents, reporting byte-level progress at most once per `progress_interval` seconds.
+    If `preallocate` is set, destination file is allocated in full before data is written, so it is stored
+    contiguously and a full disk is detected before copying.
+
+    Data is written to a partial file next to destination, which is renamed to destination once copied completely.
+    Every `checkpoint_size` bytes partial data is flushed to disk, so an interrupted copy can be resumed from there.
+
+    Source is read with sequential readahead hint. If `drop_cache` is set, source and destination pages are
+    dropped from page cache behind the copy position, so memory taken by cache stays flat during bulk imports.
+    """
+
+    max_pending_chunks = 4
+
+    def __init__(self, buffer_size: int = 8 * 1024 * 1024, progress_interval: float = 0.5, preallocate: bool = True,
+                 checkpoint_size: int = 64 * 1024 * 1024, drop_cache: bool = True):
+        self.buffer_size = buffer_size
+        self.progress_interval = progress_interval
+        self.preallocate = preallocate
+        self.checkpoint_size = checkpoint_size
+        self.drop_cache = drop_cache
+
+    def copy(self, src: Path, dst: Path, progress: Optional[ProgressCallback] = None,
+             hash_name: Optional[str] = None, fsync: bool = False,
+             limiter: Optional[TokenBucket] = None, mirrors: Sequence[Path] = (),
+             resume: Optional[ResumePoint] = None, checkpoint: Optional[CheckpointCallback] = None) -> CopyResult:
+        """
+        Copy `src` to `dst`. If `hash_name` is given, source data is hashed while it streams through the copy loop.
+        If `fsync` is set, `dst` and its directory entry are flushed to disk before returning.
+        Throughput is limited by `limiter` if given.
+
+        If `mirrors` are given, source is read once and written to `dst` and all mirrors concurrently.
+
+        If `resume` is given and partial files hold that much data with matching digest, copying continues from there.
+        `checkpoint` is called whenever partial data is flushed to disk.
+        """
+        destinations = [dst, *mirrors]
+        for path in destinations:
+            if path.exists() and os.path.samefile(src, path):
+                raise shutil.SameFileError(f'{src} and {path} are the same file')
+            path.parent.mkdir(parents=True, exist_ok=True)
+        partials = [partial_path(path) for path in destinations]
+
+        with contextlib.ExitStack() as stack:
+            fsrc = stack.enter_context(open(src, 'rb', buffering=0))
+            size = os.fstat(fsrc.fileno()).st_size
+            offset, hasher = self._resume(partials, size, hash_name, resume)
+            mode = 'r+b' if offset else 'wb'
+            dst_fds = [stack.enter_context(open(path, mode, buffering=0)).fileno() for path in partials]
+            if self.preallocate and size:
+                for fd in dst_fds:
+                    self._preallocate(fd, size)
+            for fd in (fsrc.fileno(), *dst_fds):
+                os.lseek(fd, offset, os.SEEK_SET)
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(fsrc.fileno(), offset, 0, os.POSIX_FADV_SEQUENTIAL)
+            droppers = []
+            if self.drop_cache:
+                # Writers of mirrored copies drop pages of their destination themselves
+                droppers = _cache_droppers([fsrc.fileno()], False, offset)
+                if not mirrors:
+                    droppers += _cache_droppers(dst_fds, True, offset)
+
+            def flush(done: int):
+                for fd in dst_fds:
+                    _fdatasync(fd)
+                checkpoint(done, hasher.copy().hexdigest() if hasher else None)
+
+            report = _Progress(progress, size, self.progress_interval, limiter, start=offset,
+                               checkpoint=flush if checkpoint else None, checkpoint_size=self.checkpoint_size,
+                               droppers=droppers)
+            report(offset, force=True)
+            if mirrors:
+                copied = self._fan_out(fsrc.fileno(), dst_fds, report, hasher, offset)
+            else:
+                copied = self._transfer(fsrc.fileno(), dst_fds[0], size, report, hasher, offset)
+            for dropper in droppers:
+                dropper(copied, final=True)
+            for fd in dst_fds:
+                os.ftruncate(fd, copied)
+            if fsync:
+                for fd in dst_fds:
+                    os.fsync(fd)
+            report(copied, force=True)
+
+        for partial, path in zip(partials, destinations):
+            os.replace(partial, path)
+        if fsync:
+            # Final name is durable only once the directory holding it is flushed too
+            for directory in {path.parent for path in destinations}:
+                sync_directory(directory)
+        return CopyResult(copied, hasher.hexdigest() if hasher else None)
+
+    def _resume(self, partials: List[Path], size: int, hash_name: Optional[str],
+                resume: Optional[ResumePoint]) -> Tuple[int, Any]:
+        """
+        Return offset to continue copying from and hasher fed with data before it
+        """
+        hasher = hashlib.new(hash_name) if hash_name else None
+        if resume is None or not 0 < resume.offset <= size:
+            return 0, hasher
+        if resume.digest is None and hasher is not None:
+            return 0, hasher
+
+        prefix_hashers = []
+        for path in partials:
+            try:
+                if path.stat().st_size < resume.offset:
+                    return 0, hasher
+            except FileNotFoundError:
+                return 0, hasher
+            if hasher is not None:
+                prefix_hashers.append(_hash_prefix(path, hash_name, self.buffer_size, resume.offset))
+
+        for prefix_hasher, path in zip(prefix_hashers, partials):
+            if prefix_hasher.hexdigest() != resume.digest:
+                logger.warning(f'Partial copy {path} does not match its checkpoint, copying from start')
+                return 0, hasher
+        logger.info(f'Resuming copy to {partials[0]} from {resume.offset} of {size} bytes')
+        return resume.offset, prefix_hashers[0] if prefix_hashers else None
+
+    def _fan_out(self, src_fd: int, dst_fds: List[int], report: _Progress, hasher=None, offset: int = 0) -> int:
+        """
+        Read source chunks once and hand them to a writer thread per destination. Each writer has a queue of at most
+        `max_pending_chunks`, so a slow destination holds reading back only after the faster ones are that far ahead.
+        """
+        queues: List['queue.Queue[Optional[bytes]]'] = [queue.Queue(self.max_pending_chunks) for _ in dst_fds]
+        errors: List[BaseException] = []
+
+        def write(fd: int, chunks: 'queue.Queue[Optional[bytes]]'):
+            failed = False
+            position = offset
+            droppers = _cache_droppers([fd], True, offset) if self.drop_cache else []
+            while True:
+                chunk = chunks.get()
+                try:
+                    if chunk is None:
+                        if not failed:
+                            for dropper in droppers:
+                                dropper(position, final=True)
+                        return
+                    # After a failure, chunks are still taken from the queue so the reader is never blocked
+                    if failed:
+                        continue
+                    view = memoryview(chunk)
+                    written = 0
+                    while written < len(chunk):
+                        written += os.write(fd, view[written:])
+                    position += written
+                    for dropper in droppers:
+                        dropper(position)
+                except BaseException as e:
+                    errors.append(e)
+                    failed = True
+                finally:
+                    chunks.task_done()
+
+        checkpoint = report.checkpoint
+        if checkpoint is not None:
+            # Checkpoint may be taken only once every writer caught up with the reader
+            def drain_and_checkpoint(done: int):
+                for chunks in queues:
+                    chunks.join()
+                if not errors:
+                    checkpoint(done)
+
+            report.checkpoint = drain_and_checkpoint
+
+        writers = [
+            threading.Thread(target=write, args=(fd, chunks), name=f'fan-out-{fd}', daemon=True)
+            for fd, chunks in zip(dst_fds, queues)
+        ]
+        for writer in writers:
+            writer.start()
+
+        copied = offset
+        try:
+            with open(src_fd, 'rb', buffering=0, closefd=False) as fsrc:
+                while not errors:
+                    chunk = fsrc.read(self.buffer_size)
+                    if not chunk:
+                        break
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    for chunks in queues:
+                        chunks.put(chunk)
+                    copied += len(chunk)
+                    report(copied)
+        finally:
+            for chunks in queues:
+                chunks.put(None)
+            for writer in writers:
+                writer.join()
+
+        if errors:
+            raise errors[0]
+        return copied
+
+    @staticmethod
+    def _preallocate(fd: int, size: int):
+        """
+        Allocate `size` bytes of destination file where filesystem supports it. posix_fallocate is not used,
+        as it emulates allocation by writing every block, doubling writes on filesystems like FAT.
+        """
+        try:
+            fallocate(fd, 0, size)
+        except OSError as e:
+            if e.errno not in _PREALLOCATE_UNSUPPORTED:
+                raise
+
+    def _transfer(self, src_fd: int, dst_fd: int, size: int, report: _Progress, hasher=None, offset: int = 0) -> int:
+        """
+        Copy source from `offset` to its end, return copied size including `offset`
+        """
+        raise NotImplementedError()
+
+
+class BufferedCopyEngine(CopyEngine):
+    """
+    Plain read/write loop over a single preallocated buffer
+    """
+
+    def _transfer(self, src_fd: int, dst_fd: int, size: int, report: _Progress, hasher=None, offset: int = 0) -> int:
+        buffer = bytearray(self.buffer_size)
+        view = memoryview(buffer)
+        copied = offset
+
+        with open(src_fd, 'rb', buffering=0, closefd=False) as fsrc:
+            while True:
+                read = fsrc.readinto(buffer)
+                if not read:
+                    break
+                if hasher is not None:
+                    hasher.update(view[:read])
+                written = 0
+                while written < read:
+                    written += os.write(dst_fd, view[written:read])
+                copied += read
+                report(copied)
+
+        return copied
+
+
+class KernelCopyEngine(BufferedCopyEngine):
+    """
+    Uses `os.copy_file_range` or `os.sendfile` to copy data without passing it through userspace,
+    falling back to buffered loop when neither is supported for given files or data has to be hashed
+    """
+
+    def _transfer(self, src_fd: int, dst_fd: int, size: int, report: _Progress, hasher=None, offset: int = 0) -> int:
+        if hasher is None:
+            for method in (self._copy_file_range, self._sendfile):
+                copied = method(src_fd, dst_fd, report, offset)
+                if copied is not None:
+                    return copied
+
+        return super(KernelCopyEngine, self)._transfer(src_fd, dst_fd, size, report, hasher, offset)
+
+    @staticmethod
+    def _kernel_loop(copy_chunk: Callable[[int], int], report: _Progress, offset: int) -> Optional[int]:
+        copied = offset
+        while True:
+            try:
+                sent = copy_chunk(copied)
+            except OSError as e:
+                # Fall back to another method only if nothing was written yet
+                if copied > offset or e.errno not in _KERNEL_COPY_UNSUPPORTED:
+                    raise
+                return None
+            if not sent:
+                break
+            copied += sent
+            report(copied)
+        return copied
+
+    def _copy_file_range(self, src_fd: int, dst_fd: int, report: _Progress, offset: int) -> Optional[int]:
+        if not hasattr(os, 'copy_file_range'):
+            return None
+        return self._kernel_loop(
+            lambda position: os.copy_file_range(src_fd, dst_fd, self.buffer_size, position, position),
+            report, offset,
+        )
+
+    def _sendfile(self, src_fd: int, dst_fd: int, report: _Progress, offset: int) -> Optional[int]:
+        if not hasattr(os, 'sendfile') or not sys.platform.startswith('linux'):
+            return None
+        # Destination is written at its current position, which is `offset`
+        return self._kernel_loop(
+            lambda position: os.sendfile(dst_fd, src_fd, position, self.buffer_size),
+            report, offset,
+        )
+
+
+class DirectCopyEngine(BufferedCopyEngine):
+    """
+    Reads and writes with O_DIRECT, so copied data bypasses page cache altogether. O_DIRECT needs buffer,
+    file offsets and transfer sizes aligned to device blocks, so data is copied in whole blocks from a page aligned
+    buffer and the padded last block is truncated afterwards. Falls back to buffered loop where a filesystem
+    does not support O_DIRECT or resume offset is not aligned.
+    """
+
+    alignment = 4096
+
+    def _transfer(self, src_fd: int, dst_fd: int, size: int, report: _Progress, hasher=None, offset: int = 0) -> int:
+        if hasattr(os, 'O_DIRECT') and not offset % self.alignment:
+            # Not available on Windows, where O_DIRECT is not defined either
+            import fcntl
+
+            flags = {fd: fcntl.fcntl(fd, fcntl.F_GETFL) for fd in (src_fd, dst_fd)}
+            try:
+                copied = self._direct_loop(src_fd, dst_fd, report, hasher, offset, flags)
+            finally:
+                for fd, fd_flags in flags.items():
+                    fcntl.fcntl(fd, fcntl.F_SETFL, fd_flags)
+            if copied is not None:
+                return copied
+            for fd in flags:
+                os.lseek(fd, offset, os.SEEK_SET)
+
+        return super(DirectCopyEngine, self)._transfer(src_fd, dst_fd, size, report, hasher, offset)
+
+    def _direct_loop(self, src_fd: int, dst_fd: int, report: _Progress, hasher, offset: int,
+                     flags: Dict[int, int]) -> Optional[int]:
+        import fcntl
+
+        buffer_size = max(self.alignment, self.buffer_size - self.buffer_size % self.alignment)
+        # Anonymous mapping is page aligned
+        buffer = mmap.mmap(-1, buffer_size)
+        view = memoryview(buffer)
+        copied = offset
+        try:
+            while True:
+                try:
+                    if copied == offset:
+                        for fd, fd_flags in flags.items():
+                            fcntl.fcntl(fd, fcntl.F_SETFL, fd_flags | os.O_DIRECT)
+                    read = os.readv(src_fd, [view])
+                    if not read:
+                        break
+                    # Only the last block of a file is read partially, it is padded to a whole block
+                    padded = -(-read // self.alignment) * self.alignment
+                    view[read:padded] = bytes(padded - read)
+                    written = 0
+                    while written < padded:
+                        written += os.write(dst_fd, view[written:padded])
+                except OSError as e:
+                    # Fall back to buffered loop only if nothing was copied yet
+                    if copied > offset or e.errno not in _DIRECT_IO_UNSUPPORTED:
+                        raise
+                    logger.debug(f'O_DIRECT is not supported, copying through page cache: {e}')
+                    return None
+                if hasher is not None:
+                    hasher.update(view[:read])
+                copied += read
+                report(copied)
+        finally:
+            view.release()
+            buffer.close()
+        return copied
+
+
+def _fdatasync(fd: int):
+    if hasattr(os, 'fdatasync'):
+        os.fdatasync(fd)
+    else:
+        os.fsync(fd)
+
+
+def hash_file(path: Path, hash_name: str, buffer_size: int = 8 * 1024 * 1024, sync: bool = True) -> str:
+    """
+    Hash file contents as stored on disk. Cached pages are flushed and dropped first where supported,
+    so data is read back from the device instead of the page cache. Pass `sync=False` for files already
+    flushed to disk, e.g. by a filesystem sync, to drop their pages without another flush.
+    """
+    return _hash_prefix(path, hash_name, buffer_size, sync=sync).hexdigest()
+
+
+def _hash_prefix(path: Path, hash_name: str, buffer_size: int, size: Optional[int] = None, sync: bool = True):
+    """
+    Return hasher fed with first `size` bytes of file as stored on disk, or with the whole file
+    """
+    hasher = hashlib.new(hash_name)
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    remaining = size
+
+    with open(path, 'rb', buffering=0) as f:
+        droppers = []
+        if hasattr(os, 'posix_fadvise'):
+            if sync:
+                os.fsync(f.fileno())
+            # Only clean pages are dropped, so dirty ones would be read back from cache
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            # Data read back is not needed afterwards either
+            droppers = _cache_droppers([f.fileno()], False, 0)
+        position = 0
+        while remaining is None or remaining > 0:
+            read = f.readinto(buffer if remaining is None or remaining >= buffer_size else view[:remaining])
+            if not read:
+                break
+            hasher.update(view[:read])
+            position += read
+            for dropper in droppers:
+                dropper(position)
+            if remaining is not None:
+                remaining -= read
+        for dropper in droppers:
+            dropper(position, final=True)
+
+    return hasher
+
+
+def get_copy_engine(buffer_size: int, progress_interval: float, kernel_copy: bool = True,
+                    preallocate: bool = True, checkpoint_size: int = 64 * 1024 * 1024, drop_cache: bool = True,
+                    direct_io: bool = False) -> CopyEngine:
+    if direct_io:
+        cls = DirectCopyEngine
+    else:
+        cls = KernelCopyEngine if kernel_copy else BufferedCopyEngine
+    return cls(buffer_size=buffer_size, progress_interval=progress_interval, preallocate=preallocate,
+               checkpoint_size=checkpoint_size, drop_cache=drop_cache)
@@ -0,0 +1,94 @@
+"""
+Headless mode: imports drives without UI
+"""
+import json
+import logging
+import signal
+import threading
+from typing import Callable, Sequence
+
+from dvrmanager.engine import Engine
+from dvrmanager.planner import describe
+from dvrmanager.retention import InsufficientSpaceError
+from dvrmanager.settings import Settings, SettingsStore
+
+logger = logging.getLogger(__name__)
+
+
+def watch_drives(engine: Engine, stop: threading.Event, drives_changed: threading.Event,
+                 on_attached: Callable[[str], None], on_detached: Callable[[str], None] = lambda drive: None):
+    """
+    Call `on_attached` and `on_detached` as export item drives come and go, until `stop` is set.
+    `drives_changed` wakes the loop up, it is set by drive watcher and should be set along with `stop`.
+    """
+    watching = engine.fs.watch(drives_changed.set)
+    logger.info(f'{"Watching" if watching else "Polling"} for drives')
+
+    drives_changed.set()
+    while not stop.is_set():
+        drives_changed.wait(None if watching else 1)
+        drives_changed.clear()
+        if stop.is_set():
+            break
+
+        try:
+            attached, detached = engine.scan_drives()
+            for drive in attached:
+                on_attached(drive)
+            for drive in detached:
+                on_detached(drive)
+        except:
+            logger.exception('scan_drives')
+
+
+def run(settings: Settings, label: str = ''):
+    engine = Engine(SettingsStore(settings))
+    stop = threading.Event()
+    drives_changed = threading.Event()
+
+    def on_signal(signum, frame):
+        logger.info(f'Received signal {signum}, stopping')
+        stop.set()
+        drives_changed.set()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    def on_attached(drive: str):
+        try:
+            job = engine.create_job(drive, label)
+        except InsufficientSpaceError as e:
+            logger.error(f'Not importing {drive}: {e}')
+            return
+        if job is None:
+            return
+        job.progress_str = logger.info
+        threading.Thread(target=job.run, name=f'import-{drive}', daemon=True).start()
+
+    logger.info('Headless mode started')
+    watch_drives(engine, stop, drives_changed, on_attached)
+    engine.shutdown()
+
+
+def plan(settings: Settings, label: str = '', drives: Sequence[str] = (), as_json: bool = False):
+    """
+    Print what importing attached drives would copy and how long it would take, without importing them.
+    All export item drives are planned if `drives` is empty.
+    """
+    engine = Engine(SettingsStore(settings))
+    try:
+        summaries = []
+        for drive in drives or engine.drive_export_items():
+            transfer_plan = engine.plan(drive, label)
+            if transfer_plan is None:
+                logger.info(f'Drive {drive} is not attached or has no export items')
+                continue
+            summaries.append(transfer_plan.summary(with_files=as_json))
+
+        if as_json:
+            print(json.dumps(summaries, indent=2))
+        else:
+            for summary in summaries:
+                print(describe(summary))
+    finally:
+        engine.shutdown()
@@ -0,0 +1,173 @@
+"""
+Content-addressed store: archived files with identical contents share one copy on disk
+"""
+import errno
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Tuple
+
+from dvrmanager import config
+
+logger = logging.getLogger(__name__)
+
+#: Directory under archive root holding one copy of every distinct file, named by its digest
+BLOBS_DIR = '.blobs'
+
+# Linux FICLONE ioctl, shares file extents on filesystems with reflink support like Btrfs and XFS
+_FICLONE = 0x40049409
+
+# Errors meaning that reflinks are not supported for this pair of files
+_REFLINK_UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOTTY, errno.EBADF}
+
+
+def reflink(src: Path, dst: Path) -> bool:
+    """
+    Create `dst` as a copy-on-write clone of `src`. Return False if not supported, in which case `dst` is not created.
+    """
+    if not sys.platform.startswith('linux'):
+        return False
+    import fcntl
+
+    with open(src, 'rb') as fsrc, open(dst, 'xb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            return True
+        except OSError as e:
+            if e.errno not in _REFLINK_UNSUPPORTED:
+                raise
+    os.unlink(dst)
+    return False
+
+
+class BlobStore:
+    """
+    Keeps one copy of every distinct imported file per archive root in `<root>/.blobs`. Archived files with the same
+    digest are replaced by hardlinks to that copy, or reflinks where hardlinks can not be made.
+    SQLite index of stored digests answers duplicate checks without reading the archive.
+    """
+
+    def __init__(self, path: Path = None):
+        self._path = path or self.default_path()
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self._path), check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS blobs ('
+            'root TEXT NOT NULL, '
+            'digest TEXT NOT NULL, '
+            'size INTEGER NOT NULL, '
+            'stored_at REAL NOT NULL, '
+            'PRIMARY KEY (root, digest)) WITHOUT ROWID'
+        )
+        self._connection.commit()
+
+    @staticmethod
+    def default_path() -> Path:
+        return config.APP_DATA_DIR / 'blobs.sqlite3'
+
+    @staticmethod
+    def blob_path(root: Path, digest: str) -> Path:
+        return Path(root) / BLOBS_DIR / digest[:2] / digest
+
+    def add(self, root: Path, path: Path, digest: str) -> bool:
+        """
+        Store archived file at `path` under `root` by its `digest`. If a file with the same digest is stored already,
+        `path` is replaced by a link to it. Return True if `path` was deduplicated.
+        """
+        size = path.stat().st_size
+        blob = self.blob_path(root, digest)
+
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT size FROM blobs WHERE root = ? AND digest = ?', (str(root), digest)
+            ).fetchone()
+            if row is not None:
+                try:
+                    blob_stat = os.stat(blob)
+                except FileNotFoundError:
+                    blob_stat = None
+                if blob_stat is not None and blob_stat.st_size == size == row[0]:
+                    return self._link(blob, path)
+
+            if not self._store(path, blob):
+                return False
+            with self._connection:
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO blobs (root, digest, size, stored_at) VALUES (?, ?, ?, ?)',
+                    (str(root), digest, size, time.time())
+                )
+        return False
+
+    @staticmethod
+    def _store(path: Path, blob: Path) -> bool:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        tmp = blob.with_name(f'.{blob.name}.tmp')
+        try:
+            os.link(path, tmp)
+        except FileExistsError:
+            os.unlink(tmp)
+            os.link(path, tmp)
+        except OSError as e:
+            logger.warning(f'Can not store {path} in {blob.parent}, deduplication is not supported there: {e}')
+            return False
+        os.replace(tmp, blob)
+        return True
+
+    @staticmethod
+    def _link(blob: Path, path: Path) -> bool:
+        if os.path.samefile(blob, path):
+            return True
+        tmp = path.with_name(f'.{path.name}.dedup')
+        if tmp.exists():
+            os.unlink(tmp)
+        try:
+            os.link(blob, tmp)
+        except OSError as e:
+            # Most likely too many links to blob
+            logger.debug(f'Can not hardlink {blob} to {path}: {e}')
+            if not reflink(blob, tmp):
+                return False
+        os.replace(tmp, path)
+        return True
+
+    def collect(self, root: Path) -> Tuple[int, int]:
+        """
+        Remove stored files of `root` that are no longer linked from any archive session.
+        Return count and total size of removed files.
+        """
+        removed = size = 0
+        with self._lock:
+            rows = self._connection.execute('SELECT digest, size FROM blobs WHERE root = ?', (str(root),)).fetchall()
+            unreferenced = []
+            for digest, blob_size in rows:
+                blob = self.blob_path(root, digest)
+                try:
+                    if os.stat(blob).st_nlink > 1:
+                        continue
+                    blob.unlink()
+                    removed += 1
+                    size += blob_size
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    logger.exception(f'Error removing {blob}')
+                    continue
+                unreferenced.append((str(root), digest))
+
+            with self._connection:
+                self._connection.executemany('DELETE FROM blobs WHERE root = ? AND digest = ?', unreferenced)
+
+        if removed:
+            logger.info(f'Removed {removed} unreferenced files ({size // 1024 ** 2} MiB) from {Path(root) / BLOBS_DIR}')
+        return removed, size
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
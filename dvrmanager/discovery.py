@@ -0,0 +1,211 @@
+"""
+Streaming file discovery
+"""
+import fnmatch
+import os
+import re
+import stat
+import time
+from pathlib import Path, PurePath
+from typing import FrozenSet, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+Match = Tuple[Path, os.stat_result]
+#: Matched file, its stat result and index of the rule it matched
+RuleMatch = Tuple[Path, os.stat_result, int]
+
+_MAGIC = re.compile(r'[*?\[]')
+
+
+class PathPattern:
+    """
+    Glob pattern relative to drive root, where `**` matches any number of directories,
+    and a trailing `**` matches every file below, like in .gitignore.
+
+    Pattern is matched one path component at a time while walking the tree, so directories that
+    can not lead to a match are never listed, and components without wildcards are looked up directly.
+    """
+
+    def __init__(self, pattern: str):
+        self.pattern = str(pattern)
+        self.parts: Tuple[str, ...] = tuple(p for p in PurePath(self.pattern).parts if p not in ('', '.', '/', '\\'))
+        self._end = len(self.parts)
+
+    def _closure(self, states: FrozenSet[int]) -> FrozenSet[int]:
+        # `**` may match zero directories, except a trailing one, which must match at least a file
+        result = set(states)
+        for i in sorted(states):
+            while i < self._end - 1 and self.parts[i] == '**':
+                i += 1
+                result.add(i)
+        return frozenset(result)
+
+    def _advance(self, states: FrozenSet[int], name: str, is_dir: bool) -> FrozenSet[int]:
+        result = set()
+        for i in states:
+            if i >= self._end:
+                continue
+            part = self.parts[i]
+            if part == '**':
+                if is_dir:
+                    result.add(i)
+                elif i == self._end - 1:
+                    result.add(self._end)
+            elif fnmatch.fnmatch(name, part):
+                result.add(i + 1)
+        return self._closure(frozenset(result))
+
+    def _literal_names(self, states: FrozenSet[int]):
+        names = set()
+        for i in states:
+            if i >= self._end:
+                continue
+            part = self.parts[i]
+            if part == '**' or _MAGIC.search(part):
+                return None
+            names.add(part)
+        return names
+
+    def match(self, parts: Sequence[str]) -> bool:
+        """
+        Return True if file at relative path `parts` matches the pattern
+        """
+        states = self._closure(frozenset({0}))
+        for i, name in enumerate(parts):
+            states = self._advance(states, name, is_dir=i < len(parts) - 1)
+            if not states:
+                return False
+        return self._end in states
+
+    def iter_matches(self, root: Path) -> Iterator[Match]:
+        """
+        Yield matching files under `root` with their stat results as soon as they are found
+        """
+        for path, file_stat, _ in _walk([self], str(root)):
+            yield Path(path), file_stat
+
+
+class FileRule:
+    """
+    Include and exclude patterns of one export item, with size and age limits. Limits of 0 are not checked.
+    """
+
+    def __init__(self, include: Iterable[str], exclude: Iterable[str] = (), min_size: int = 0, max_size: int = 0,
+                 max_age: float = 0):
+        self.include = [PathPattern(pattern) for pattern in include]
+        self.exclude = [PathPattern(pattern) for pattern in exclude]
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_age = max_age
+
+    def accepts(self, parts: Sequence[str], file_stat: os.stat_result, now: float) -> bool:
+        """
+        Check limits and exclude patterns of a file that matched an include pattern
+        """
+        if file_stat.st_size < self.min_size:
+            return False
+        if self.max_size and file_stat.st_size > self.max_size:
+            return False
+        if self.max_age and now - file_stat.st_mtime > self.max_age:
+            return False
+        return not any(pattern.match(parts) for pattern in self.exclude)
+
+
+class RuleMatcher:
+    """
+    Routes files of a drive to the first of several rules they match.
+
+    Include patterns of all rules are advanced together in a single walk of the tree, so a directory is listed
+    once however many rules look into it, and only when at least one of them can match below it.
+    """
+
+    def __init__(self, rules: Sequence[FileRule]):
+        self.rules = list(rules)
+        self._patterns = [pattern for rule in self.rules for pattern in rule.include]
+        self._owners = [index for index, rule in enumerate(self.rules) for _ in rule.include]
+
+    def iter_matches(self, root: Path, now: Optional[float] = None) -> Iterator[RuleMatch]:
+        """
+        Yield matching files under `root` with their stat results and index of the rule they matched
+        """
+        now = time.time() if now is None else now
+        root = str(root)
+        for path, file_stat, matched in _walk(self._patterns, root):
+            parts = PurePath(os.path.relpath(path, root)).parts
+            for index in sorted({self._owners[i] for i in matched}):
+                if self.rules[index].accepts(parts, file_stat, now):
+                    yield Path(path), file_stat, index
+                    break
+
+
+def _walk(patterns: Sequence[PathPattern], root: str) -> Iterator[Tuple[str, os.stat_result, List[int]]]:
+    """
+    Yield files under `root` matching any of `patterns`, with indexes of patterns they match
+    """
+    initial = tuple(pattern._closure(frozenset({0})) if pattern.parts else frozenset() for pattern in patterns)
+    if not any(initial):
+        return
+    stack = [(root, initial)]
+
+    while stack:
+        directory, states = stack.pop()
+        literal_names: Optional[Set[str]] = set()
+        for pattern, pattern_states in zip(patterns, states):
+            names = pattern._literal_names(pattern_states) if pattern_states else set()
+            if names is None:
+                literal_names = None
+                break
+            literal_names |= names
+
+        if literal_names is not None:
+            entries = []
+            for name in sorted(literal_names):
+                path = os.path.join(directory, name)
+                try:
+                    entries.append((name, path, os.stat(path)))
+                except OSError:
+                    continue
+        else:
+            try:
+                with os.scandir(directory) as it:
+                    entries = [(entry.name, entry.path, entry) for entry in it]
+            except OSError:
+                continue
+
+        subdirectories = []
+        for name, path, entry in entries:
+            if isinstance(entry, os.DirEntry):
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+            else:
+                is_dir = stat.S_ISDIR(entry.st_mode)
+
+            next_states = tuple(
+                pattern._advance(pattern_states, name, is_dir) if pattern_states else pattern_states
+                for pattern, pattern_states in zip(patterns, states)
+            )
+            if not any(next_states):
+                continue
+
+            if is_dir:
+                if any(any(i < pattern._end for i in pattern_states)
+                       for pattern, pattern_states in zip(patterns, next_states)):
+                    subdirectories.append((path, next_states))
+            else:
+                matched = [i for i, (pattern, pattern_states) in enumerate(zip(patterns, next_states))
+                           if pattern._end in pattern_states]
+                if not matched:
+                    continue
+                try:
+                    file_stat = entry.stat() if isinstance(entry, os.DirEntry) else entry
+                except OSError:
+                    continue
+                yield path, file_stat, matched
+
+        # Reversed so that directories are visited in listing order
+        stack.extend(reversed(subdirectories))
+
+
+def iter_matches(root: Path, pattern: str) -> Iterator[Match]:
+    return PathPattern(pattern).iter_matches(root)
@@ -0,0 +1,749 @@
+"""
+Import engine: drive detection, discovery and transfers, independent of UI
+"""
+import collections
+import datetime
+import functools
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path, PurePath
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from dvrmanager.catalog import Catalog, CatalogIndexer
+from dvrmanager.container import CONTAINER_NAME, SessionContainer
+from dvrmanager.copier import CopyEngine, ResumePoint, VerificationError, get_copy_engine, hash_file, partial_path
+from dvrmanager.dedup import BlobStore
+from dvrmanager.discovery import FileRule, Match, RuleMatch, RuleMatcher
+from dvrmanager.fs import FSManager, get_fs_manager, sync_files, sync_filesystem
+from dvrmanager.index import ImportIndex, IndexRecord
+from dvrmanager.journal import TransferJournal
+from dvrmanager.metrics import MetricsRecorder, Session, TransferRecord
+from dvrmanager.planner import PlannedFile, SkippedFile, TransferPlan, describe, session_throughputs
+from dvrmanager.retention import InsufficientSpaceError, Retention, free_space
+from dvrmanager.settings import Durability, ExportItem, Priority, SettingsStore
+from dvrmanager.throttle import IOPRIO_CLASS_BE, IOPRIO_CLASS_IDLE, TokenBucket, set_io_priority
+from dvrmanager.transfer import TransferScheduler, destination_device
+
+logger = logging.getLogger(__name__)
+
+#: Scheduler priority of export item priorities
+PRIORITY_LEVELS = {Priority.BACKGROUND: 0, Priority.NORMAL: 1, Priority.URGENT: 2}
+#: I/O scheduling class and level of worker threads by scheduler priority
+IO_PRIORITIES = {0: (IOPRIO_CLASS_IDLE, 7), 1: (IOPRIO_CLASS_BE, 4), 2: (IOPRIO_CLASS_BE, 0)}
+
+
+def drive_directory_name(drive_name: str, default: str = 'drive') -> str:
+    """
+    Make directory name from drive name, which may be a mount point like /media/user/DVR or a drive letter like E:.
+    Also used for session labels, so the name is always a single path component.
+    """
+    name = re.sub(r'[\\/:]+', '_', drive_name).strip('_')
+    return name if name.strip('.') else default
+
+
+def file_rule(export_item: ExportItem) -> FileRule:
+    return FileRule(
+        export_item.patterns(), export_item.exclude,
+        min_size=export_item.min_size * 1024,
+        max_size=export_item.max_size * 1024,
+        max_age=export_item.max_age * 24 * 60 * 60,
+    )
+
+
+def rule_subdirectory(export_item: ExportItem) -> Path:
+    """
+    Return destination of export item relative to session directory, which it can not escape
+    """
+    return Path(*(part for part in PurePath(export_item.destination).parts
+                  if part not in ('..', '.') and not PurePath(part).anchor))
+
+
+class ImportJob:
+    """
+    Copies matched files of one drive, each according to the export item it matched. Drive-wide options
+    are taken from the first export item. Callbacks are called from worker threads.
+    """
+
+    def __init__(self, scheduler: TransferScheduler, copy_engine: CopyEngine, index: ImportIndex,
+                 journal: TransferJournal, fs: FSManager,
+                 metrics: MetricsRecorder, export_items: Sequence[ExportItem], hash_algorithm: str, drive_root: Path,
+                 matches: Iterable[RuleMatch], target_directory: Path, limiter: Optional[TokenBucket] = None,
+                 mirror_directories: Sequence[Path] = (), blob_store: Optional[BlobStore] = None):
+        self._scheduler = scheduler
+        self._copy_engine = copy_engine
+        self._index = index
+        self._journal = journal
+        self._fs = fs
+        self._metrics = metrics
+        self._export_items = list(export_items)
+        self._export_item = self._export_items[0]
+        self._drive_name = self._export_item.drive_name
+        self._file_items: Dict[Path, ExportItem] = {}
+        self._drive_root = drive_root
+        self._matches = matches
+        self._target_directory = target_directory
+        self._mirror_directories = list(mirror_directories)
+        self._limiter = limiter
+        self._blob_store = blob_store
+        self._reserved = 0
+        self._verify = any(self.verifies(export_item) for export_item in self._export_items)
+        self._hash_algorithm = hash_algorithm if self._verify or blob_store is not None else None
+
+        self.progress_str: Callable[[str], None] = lambda text: None
+        self.file_done: Callable[[Path], None] = lambda path: None
+        self.bytes_progress: Callable[[str, int, int], None] = lambda path, done, total: None
+        self.finished: Callable[[], None] = lambda: None
+        self.files_imported: Callable[[List[Path]], None] = lambda paths: None
+        self.reserve_space: Callable[[int], None] = lambda size: None
+        self.release_space: Callable[[int], None] = lambda size: None
+        #: Releases the rest of reserved space once the import is done with its session directories
+        self.end_reservation: Callable[[int], None] = lambda size: None
+
+    @property
+    def drive_name(self) -> str:
+        return self._drive_name
+
+    @staticmethod
+    def verifies(export_item: ExportItem) -> bool:
+        # Source may be deleted only after its copy was verified
+        return export_item.verify or export_item.delete
+
+    def export_item(self, file_from: Path) -> ExportItem:
+        """
+        Return export item that matched `file_from`
+        """
+        return self._file_items.get(file_from, self._export_item)
+
+    def destinations(self, file_from: Path) -> List[Path]:
+        """
+        Return paths `file_from` is copied to, in target directory first and then in mirror directories.
+        Path relative to drive root is kept, since DVRs reuse file names in different directories.
+        """
+        relative_path = rule_subdirectory(self.export_item(file_from)) / file_from.relative_to(self._drive_root)
+        return [directory / relative_path for directory in (self._target_directory, *self._mirror_directories)]
+
+    def copy_file(self, session: Session, file_from: Path, stat: os.stat_result, queued_at: float,
+                  resume: ResumePoint) -> Optional[str]:
+        """
+        Copy file to its destinations and return digest of source data. Copies are verified and recorded
+        as imported by the caller, once they are on disk.
+        """
+        started_at = time.monotonic()
+        export_item = self.export_item(file_from)
+        file_to, *mirrors = self.destinations(file_from)
+        relative_path = file_from.relative_to(self._drive_root).as_posix()
+        try:
+            set_io_priority(*IO_PRIORITIES[self._scheduler.priority(self._drive_name)])
+            result = self._copy_engine.copy(
+                file_from, file_to,
+                progress=lambda done, total: self.bytes_progress(str(file_from), done, total),
+                hash_name=self._hash_algorithm,
+                fsync=export_item.durability == Durability.FILE,
+                limiter=self._limiter,
+                mirrors=mirrors,
+                resume=resume,
+                checkpoint=lambda offset, digest: self._journal.checkpoint(
+                    self._drive_name, relative_path, offset, digest
+                ),
+            )
+        except:
+            self._metrics.record(session, TransferRecord(
+                str(file_from), str(file_to), 0, time.monotonic() - started_at, started_at - queued_at, ok=False,
+            ))
+            raise
+
+        self._metrics.record(session, TransferRecord(
+            str(file_from), str(file_to), result.size, time.monotonic() - started_at, started_at - queued_at,
+        ))
+        return result.digest
+
+    def verify_copies(self, file_from: Path, digest: str, sync: bool) -> bool:
+        """
+        Read copies of `file_from` back from disk and compare them with digest of source data.
+        If `sync` is not set, copies must be on disk already, so they are not flushed one by one.
+        """
+        for copy in self.destinations(file_from):
+            try:
+                copy_digest = hash_file(copy, self._hash_algorithm, self._copy_engine.buffer_size, sync=sync)
+            except:
+                logger.exception(f'Error verifying {copy}')
+                self.progress_str(f'Error verifying {copy}')
+                return False
+            if copy_digest != digest:
+                logger.error(f'Checksum mismatch: {file_from} {digest} != {copy} {copy_digest}')
+                self.progress_str(f'Error copying {file_from}: checksum mismatch in {copy}')
+                return False
+        return True
+
+    def deduplicate(self, copies: Sequence[Path], digest: str):
+        """
+        Replace copies of a file with links to an already archived file with the same contents
+        """
+        for directory, copy in zip((self._target_directory, *self._mirror_directories), copies):
+            try:
+                if self._blob_store.add(directory.parents[2], copy, digest):
+                    logger.debug(f'{copy} is a duplicate of {digest}')
+            except:
+                logger.exception(f'Error deduplicating {copy}')
+
+    def add_to_container(self, session: Session, container: SessionContainer, name: str, file_from: Path,
+                         stat: os.stat_result, queued_at: float):
+        started_at = time.monotonic()
+        try:
+            set_io_priority(*IO_PRIORITIES[self._scheduler.priority(self._drive_name)])
+            data = file_from.read_bytes()
+            if self._limiter is not None:
+                self._limiter.consume(len(data))
+            container.add(name, data, stat)
+        except:
+            self._metrics.record(session, TransferRecord(
+                str(file_from), str(container.path), 0, time.monotonic() - started_at, started_at - queued_at, ok=False,
+            ))
+            raise
+
+        self._metrics.record(session, TransferRecord(
+            str(file_from), str(container.path), len(data), time.monotonic() - started_at, started_at - queued_at,
+        ))
+
+    def finish_container(self, container: SessionContainer,
+                         contained: Dict[Path, Tuple[str, os.stat_result]]) -> Tuple[Set[Path], List[IndexRecord]]:
+        """
+        Close container and copy it to mirrors. Return sources of members that were not stored correctly,
+        and index records of the other members.
+        """
+        try:
+            failed = {entry.name for entry in container.close(verify=self._verify)}
+            for directory in self._mirror_directories:
+                for path in (container.path, container.index_path):
+                    result = self._copy_engine.copy(path, directory / path.name, hash_name=self._hash_algorithm)
+                    if self._verify and hash_file(directory / path.name, self._hash_algorithm) != result.digest:
+                        raise VerificationError(f'Checksum mismatch: {path} != {directory / path.name}')
+        except:
+            logger.exception(f'Error finishing container {container.path}')
+            self.progress_str(f'Error finishing container {container.path}')
+            return set(contained), []
+
+        for name in failed:
+            logger.error(f'Checksum mismatch: {name} in {container.path}')
+            self.progress_str(f'Error copying {name} to {container.path}')
+
+        entries = {entry.name: entry for entry in container.entries}
+        records = [
+            (name, ImportIndex.file_key(stat), container.path, entries[name].digest)
+            for name, stat in contained.values() if name in entries and name not in failed
+        ]
+        failed_sources = {file_from for file_from, (name, _) in contained.items() if name in failed or name not in entries}
+        return failed_sources, records
+
+    def on_file_copied(self, file_from: Path, file_to: Path, future: Future) -> bool:
+        try:
+            future.result()
+        except:
+            logger.exception(f'Error copying {file_from} -> {file_to}')
+            self.progress_str(f'Error copying {file_from}')
+            return False
+        self.progress_str(f'{file_from} -> {file_to}')
+        self.file_done(file_from)
+        logger.debug(f'Transfer scheduler: {self._scheduler.stats()}')
+        return True
+
+    def sync_destination(self, files: List[Path]):
+        """
+        Flush copied files to disk with a single filesystem sync per destination where supported
+        """
+        synced = True
+        for directory in (self._target_directory, *self._mirror_directories):
+            try:
+                if not sync_filesystem(directory):
+                    sync_files([directory / file_to.relative_to(self._target_directory) for file_to in files])
+            except:
+                logger.exception(f'Error syncing {directory}')
+                self.progress_str(f'Error syncing {directory}')
+                synced = False
+        return synced
+
+    def delete_sources(self, files: List[Path]):
+        deleted = 0
+        for file_from in files:
+            try:
+                file_from.unlink()
+                deleted += 1
+            except:
+                logger.exception(f'Error deleting {file_from}')
+        self.progress_str(f'Deleted {deleted} of {len(files)} source files from {self._drive_name}')
+
+    def start_journal(self, files: List[Match]) -> Dict[Path, ResumePoint]:
+        """
+        Record transfers of `files` in journal before any of them starts. Return resume points of files whose
+        earlier transfer was interrupted, partial copies of interrupted transfers that can not be resumed are removed.
+        """
+        unfinished = self._journal.unfinished(self._drive_name)
+        planned = []
+        resume_points: Dict[Path, ResumePoint] = {}
+        for file_from, stat in files:
+            relative_path = file_from.relative_to(self._drive_root).as_posix()
+            destinations = self.destinations(file_from)
+            resume = ResumePoint(0)
+            entry = unfinished.pop(relative_path, None)
+            if entry is not None:
+                # Source changed or today's session directory is a different one
+                if entry.key == ImportIndex.file_key(stat) and entry.destinations == [str(d) for d in destinations]:
+                    resume = entry.resume
+                else:
+                    self.remove_partials(entry.destinations)
+            resume_points[file_from] = resume
+            planned.append((relative_path, ImportIndex.file_key(stat), destinations, resume))
+
+        # Interrupted transfers of files that were imported since or are gone from the drive
+        for entry in unfinished.values():
+            self.remove_partials(entry.destinations)
+        self._journal.discard(self._drive_name, unfinished)
+        self._journal.plan(self._drive_name, planned)
+
+        resumed = sum(1 for resume in resume_points.values() if resume.offset)
+        if resumed:
+            self.progress_str(f'Resuming {resumed} interrupted transfers from {self._drive_name}')
+        return resume_points
+
+    @staticmethod
+    def remove_partials(destinations: Iterable[str]):
+        for destination in destinations:
+            try:
+                partial_path(Path(destination)).unlink()
+            except FileNotFoundError:
+                pass
+            except:
+                logger.exception(f'Error removing partial copy of {destination}')
+
+    def plan(self) -> TransferPlan:
+        """
+        Return transfers of matched files that were not imported yet, remembering export item each of them matched.
+        A file whose destination is taken by another file of the plan is skipped, which happens only when destinations
+        of export items overlap. Nothing is written, so it can be used as a dry run.
+        """
+        imported = self._index.imported(self._drive_name)
+        files: List[PlannedFile] = []
+        skipped: List[SkippedFile] = []
+        planned_sources: Dict[Path, Path] = {}
+        for file_from, stat, rule in self._matches:
+            export_item = self._file_items[file_from] = self._export_items[rule]
+            relative_path = file_from.relative_to(self._drive_root).as_posix()
+            if imported.get(relative_path) == ImportIndex.file_key(stat):
+                skipped.append(SkippedFile(file_from, 'already imported'))
+            elif stat.st_size < export_item.container_threshold * 1024:
+                # Small files are stored in a single container instead of a file each
+                files.append(PlannedFile(file_from, stat, [self._target_directory / CONTAINER_NAME / relative_path], True))
+            else:
+                destinations = self.destinations(file_from)
+                other = planned_sources.setdefault(destinations[0], file_from)
+                if other != file_from:
+                    logger.error(f'Not importing {file_from}: {other} is copied to {destinations[0]} already')
+                    self.progress_str(f'Not importing {file_from}: export items copy {other} to the same path')
+                    skipped.append(SkippedFile(file_from, f'same destination as {other}'))
+                    continue
+                files.append(PlannedFile(file_from, stat, destinations))
+
+        plan = TransferPlan(self._drive_name, files, skipped, session_throughputs(self._metrics.history(self._drive_name)))
+        patterns = ', '.join(pattern for export_item in self._export_items for pattern in export_item.patterns())
+        self.progress_str(
+            f'Drive {self._drive_name} has {len(files) + len(skipped)} matched files by {patterns}, '
+            f'{sum(1 for skip in skipped if skip.reason == "already imported")} already imported'
+        )
+        return plan
+
+    def run(self):
+        """Long-running task."""
+        try:
+            plan = self.plan()
+            self.progress_str(describe(plan.summary()))
+            # Space for the whole session is reserved before the first file is copied, so a session that
+            # does not fit fails before touching the drive
+            self._reserved = plan.total_bytes
+            try:
+                self.reserve_space(self._reserved)
+            except InsufficientSpaceError as e:
+                logger.error(f'Not importing {self._drive_name}: {e}')
+                self.progress_str(f'Not importing {self._drive_name}: {e}')
+                self.finished()
+                return
+
+            try:
+                self._run(plan)
+            finally:
+                self.end_reservation(self._reserved)
+
+            self.finished()
+        except:
+            logger.exception('run')
+
+    def _run(self, plan: TransferPlan):
+        session = self._metrics.start_session(self._drive_name)
+        destination_key = destination_device(self._target_directory)
+
+        # Completed transfers are reported from this thread, so callbacks are never called after run() returns
+        done: 'queue.Queue[Tuple[Path, Path, int, Future]]' = queue.Queue()
+        copied: List[Tuple[Path, Path, Optional[str]]] = []
+        queued = 0
+
+        def report(block: bool):
+            nonlocal queued
+            while queued:
+                try:
+                    file_from, file_to, size, future = done.get(block=block)
+                except queue.Empty:
+                    return
+                queued -= 1
+                # Written file takes space by itself now
+                self.release_space(size)
+                self._reserved -= size
+                if self.on_file_copied(file_from, file_to, future):
+                    copied.append((file_from, file_to, future.result()))
+
+        pending: List[Match] = [(planned.source, planned.stat) for planned in plan.files]
+        stats = dict(pending)
+        small = {planned.source for planned in plan.files if planned.contained}
+        container: Optional[SessionContainer] = None
+        contained: Dict[Path, Tuple[str, os.stat_result]] = {}
+        if small:
+            container = SessionContainer(self._target_directory / CONTAINER_NAME, self._hash_algorithm)
+        resume_points = self.start_journal([(file_from, stat) for file_from, stat in pending if file_from not in small])
+
+        for file_from, stat in pending:
+            if file_from in small:
+                name = file_from.relative_to(self._drive_root).as_posix()
+                contained[file_from] = (name, stat)
+                file_to = container.path / name
+                fn = functools.partial(self.add_to_container, session, container, name, file_from, stat, time.monotonic())
+            else:
+                file_to = self.destinations(file_from)[0]
+                fn = functools.partial(
+                    self.copy_file, session, file_from, stat, time.monotonic(), resume_points[file_from],
+                )
+            future = self._scheduler.submit(fn, source_key=self._drive_name, destination_key=destination_key)
+            future.add_done_callback(
+                lambda f, file_from=file_from, file_to=file_to, size=stat.st_size: done.put((file_from, file_to, size, f))
+            )
+            queued += 1
+            report(block=False)
+
+        report(block=True)
+        records: List[IndexRecord] = []
+        failed: Set[Path] = set()
+        if container is not None:
+            failed, records = self.finish_container(container, contained)
+        self._metrics.finish_session(session)
+
+        # Written data is flushed once, and only then read back and recorded as imported,
+        # so a file cut short by power loss is never taken for imported
+        plain = [(file_from, file_to, digest) for file_from, file_to, digest in copied if file_from not in contained]
+        synced = True
+        sync_session = any(
+            self.export_item(file_from).durability == Durability.SESSION
+            for file_from, _, _ in copied if file_from not in failed
+        )
+        if sync_session:
+            written = [file_to for _, file_to, _ in plain]
+            if contained:
+                written += [container.path, container.index_path]
+            synced = self.sync_destination(written)
+
+        verified: List[Tuple[Path, Path]] = []
+        if synced:
+            for file_from, file_to, digest in plain:
+                export_item = self.export_item(file_from)
+                # FILE durability flushed each copy already, NONE durability leaves flushing to verification
+                on_disk = sync_session or export_item.durability == Durability.FILE
+                if self.verifies(export_item) and not self.verify_copies(file_from, digest, sync=not on_disk):
+                    continue
+                if self._blob_store is not None:
+                    self.deduplicate(self.destinations(file_from), digest)
+                relative_path = file_from.relative_to(self._drive_root).as_posix()
+                records.append((relative_path, ImportIndex.file_key(stats[file_from]), file_to, digest))
+                verified.append((file_from, file_to))
+            verified.extend(
+                (file_from, file_to) for file_from, file_to, _ in copied
+                if file_from in contained and file_from not in failed
+            )
+            self._index.record(self._drive_name, records)
+            for file_from, _ in verified:
+                if file_from not in contained:
+                    self._journal.complete(self._drive_name, file_from.relative_to(self._drive_root).as_posix())
+        self._journal.finish(self._drive_name)
+
+        imported = [file_to for file_from, file_to in verified if file_from not in contained]
+        if imported:
+            self.files_imported(imported)
+        # Sources are deleted only once their copies are known to be on disk
+        deletable = [file_from for file_from, _ in verified if self.export_item(file_from).delete]
+        if deletable:
+            self.delete_sources(deletable)
+
+        if self._export_item.unmount:
+            try:
+                self._fs.unmount(self._drive_name)
+            except:
+                logger.exception(f'Error unmounting {self._drive_name}')
+                self.progress_str(f'Error unmounting {self._drive_name}')
+
+
+class Engine:
+    """
+    Detects export item drives and creates import jobs for them
+    """
+
+    def __init__(self, settings_store: SettingsStore, fs: Optional[FSManager] = None,
+                 index: Optional[ImportIndex] = None, metrics: Optional[MetricsRecorder] = None,
+                 catalog: Optional[Catalog] = None, retention: Optional[Retention] = None,
+                 blob_store: Optional[BlobStore] = None, journal: Optional[TransferJournal] = None):
+        self._settings_store = settings_store
+        self._fs = fs or get_fs_manager()
+        self._drive_state: Dict[str, bool] = {}
+        self._limiters: Dict[str, TokenBucket] = {}
+
+        settings = settings_store.snapshot()
+        self._scheduler = TransferScheduler(
+            max_workers=settings.transfer_workers,
+            per_source_limit=settings.source_concurrency,
+            per_destination_limit=settings.destination_concurrency,
+        )
+        self._copy_engine = get_copy_engine(
+            buffer_size=settings.copy_buffer_size,
+            progress_interval=settings.progress_interval,
+            kernel_copy=settings.kernel_copy,
+            preallocate=settings.preallocate,
+            checkpoint_size=settings.checkpoint_size,
+            drop_cache=settings.drop_cache,
+            direct_io=settings.direct_io,
+        )
+        self._index = index or ImportIndex()
+        self._journal = journal or TransferJournal()
+        self._metrics = metrics or MetricsRecorder()
+        self._catalog = catalog or Catalog()
+        self._catalog_indexer = CatalogIndexer(self._catalog)
+        self._retention = retention or Retention()
+        self._blob_store = blob_store or BlobStore()
+        self._reserved: Dict[Path, int] = collections.Counter()
+        #: Running imports by session directory they reserved space for, retention does not evict these
+        self._reservations: Dict[Path, int] = collections.Counter()
+        self._reservation_lock = threading.Lock()
+
+    @property
+    def fs(self) -> FSManager:
+        return self._fs
+
+    @property
+    def scheduler(self) -> TransferScheduler:
+        return self._scheduler
+
+    @property
+    def metrics(self) -> MetricsRecorder:
+        return self._metrics
+
+    @property
+    def catalog(self) -> Catalog:
+        return self._catalog
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._metrics.snapshot(), scheduler=self._scheduler.stats())
+
+    def apply_settings(self):
+        """
+        Apply export items priority and bandwidth limit, including to transfers that are already running
+        """
+        for export_item in self.drive_export_items().values():
+            self._scheduler.set_priority(export_item.drive_name, PRIORITY_LEVELS[export_item.priority])
+            self.limiter(export_item.drive_name).rate = export_item.bandwidth_limit * 1024 ** 2
+
+    def drive_export_items(self) -> Dict[str, ExportItem]:
+        """
+        Return first export item of every drive, which holds drive-wide options
+        """
+        drives: Dict[str, ExportItem] = {}
+        for export_item in self._settings_store.snapshot().export_items:
+            drives.setdefault(export_item.drive_name, export_item)
+        return drives
+
+    def limiter(self, drive_name: str) -> TokenBucket:
+        if drive_name not in self._limiters:
+            self._limiters[drive_name] = TokenBucket(
+                paused=functools.partial(self._scheduler.preempted, drive_name),
+            )
+        return self._limiters[drive_name]
+
+    def scan_drives(self) -> Tuple[List[str], List[str]]:
+        """
+        Check automatic export items drives, return drives attached and detached since previous scan
+        """
+        new_state = {}
+        for export_item in self.drive_export_items().values():
+            if not export_item.automatic:
+                continue
+            new_state[export_item.drive_name] = self._fs.drive_exists(export_item.drive_name)
+
+        attached, detached = [], []
+        for drive, is_attached in new_state.items():
+            if is_attached and not self._drive_state.get(drive, False):
+                logger.info(f'Detected drive attach: {drive}')
+                attached.append(drive)
+            elif not is_attached and self._drive_state.get(drive, False):
+                logger.info(f'Detected drive detach: {drive}')
+                detached.append(drive)
+
+        self._drive_state.update(new_state)
+        return attached, detached
+
+    def assume_attached(self, drive_names: Iterable[str]):
+        """
+        Treat drives as already attached, so they are not imported until they are attached again
+        """
+        for drive_name in drive_names:
+            self._drive_state[drive_name] = True
+
+    def session_directories(self, drive_name: str, label: str) -> List[Path]:
+        """
+        Return directories of today's import of `drive_name` in target directory and every mirror directory
+        """
+        settings = self._settings_store.snapshot()
+        # Label is typed by user, it must not add directory levels, as archive root is the third parent of a session
+        label = drive_directory_name(label, 'default')
+        session = Path(datetime.date.today().isoformat()) / label / drive_directory_name(drive_name)
+        return [Path(root) / session for root in (settings.target_directory, *settings.mirror_directories)]
+
+    def enforce_retention(self, session_directory: Path):
+        """
+        Evict archive sessions exceeding retention limits, and sessions taking configured free space if enabled.
+        Raise InsufficientSpaceError if free space is still not enough.
+        """
+        settings = self._settings_store.snapshot()
+        root = session_directory.parents[2]
+        min_free = settings.min_free_space * 1024 ** 3
+
+        evicted = self._retention.enforce(
+            root,
+            max_size=settings.retention_max_size * 1024 ** 3,
+            max_age=settings.retention_max_age,
+            # Footage is deleted to make room only when asked to, otherwise low space just refuses the import
+            min_free=min_free if settings.retention_free_space else 0,
+            protect=[session_directory, *self.reserved_sessions()],
+            # Deduplicated files of an evicted session take space until their stored copy is unlinked too
+            after_evict=functools.partial(self._blob_store.collect, root),
+        )
+        for session in evicted:
+            self._catalog.remove(Path(session.path))
+        self.check_space(root, min_free)
+
+    @staticmethod
+    def check_space(root: Path, required: int, reserved: int = 0):
+        """
+        Raise InsufficientSpaceError if filesystem of `root` has less than `required` bytes free,
+        not counting `reserved` bytes promised to running imports
+        """
+        available = free_space(root) - reserved
+        if available < required:
+            raise InsufficientSpaceError(
+                f'Not enough free space in {root}: {max(available, 0) // 1024 ** 2} MiB available, '
+                f'{required // 1024 ** 2} MiB required'
+            )
+
+    def reserve_space(self, session_directories: List[Path], size: int):
+        """
+        Reserve `size` bytes on every destination for an import, on top of space reserved by running imports.
+        Raise InsufficientSpaceError if it does not fit, archived sessions are never evicted to make room.
+        """
+        min_free = self._settings_store.snapshot().min_free_space * 1024 ** 3
+        with self._reservation_lock:
+            for directory in session_directories:
+                root = directory.parents[2]
+                self.check_space(root, min_free + size, reserved=self._reserved[root])
+            for directory in session_directories:
+                self._reserved[directory.parents[2]] += size
+                self._reservations[directory] += 1
+
+    def release_space(self, session_directories: List[Path], size: int):
+        with self._reservation_lock:
+            for directory in session_directories:
+                self._reserved[directory.parents[2]] -= size
+
+    def end_reservation(self, session_directories: List[Path], size: int):
+        with self._reservation_lock:
+            for directory in session_directories:
+                self._reserved[directory.parents[2]] -= size
+                self._reservations[directory] -= 1
+                if not self._reservations[directory]:
+                    del self._reservations[directory]
+
+    def reserved_sessions(self) -> List[Path]:
+        """
+        Return session directories of running imports
+        """
+        with self._reservation_lock:
+            return list(self._reservations)
+
+    def on_files_imported(self, drive_name: str, label: str, session_directories: List[Path], paths: List[Path]):
+        self._catalog_indexer.submit(drive_name, label, paths)
+        for directory in session_directories:
+            try:
+                self._retention.index.refresh(directory.parents[2], directory)
+                self.enforce_retention(directory)
+            except:
+                logger.exception(f'Error enforcing retention in {directory.parents[2]} after importing {drive_name}')
+
+    def create_job(self, drive_name: str, label: str = '') -> Optional[ImportJob]:
+        """
+        Return import job for attached drive, or None if drive is unknown or not attached.
+        Raises InsufficientSpaceError if target filesystem is full even after retention.
+        """
+        label = label.strip() or 'default'
+        job = self._new_job(drive_name, label)
+        if job is None:
+            return None
+        session_directories = self.session_directories(drive_name, label)
+
+        # Pre-flight check, so the disk does not fill up mid-copy
+        for directory in session_directories:
+            self.enforce_retention(directory)
+
+        job.files_imported = functools.partial(self.on_files_imported, drive_name, label, session_directories)
+        job.reserve_space = functools.partial(self.reserve_space, session_directories)
+        job.release_space = functools.partial(self.release_space, session_directories)
+        job.end_reservation = functools.partial(self.end_reservation, session_directories)
+        return job
+
+    def plan(self, drive_name: str, label: str = '') -> Optional[TransferPlan]:
+        """
+        Dry run: return what importing attached drive would copy, without copying, evicting or reserving anything.
+        Return None if drive is unknown or not attached.
+        """
+        job = self._new_job(drive_name, label.strip() or 'default')
+        return job.plan() if job is not None else None
+
+    def _new_job(self, drive_name: str, label: str) -> Optional[ImportJob]:
+        settings = self._settings_store.snapshot()
+        export_items = [export_item for export_item in settings.export_items if export_item.drive_name == drive_name]
+        if not export_items:
+            return None
+
+        drive_root = self._fs.drive_path(drive_name)
+        if drive_root is None:
+            return None
+
+        self.apply_settings()
+        target_directory, *mirror_directories = self.session_directories(drive_name, label)
+        # Rules of all export items of the drive are matched in a single walk
+        matcher = RuleMatcher([file_rule(export_item) for export_item in export_items])
+        return ImportJob(
+            self._scheduler, self._copy_engine, self._index, self._journal, self._fs, self._metrics, export_items,
+            settings.hash_algorithm,
+            drive_root, self._fs.find_rule_matches(drive_name, matcher), target_directory,
+            self.limiter(drive_name), mirror_directories, self._blob_store if settings.deduplicate else None,
+        )
+
+    def shutdown(self, wait: bool = False):
+        self._fs.stop_watching()
+        self._scheduler.shutdown(wait=wait)
+        self._catalog_indexer.shutdown(wait=wait)
@@ -1,22 +1,164 @@
+import ctypes
+import logging
+import os
 import re
+import select
+import shutil
+import subprocess
 import sys
+import threading
 from pathlib import Path
-from typing import Tuple
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from dvrmanager.discovery import Match, RuleMatch, RuleMatcher, iter_matches
+
+logger = logging.getLogger(__name__)
+
+_libc = None
+
+
+def _syncfs(fd: int) -> bool:
+    """
+    Call Linux syncfs(2) on filesystem containing `fd`. Return False if not available.
+    """
+    global _libc
+    if not sys.platform.startswith('linux'):
+        return False
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+    if not hasattr(_libc, 'syncfs'):
+        return False
+    if _libc.syncfs(fd) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+    return True
+
+
+#: Flags of sync_file_range(2)
+SYNC_FILE_RANGE_WAIT_BEFORE = 1
+SYNC_FILE_RANGE_WRITE = 2
+SYNC_FILE_RANGE_WAIT_AFTER = 4
+
+
+def sync_file_range(fd: int, offset: int, length: int, flags: int) -> bool:
+    """
+    Call Linux sync_file_range(2) to start or wait for writeback of a byte range. Return False if not available.
+    """
+    global _libc
+    if not sys.platform.startswith('linux'):
+        return False
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+    function = getattr(_libc, 'sync_file_range', None)
+    if function is None:
+        return False
+    function.argtypes = (ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_uint)
+    if function(fd, offset, length, flags) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+    return True
+
+
+def fallocate(fd: int, offset: int, length: int) -> bool:
+    """
+    Call Linux fallocate(2) to allocate a byte range. Unlike posix_fallocate(3), it fails with EOPNOTSUPP
+    instead of writing every block where the filesystem does not support allocation. Return False if not available.
+    """
+    global _libc
+    if not sys.platform.startswith('linux'):
+        return False
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+    function = getattr(_libc, 'fallocate64', None) or getattr(_libc, 'fallocate', None)
+    if function is None:
+        return False
+    function.argtypes = (ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64)
+    if function(fd, 0, offset, length) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+    return True
+
+
+def sync_filesystem(path: Path) -> bool:
+    """
+    Flush all dirty data of filesystem containing `path` to disk. Return False if not supported on this platform.
+    """
+    # Directories can not be opened this way on Windows, callers fall back to sync_files there
+    if not sys.platform.startswith('linux'):
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return _syncfs(fd)
+    finally:
+        os.close(fd)
+
+
+def sync_files(paths: Iterable[Path]):
+    """
+    Flush files and their directories to disk one by one
+    """
+    directories = set()
+    for path in paths:
+        with open(path, 'rb+') as f:
+            os.fsync(f.fileno())
+        directories.add(Path(path).parent)
+
+    for directory in directories:
+        sync_directory(directory)
+
+
+def sync_directory(path: Path):
+    """
+    Flush directory entries of `path` to disk, so files created or renamed in it keep their names after power loss
+    """
+    if sys.platform == 'win32':
+        # Directories can not be opened for fsync on Windows, metadata is flushed with files
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
 
 class FSManager:
     def drive_exists(self, drive_name: str) -> bool:
         raise NotImplementedError()
 
-    def drive_path(self, drive_name: str) -> bool:
+    def drive_path(self, drive_name: str) -> Optional[Path]:
         raise NotImplementedError()
 
-    def find_matches(self, drive_name: str, drive_path: Path) -> Tuple[Path, ...]:
-        raise NotImplementedError()
+    def find_matches(self, drive_name: str, drive_path: Path) -> Iterator[Match]:
+        """
+        Lazily yield files on drive matching `drive_path` pattern, relative to drive root
+        """
+        drive = self.drive_path(drive_name)
+        if drive is None:
+            return iter(())
+        return iter_matches(drive, str(drive_path))
+
+    def find_rule_matches(self, drive_name: str, matcher: RuleMatcher) -> Iterator[RuleMatch]:
+        """
+        Lazily yield files on drive matching any rule of `matcher`, walking the drive once
+        """
+        drive = self.drive_path(drive_name)
+        if drive is None:
+            return iter(())
+        return matcher.iter_matches(drive)
 
     def unmount(self, drive_name: str):
         raise NotImplementedError()
 
+    def watch(self, on_change: Callable[[], None]) -> bool:
+        """
+        Start calling `on_change` from a background thread whenever drives may have been attached or detached.
+        Return False if not supported, in which case drives have to be polled.
+        """
+        return False
+
+    def stop_watching(self):
+        pass
+
 
 class WinFS(FSManager):
     def drive_path(self, drive_name: str) -> Path:
@@ -29,14 +171,150 @@ class WinFS(FSManager):
     def drive_exists(self, drive_name: str) -> bool:
         return self.drive_path(drive_name).exists()
 
-    def find_matches(self, drive_name: str, drive_path: Path) -> Tuple[Path, ...]:
-        drive = self.drive_path(drive_name)
-        return tuple(drive.rglob(str(drive_path)))
-
     def unmount(self, drive_name: str):
         pass
 
 
+def _unescape_mountinfo(value: str) -> str:
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), value)
+
+
+def _unescape_udev(value: str) -> str:
+    return re.sub(r'\\x([0-9a-fA-F]{2})', lambda m: chr(int(m.group(1), 16)), value)
+
+
+class MountWatcher:
+    """
+    Waits for mount table changes on /proc/self/mountinfo and calls `on_change`
+    once the table stayed unchanged for `debounce` seconds.
+    """
+
+    def __init__(self, on_change: Callable[[], None], mountinfo: Path, debounce: float = 0.5):
+        self._on_change = on_change
+        self._mountinfo = mountinfo
+        self._debounce = debounce
+        self._stop_read, self._stop_write = os.pipe()
+        self._thread = threading.Thread(target=self._run, name='mount-watcher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        os.write(self._stop_write, b'x')
+        self._thread.join()
+        os.close(self._stop_read)
+        os.close(self._stop_write)
+
+    def _run(self):
+        with open(self._mountinfo, 'rb') as f:
+            poller = select.poll()
+            # Kernel reports mount table changes on mountinfo as POLLPRI | POLLERR
+            poller.register(f.fileno(), select.POLLPRI | select.POLLERR)
+            poller.register(self._stop_read, select.POLLIN)
+            f.read()
+
+            pending = False
+            while True:
+                events = poller.poll(self._debounce * 1000 if pending else None)
+                if any(fd == self._stop_read for fd, _ in events):
+                    return
+                if events:
+                    f.seek(0)
+                    f.read()
+                    pending = True
+                elif pending:
+                    pending = False
+                    try:
+                        self._on_change()
+                    except:
+                        logger.exception('Error handling mount table change')
+
+
+class LinuxFS(FSManager):
+    """
+    Drives are looked up in mount table either by mount point (absolute drive name), by filesystem label
+    or by the last component of mount point, like /media/<user>/<label>
+    """
+
+    MOUNTINFO = Path('/proc/self/mountinfo')
+    LABELS_DIR = Path('/dev/disk/by-label')
+
+    def __init__(self):
+        self._watcher: Optional[MountWatcher] = None
+
+    def mounts(self) -> Dict[Path, str]:
+        """
+        Return mount points mapped to their mount sources
+        """
+        mounts = {}
+        for line in self.MOUNTINFO.read_text().splitlines():
+            fields, _, tail = line.partition(' - ')
+            fields, tail = fields.split(), tail.split()
+            if len(fields) < 5 or len(tail) < 2:
+                continue
+            mounts[Path(_unescape_mountinfo(fields[4]))] = _unescape_mountinfo(tail[1])
+        return mounts
+
+    def labels(self) -> Dict[str, str]:
+        """
+        Return filesystem labels mapped to their device paths
+        """
+        if not self.LABELS_DIR.is_dir():
+            return {}
+        return {_unescape_udev(link.name): os.path.realpath(link) for link in self.LABELS_DIR.iterdir()}
+
+    def drive_path(self, drive_name: str) -> Optional[Path]:
+        mounts = self.mounts()
+
+        if drive_name.startswith('/'):
+            return Path(drive_name) if Path(drive_name) in mounts else None
+
+        device = self.labels().get(drive_name)
+        for mount_point, source in mounts.items():
+            if device and os.path.realpath(source) == device:
+                return mount_point
+        for mount_point in mounts:
+            if mount_point.name == drive_name and mount_point.parent != Path('/'):
+                return mount_point
+        return None
+
+    def drive_exists(self, drive_name: str) -> bool:
+        return self.drive_path(drive_name) is not None
+
+    def unmount(self, drive_name: str):
+        mount_point = self.drive_path(drive_name)
+        if mount_point is None:
+            return
+
+        # Deleted sources have to reach the card before it is unmounted
+        if not sync_filesystem(mount_point):
+            os.sync()
+
+        device = self.mounts()[mount_point]
+        if shutil.which('udisksctl') and device.startswith('/dev/'):
+            command = ['udisksctl', 'unmount', '--no-user-interaction', '-b', device]
+        else:
+            command = ['umount', str(mount_point)]
+
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+        if result.returncode != 0:
+            raise OSError(f'Error unmounting {mount_point}: {result.stdout.strip()}')
+        logger.info(f'Unmounted {drive_name} ({mount_point})')
+
+    def watch(self, on_change: Callable[[], None]) -> bool:
+        if self._watcher is None:
+            self._watcher = MountWatcher(on_change, self.MOUNTINFO)
+            self._watcher.start()
+        return True
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+
 def get_fs_manager() -> FSManager:
     if sys.platform == 'win32':
         return WinFS()
+    if sys.platform.startswith('linux'):
+        return LinuxFS()
@@ -0,0 +1,83 @@
+"""
+Persistent index of already imported files
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from dvrmanager import config
+
+logger = logging.getLogger(__name__)
+
+FileKey = Tuple[int, int]
+#: Imported file as (relative path, file key, destination, digest)
+IndexRecord = Tuple[str, FileKey, Path, Optional[str]]
+
+
+class ImportIndex:
+    """
+    Remembers every file imported from a drive by its path relative to drive root, size and modification time,
+    so files that did not change since last import can be skipped.
+    """
+
+    def __init__(self, path: Path = None):
+        self._path = path or self.default_path()
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self._path), check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS imports ('
+            'drive TEXT NOT NULL, '
+            'path TEXT NOT NULL, '
+            'size INTEGER NOT NULL, '
+            'mtime_ns INTEGER NOT NULL, '
+            'destination TEXT NOT NULL, '
+            'imported_at REAL NOT NULL, '
+            'digest TEXT, '
+            'PRIMARY KEY (drive, path))'
+        )
+        columns = {row[1] for row in self._connection.execute('PRAGMA table_info(imports)')}
+        if 'digest' not in columns:
+            self._connection.execute('ALTER TABLE imports ADD COLUMN digest TEXT')
+        self._connection.commit()
+
+    @staticmethod
+    def default_path() -> Path:
+        return config.APP_DATA_DIR / 'import_index.sqlite3'
+
+    @staticmethod
+    def file_key(stat: os.stat_result) -> FileKey:
+        return stat.st_size, stat.st_mtime_ns
+
+    def imported(self, drive: str) -> Dict[str, FileKey]:
+        """
+        Return all files imported from `drive` mapped to their (size, mtime_ns) at import time
+        """
+        with self._lock:
+            rows = self._connection.execute('SELECT path, size, mtime_ns FROM imports WHERE drive = ?', (drive,))
+            return {path: (size, mtime_ns) for path, size, mtime_ns in rows}
+
+    def record(self, drive: str, files: Iterable[IndexRecord]):
+        """
+        Record imported files given as (relative path, file key, destination, digest) tuples
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO imports (drive, path, size, mtime_ns, destination, imported_at, digest) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (
+                    (drive, path, size, mtime_ns, str(destination), now, digest)
+                    for path, (size, mtime_ns), destination, digest in files
+                )
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
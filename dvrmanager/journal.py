@@ -0,0 +1,126 @@
+"""
+Write-ahead journal of transfers, so an interrupted import can be resumed
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from dvrmanager import config
+from dvrmanager.copier import ResumePoint
+from dvrmanager.index import FileKey
+
+logger = logging.getLogger(__name__)
+
+PLANNED = 'planned'
+COPYING = 'copying'
+DONE = 'done'
+
+
+class JournalEntry(NamedTuple):
+    path: str
+    key: FileKey
+    destinations: List[str]
+    state: str
+    resume: ResumePoint
+
+
+class TransferJournal:
+    """
+    Records every transfer of a drive before it starts, its last checkpoint while it runs and its completion.
+    Entries are kept by drive and source path relative to drive root.
+    """
+
+    def __init__(self, path: Path = None):
+        self._path = path or self.default_path()
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self._path), check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        # Checkpoints must survive a power loss as well as the partial data they describe
+        self._connection.execute('PRAGMA synchronous=FULL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS transfers ('
+            'drive TEXT NOT NULL, '
+            'path TEXT NOT NULL, '
+            'size INTEGER NOT NULL, '
+            'mtime_ns INTEGER NOT NULL, '
+            'destinations TEXT NOT NULL, '
+            'state TEXT NOT NULL, '
+            'copied INTEGER NOT NULL, '
+            'digest TEXT, '
+            'updated_at REAL NOT NULL, '
+            'PRIMARY KEY (drive, path))'
+        )
+        self._connection.commit()
+
+    @staticmethod
+    def default_path() -> Path:
+        return config.APP_DATA_DIR / 'journal.sqlite3'
+
+    def unfinished(self, drive: str) -> Dict[str, JournalEntry]:
+        """
+        Return transfers of `drive` that were planned or started but did not complete, by source path
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT path, size, mtime_ns, destinations, state, copied, digest FROM transfers '
+                'WHERE drive = ? AND state != ?', (drive, DONE)
+            ).fetchall()
+        return {
+            path: JournalEntry(path, (size, mtime_ns), json.loads(destinations), state, ResumePoint(copied, digest))
+            for path, size, mtime_ns, destinations, state, copied, digest in rows
+        }
+
+    def plan(self, drive: str, transfers: Iterable[Tuple[str, FileKey, List[Path], ResumePoint]]):
+        """
+        Record transfers given as (relative path, file key, destinations, resume point) tuples before they start
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO transfers '
+                '(drive, path, size, mtime_ns, destinations, state, copied, digest, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    (
+                        drive, path, size, mtime_ns, json.dumps([str(d) for d in destinations]),
+                        COPYING if resume.offset else PLANNED, resume.offset, resume.digest, now,
+                    )
+                    for path, (size, mtime_ns), destinations, resume in transfers
+                )
+            )
+
+    def checkpoint(self, drive: str, path: str, offset: int, digest: Optional[str]):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'UPDATE transfers SET state = ?, copied = ?, digest = ?, updated_at = ? WHERE drive = ? AND path = ?',
+                (COPYING, offset, digest, time.time(), drive, path)
+            )
+
+    def complete(self, drive: str, path: str):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'UPDATE transfers SET state = ?, updated_at = ? WHERE drive = ? AND path = ?',
+                (DONE, time.time(), drive, path)
+            )
+
+    def discard(self, drive: str, paths: Iterable[str]):
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'DELETE FROM transfers WHERE drive = ? AND path = ?', ((drive, path) for path in paths)
+            )
+
+    def finish(self, drive: str):
+        """
+        Forget completed transfers of `drive` once its session is over
+        """
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM transfers WHERE drive = ? AND state = ?', (drive, DONE))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
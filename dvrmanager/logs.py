@@ -1,21 +1,139 @@
 """
 Logging configuration
 """
+import atexit
 import logging
 import logging.config
-
-from PyQt6.QtWidgets import QStatusBar
+import logging.handlers
+import queue
+import threading
+from typing import List, Optional
 
 from dvrmanager import config
 
+_listener: Optional['LogListener'] = None
+
 
 def configure():
     """
-    Contifure logging facilites
+    Contifure logging facilites.
+
+    Application loggers only put records to a queue, and a background listener passes them to the actual handlers,
+    so logging never blocks the calling thread on I/O.
     """
     config.LOGS_DIR.mkdir(parents=True, exist_ok=True)
     logging.config.dictConfig(LOGGING_CONFIG)
 
+    logger = logging.getLogger('dvrmanager')
+    handlers = list(logger.handlers)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    _start_listener(logger, handlers)
+
+
+def configure_worker(handler: logging.Handler):
+    """
+    Configure logging of a worker process, which passes records to `handler` only, from a background listener
+    """
+    logger = logging.getLogger('dvrmanager')
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    _start_listener(logger, [handler])
+
+
+def _start_listener(logger: logging.Logger, handlers: List[logging.Handler]):
+    global _listener
+
+    records = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    _listener = LogListener(records, handlers)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def stop():
+    """
+    Pass remaining records to handlers and stop listener
+    """
+    if _listener is not None:
+        _listener.stop()
+
+
+def add_handler(handler: logging.Handler):
+    """
+    Add handler to application logging pipeline. It will be called from the listener thread.
+    """
+    if _listener is not None:
+        _listener.add_handler(handler)
+    else:
+        logging.getLogger('dvrmanager').addHandler(handler)
+
+
+class BatchFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rotating file handler that flushes only when asked by listener, once per batch of records
+    """
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super(BatchFileHandler, self).flush()
+
+
+class LogListener:
+    """
+    Takes records from queue in batches and passes them to handlers in a background thread
+    """
+    _STOP = object()
+
+    def __init__(self, records: 'queue.SimpleQueue', handlers: List[logging.Handler], batch_size: int = 256):
+        self._records = records
+        self._handlers = list(handlers)
+        self._batch_size = batch_size
+        self._thread: Optional[threading.Thread] = None
+
+    def add_handler(self, handler: logging.Handler):
+        # Replacing the list keeps iteration in listener thread safe
+        self._handlers = self._handlers + [handler]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='log-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._records.put(self._STOP)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            batch = [self._records.get()]
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(self._records.get_nowait())
+                except queue.Empty:
+                    break
+
+            handlers = self._handlers
+            for record in batch:
+                if record is self._STOP:
+                    self._flush(handlers)
+                    return
+                for handler in handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+            self._flush(handlers)
+
+    @staticmethod
+    def _flush(handlers: List[logging.Handler]):
+        for handler in handlers:
+            try:
+                getattr(handler, 'flush_batch', handler.flush)()
+            except Exception:
+                pass
+
 
 LOGGING_CONFIG = {
     'version': 1,
@@ -37,7 +155,7 @@ LOGGING_CONFIG = {
         },
         'file': {
             'level': 'DEBUG',
-            'class': 'logging.handlers.RotatingFileHandler',
+            'class': 'dvrmanager.logs.BatchFileHandler',
             'formatter': 'default',
             'filename': config.LOGS_DIR / f'{config.APP_NAME}.log',
             'maxBytes': 1024 * 1024,  # 1 mb
@@ -57,20 +175,3 @@ LOGGING_CONFIG = {
     },
 }
 
-
-class StatusBarHandler(logging.StreamHandler):
-    def __init__(self, status_bar: QStatusBar):
-        self._status_bar = status_bar
-
-        super(StatusBarHandler, self).__init__()
-
-    def emit(self, record: logging.LogRecord) -> None:
-        try:
-            msg = self.format(record)
-            self._status_bar.clearMessage()
-            self._status_bar.showMessage(msg, 5000)
-            self.flush()
-        except RecursionError:
-            raise
-        except Exception:
-            self.handleError(record)
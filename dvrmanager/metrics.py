@@ -0,0 +1,182 @@
+"""
+Transfer metrics
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from dvrmanager import config
+
+logger = logging.getLogger(__name__)
+
+
+class TransferRecord(NamedTuple):
+    source: str
+    destination: str
+    bytes: int
+    duration: float
+    queue_wait: float
+    ok: bool = True
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second"""
+        return self.bytes / self.duration if self.duration > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(self._asdict(), throughput=self.throughput)
+
+
+class Session:
+    """
+    Metrics of one import job
+    """
+
+    def __init__(self, session_id: str, drive_name: str, keep_records: int = 200):
+        self.id = session_id
+        self.drive_name = drive_name
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.files = 0
+        self.errors = 0
+        self.bytes = 0
+        self.busy_seconds = 0.0
+        self.queue_wait_seconds = 0.0
+        self.records: List[TransferRecord] = []
+        self._keep_records = keep_records
+
+    def add(self, record: TransferRecord):
+        if record.ok:
+            self.files += 1
+            self.bytes += record.bytes
+        else:
+            self.errors += 1
+        self.busy_seconds += record.duration
+        self.queue_wait_seconds += record.queue_wait
+        self.records.append(record)
+        del self.records[:-self._keep_records]
+
+    def summary(self, with_records: bool = False) -> Dict[str, Any]:
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        summary = {
+            'id': self.id,
+            'drive_name': self.drive_name,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'elapsed': elapsed,
+            'files': self.files,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            # Wall clock throughput of the whole session, and average throughput of single file copy
+            'throughput': self.bytes / elapsed if elapsed > 0 else 0.0,
+            'file_throughput': self.bytes / self.busy_seconds if self.busy_seconds > 0 else 0.0,
+            'average_queue_wait': self.queue_wait_seconds / (self.files + self.errors) if self.files + self.errors else 0.0,
+        }
+        if with_records:
+            summary['records'] = [r.as_dict() for r in self.records]
+        return summary
+
+
+class MetricsRecorder:
+    """
+    Collects transfer metrics. Current state is written to a JSON stats file at most once per `write_interval`
+    seconds, and summaries of finished sessions are appended to a JSON lines history file.
+    """
+
+    def __init__(self, stats_dir: Path = None, write_interval: float = 1.0, keep_sessions: int = 20):
+        self._stats_dir = stats_dir or config.STATS_DIR
+        self._write_interval = write_interval
+        self._keep_sessions = keep_sessions
+        self._lock = threading.Lock()
+        self._active: Dict[str, Session] = {}
+        self._finished: List[Session] = []
+        self._last_write = 0.0
+        self._counter = 0
+
+    @property
+    def stats_path(self) -> Path:
+        return self._stats_dir / 'stats.json'
+
+    @property
+    def history_path(self) -> Path:
+        return self._stats_dir / 'sessions.jsonl'
+
+    def start_session(self, drive_name: str) -> Session:
+        with self._lock:
+            self._counter += 1
+            session = Session(f'{int(time.time())}-{os.getpid()}-{self._counter}', drive_name)
+            self._active[session.id] = session
+        self.write(force=True)
+        return session
+
+    def record(self, session: Session, record: TransferRecord):
+        with self._lock:
+            session.add(record)
+        self.write()
+
+    def finish_session(self, session: Session):
+        with self._lock:
+            session.finished_at = time.time()
+            self._active.pop(session.id, None)
+            self._finished.append(session)
+            del self._finished[:-self._keep_sessions]
+            summary = session.summary()
+
+        try:
+            self._stats_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.history_path, 'a') as f:
+                f.write(json.dumps(summary) + '\n')
+        except:
+            logger.exception(f'Error writing session history to {self.history_path}')
+        self.write(force=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = list(self._active.values()) + self._finished
+            return {
+                'updated_at': time.time(),
+                'active_sessions': len(self._active),
+                'totals': {
+                    'files': sum(s.files for s in sessions),
+                    'errors': sum(s.errors for s in sessions),
+                    'bytes': sum(s.bytes for s in sessions),
+                },
+                'active': [s.summary(with_records=True) for s in self._active.values()],
+                'finished': [s.summary() for s in reversed(self._finished)],
+            }
+
+    def history(self, drive_name: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield summaries of finished sessions, oldest first
+        """
+        if not self.history_path.exists():
+            return
+        with open(self.history_path) as f:
+            for line in f:
+                try:
+                    summary = json.loads(line)
+                except ValueError:
+                    continue
+                if drive_name is None or summary.get('drive_name') == drive_name:
+                    yield summary
+
+    def write(self, force: bool = False):
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_write < self._write_interval:
+                return
+            self._last_write = now
+
+        try:
+            self._stats_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.stats.', dir=self._stats_dir)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.snapshot(), f, indent=2)
+            os.replace(tmp_path, self.stats_path)
+        except:
+            logger.exception(f'Error writing stats to {self.stats_path}')
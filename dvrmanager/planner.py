@@ -0,0 +1,135 @@
+"""
+Transfer planning: what an import of a drive would copy and how long it would take, without copying anything
+"""
+import os
+import statistics
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+#: Sessions shorter than this many seconds are dominated by setup time and do not tell throughput
+MIN_SESSION_SECONDS = 5.0
+#: Throughput below this fraction of usual throughput of a drive is reported as a slowdown
+SLOWDOWN_RATIO = 0.7
+
+
+class PlannedFile(NamedTuple):
+    source: Path
+    stat: os.stat_result
+    #: Destination in target directory first and then in mirror directories, a container member for contained files
+    destinations: List[Path]
+    contained: bool = False
+
+    @property
+    def size(self) -> int:
+        return self.stat.st_size
+
+
+class SkippedFile(NamedTuple):
+    source: Path
+    reason: str
+
+
+def session_throughputs(history: Iterable[Dict[str, Any]], sessions: int = 5) -> List[float]:
+    """
+    Return wall clock throughput in bytes per second of the latest `sessions` sessions in history, oldest first
+    """
+    throughputs = [
+        summary['throughput'] for summary in history
+        if summary.get('bytes') and summary.get('elapsed', 0) >= MIN_SESSION_SECONDS
+    ]
+    return throughputs[-sessions:]
+
+
+class TransferPlan:
+    """
+    Files an import of a drive would copy, with ETA estimated from throughput of earlier imports of the drive
+    """
+
+    def __init__(self, drive_name: str, files: List[PlannedFile], skipped: List[SkippedFile],
+                 throughputs: List[float]):
+        self.drive_name = drive_name
+        self.files = files
+        self.skipped = skipped
+        #: Throughput of earlier sessions of the drive, oldest first
+        self.throughputs = throughputs
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(planned.size for planned in self.files)
+
+    @property
+    def throughput(self) -> Optional[float]:
+        """
+        Expected throughput in bytes per second, median of earlier sessions so a single outlier does not skew it
+        """
+        return statistics.median(self.throughputs) if self.throughputs else None
+
+    @property
+    def eta(self) -> Optional[float]:
+        """
+        Expected duration of the import in seconds, None if drive was never imported
+        """
+        if not self.files:
+            return 0.0
+        throughput = self.throughput
+        return self.total_bytes / throughput if throughput else None
+
+    @property
+    def slowdown(self) -> Optional[float]:
+        """
+        Ratio of latest session throughput to the median of sessions before it, if it fell below SLOWDOWN_RATIO
+        """
+        if len(self.throughputs) < 2:
+            return None
+        ratio = self.throughputs[-1] / statistics.median(self.throughputs[:-1])
+        return ratio if ratio < SLOWDOWN_RATIO else None
+
+    def summary(self, with_files: bool = False) -> Dict[str, Any]:
+        summary = {
+            'drive_name': self.drive_name,
+            'files': len(self.files),
+            'contained': sum(1 for planned in self.files if planned.contained),
+            'skipped': len(self.skipped),
+            'bytes': self.total_bytes,
+            'throughput': self.throughput,
+            'throughputs': self.throughputs,
+            'eta': self.eta,
+            'slowdown': self.slowdown,
+        }
+        if with_files:
+            summary['transfers'] = [
+                {'source': str(p.source), 'size': p.size, 'destinations': [str(d) for d in p.destinations]}
+                for p in self.files
+            ]
+            summary['skips'] = [{'source': str(s.source), 'reason': s.reason} for s in self.skipped]
+        return summary
+
+
+def describe(summary: Dict[str, Any]) -> str:
+    """
+    Return one line description of a plan summary
+    """
+    text = (
+        f'Drive {summary["drive_name"]}: {summary["files"]} files to copy, {summary["bytes"] / 1024 ** 3:.2f} GB, '
+        f'{summary["skipped"]} skipped'
+    )
+    if summary['eta'] is None:
+        text += ', no earlier imports to estimate time from'
+    elif summary['files']:
+        text += f', about {format_duration(summary["eta"])} at {summary["throughput"] / 1024 ** 2:.1f} MB/s'
+    if summary['slowdown'] is not None:
+        text += (
+            f'. Last import ran at {summary["throughputs"][-1] / 1024 ** 2:.1f} MB/s, '
+            f'{summary["slowdown"] * 100:.0f}% of usual, check card and reader'
+        )
+    return text
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f'{hours}h {minutes:02d}m'
+    if minutes:
+        return f'{minutes}m {seconds:02d}s'
+    return f'{seconds}s'
@@ -0,0 +1,251 @@
+"""
+Archive retention: disk budget and maximum age of imported sessions
+"""
+import datetime
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple
+
+from dvrmanager import config
+
+logger = logging.getLogger(__name__)
+
+_DATE_DIR = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+class InsufficientSpaceError(OSError):
+    pass
+
+
+class ArchiveSession(NamedTuple):
+    path: str
+    date: str
+    label: str
+    drive: str
+    size: int
+    files: int
+
+
+def directory_size(path: Path) -> Tuple[int, int]:
+    """
+    Return total size and count of files under `path`
+    """
+    size = files = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    dir_size, dir_files = directory_size(Path(entry.path))
+                    size += dir_size
+                    files += dir_files
+                elif entry.is_file(follow_symlinks=False):
+                    size += entry.stat(follow_symlinks=False).st_size
+                    files += 1
+    except FileNotFoundError:
+        pass
+    return size, files
+
+
+def free_space(path: Path) -> int:
+    """
+    Return free bytes on filesystem that will hold `path`, even if `path` does not exist yet
+    """
+    path = Path(path).absolute()
+    for parent in (path, *path.parents):
+        try:
+            return shutil.disk_usage(parent).free
+        except FileNotFoundError:
+            continue
+    return 0
+
+
+class RetentionIndex:
+    """
+    SQLite index of archive sessions, i.e. target_directory/date/label/drive directories, with their size.
+    Archive tree is walked only once per target directory, afterwards sessions are refreshed as they are written.
+    """
+
+    def __init__(self, path: Path = None):
+        self._path = path or self.default_path()
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self._path), check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'path TEXT PRIMARY KEY, '
+            'root TEXT NOT NULL, '
+            'date TEXT NOT NULL, '
+            'label TEXT NOT NULL, '
+            'drive TEXT NOT NULL, '
+            'size INTEGER NOT NULL, '
+            'files INTEGER NOT NULL, '
+            'updated_at REAL NOT NULL);'
+            'CREATE INDEX IF NOT EXISTS sessions_root_date ON sessions (root, date, updated_at);'
+            'CREATE TABLE IF NOT EXISTS roots (root TEXT PRIMARY KEY, scanned_at REAL NOT NULL);'
+        )
+        self._connection.commit()
+
+    @staticmethod
+    def default_path() -> Path:
+        return config.APP_DATA_DIR / 'retention.sqlite3'
+
+    def ensure_scanned(self, root: Path):
+        """
+        Walk archive at `root` unless it was already indexed
+        """
+        with self._lock:
+            scanned = self._connection.execute('SELECT 1 FROM roots WHERE root = ?', (str(root),)).fetchone()
+        if not scanned:
+            self.scan(root)
+
+    def scan(self, root: Path):
+        started_at = time.monotonic()
+        sessions = []
+        for date_dir in self._subdirectories(root):
+            if not _DATE_DIR.match(date_dir.name):
+                continue
+            for label_dir in self._subdirectories(date_dir):
+                for session_dir in self._subdirectories(label_dir):
+                    sessions.append((session_dir, *directory_size(session_dir)))
+
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM sessions WHERE root = ?', (str(root),))
+            self._connection.executemany(
+                'INSERT INTO sessions (path, root, date, label, drive, size, files, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    (str(path), str(root), path.parent.parent.name, path.parent.name, path.name, size, files, now)
+                    for path, size, files in sessions
+                )
+            )
+            self._connection.execute('INSERT OR REPLACE INTO roots (root, scanned_at) VALUES (?, ?)', (str(root), now))
+        logger.info(f'Indexed {len(sessions)} archive sessions in {root} in {time.monotonic() - started_at:.1f}s')
+
+    def refresh(self, root: Path, session_dir: Path):
+        """
+        Update size of single session directory after files were written to it
+        """
+        size, files = directory_size(session_dir)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO sessions (path, root, date, label, drive, size, files, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    str(session_dir), str(root), session_dir.parent.parent.name, session_dir.parent.name,
+                    session_dir.name, size, files, time.time(),
+                )
+            )
+
+    def total_size(self, root: Path) -> int:
+        with self._lock:
+            return self._connection.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM sessions WHERE root = ?', (str(root),)
+            ).fetchone()[0]
+
+    def sessions(self, root: Path) -> List[ArchiveSession]:
+        """
+        Return sessions of archive at `root`, oldest first
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                f'SELECT {", ".join(ArchiveSession._fields)} FROM sessions WHERE root = ? ORDER BY date, updated_at',
+                (str(root),),
+            ).fetchall()
+        return [ArchiveSession(*row) for row in rows]
+
+    def remove(self, path: str):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM sessions WHERE path = ?', (path,))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    @staticmethod
+    def _subdirectories(path: Path) -> List[Path]:
+        try:
+            with os.scandir(path) as entries:
+                return [Path(entry.path) for entry in entries if entry.is_dir(follow_symlinks=False)]
+        except FileNotFoundError:
+            return []
+
+
+class Retention:
+    """
+    Evicts oldest archive sessions to keep archive within size budget and age limit,
+    and to keep free space on the target filesystem.
+    """
+
+    def __init__(self, index: Optional[RetentionIndex] = None):
+        self._index = index or RetentionIndex()
+        self._lock = threading.Lock()
+
+    @property
+    def index(self) -> RetentionIndex:
+        return self._index
+
+    def enforce(self, root: Path, max_size: int = 0, max_age: int = 0, min_free: int = 0,
+                protect: Iterable[Path] = (),
+                after_evict: Optional[Callable[[], None]] = None) -> List[ArchiveSession]:
+        """
+        Evict sessions older than `max_age` days, then oldest sessions while archive is larger than `max_size`
+        or filesystem has less than `min_free` bytes available. Zero disables a limit.
+        Sessions in `protect` are never evicted. Return evicted sessions.
+
+        `after_evict` is called after every evicted session, before free space is checked again. It frees space
+        that is released only indirectly, like stored copies of deduplicated files no session links to anymore.
+        """
+        protect = {str(path) for path in protect}
+        cutoff = (datetime.date.today() - datetime.timedelta(days=max_age)).isoformat() if max_age else None
+        evicted: List[ArchiveSession] = []
+
+        with self._lock:
+            self._index.ensure_scanned(root)
+            total_size = self._index.total_size(root)
+
+            # Sessions are ordered oldest first, so the first one that may stay ends eviction
+            for session in self._index.sessions(root):
+                if session.path in protect:
+                    continue
+                expired = cutoff is not None and session.date < cutoff
+                over_budget = max_size and total_size > max_size
+                low_space = min_free and free_space(root) < min_free
+                if not (expired or over_budget or low_space):
+                    break
+                if self._evict(root, session):
+                    evicted.append(session)
+                    total_size -= session.size
+                    if after_evict is not None:
+                        after_evict()
+
+        return evicted
+
+    def _evict(self, root: Path, session: ArchiveSession) -> bool:
+        path = Path(session.path)
+        logger.info(f'Evicting archive session {path} ({session.size // 1024 ** 2} MiB, {session.files} files)')
+
+        def on_error(function, failed_path, exc_info):
+            logger.error(f'Error removing {failed_path}', exc_info=exc_info)
+
+        shutil.rmtree(path, onerror=on_error)
+        if path.exists():
+            self._index.refresh(root, path)
+            return False
+
+        self._index.remove(session.path)
+        # Remove label and date directories left empty
+        for parent in (path.parent, path.parent.parent):
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+        return True
@@ -0,0 +1,114 @@
+"""
+RIFF/AVI header parsing
+"""
+import datetime
+import struct
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+_DATE_FORMATS = (
+    '%a %b %d %H:%M:%S %Y',
+    '%Y:%m:%d %H:%M:%S',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y/%m/%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d',
+)
+
+
+class RiffError(Exception):
+    pass
+
+
+def _chunks(f: BinaryIO, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """
+    Yield (fourcc, data offset, data size) of chunks until `end`. LIST chunks are yielded with their list type
+    as fourcc, and data offset pointing after it.
+    """
+    while f.tell() + 8 <= end:
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        fourcc, size = struct.unpack('<4sI', header)
+        offset = f.tell()
+        if fourcc in (b'LIST', b'RIFF'):
+            list_type = f.read(4)
+            yield list_type, offset + 4, size - 4
+        else:
+            yield fourcc, offset, size
+        # Chunks are word aligned
+        f.seek(offset + size + (size & 1))
+
+
+def parse_date(value: str) -> Optional[datetime.datetime]:
+    value = value.strip('\x00\r\n ')
+    for date_format in _DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_avi(f: BinaryIO) -> Dict[str, object]:
+    """
+    Read stream headers of AVI file, skipping movie data.
+
+    Returns duration in seconds, frame size, frame rate, stream count and recording time
+    from IDIT or INFO/ICRD chunks when present.
+    """
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'AVI ':
+        raise RiffError('Not an AVI file')
+    riff_end = 8 + struct.unpack('<I', header[4:8])[0]
+
+    info: Dict[str, object] = {}
+    video_duration: Optional[float] = None
+
+    def walk(end: int):
+        nonlocal video_duration
+        for fourcc, offset, size in _chunks(f, end):
+            if fourcc in (b'hdrl', b'strl', b'INFO'):
+                walk(offset + size)
+            elif fourcc == b'avih' and size >= 40:
+                micro_sec_per_frame, _, _, _, total_frames, _, streams, _, width, height = struct.unpack(
+                    '<10I', f.read(40))
+                info.update(width=width, height=height, streams=streams)
+                if micro_sec_per_frame:
+                    info['frame_rate'] = 1e6 / micro_sec_per_frame
+                    info['duration'] = total_frames * micro_sec_per_frame / 1e6
+            elif fourcc == b'strh' and size >= 36:
+                data = f.read(36)
+                stream_type = data[:4]
+                scale, rate, start, length = struct.unpack('<4I', data[20:36])
+                if stream_type == b'vids' and rate and video_duration is None:
+                    video_duration = length * scale / rate
+                    info['frame_rate'] = rate / scale if scale else info.get('frame_rate')
+            elif fourcc in (b'IDIT', b'ICRD') and 'recorded_at' not in info:
+                recorded_at = parse_date(f.read(min(size, 64)).decode('ascii', 'replace'))
+                if recorded_at is not None:
+                    info['recorded_at'] = recorded_at.timestamp()
+            elif fourcc == b'movi':
+                # Headers are always before movie data, which is not worth walking through
+                return
+
+    walk(riff_end)
+
+    if video_duration is not None:
+        info['duration'] = video_duration
+    return info
+
+
+def parse_file(path: Path) -> Dict[str, object]:
+    """
+    Return metadata of file at `path`. Non-AVI files only get size and modification time.
+    Safe to run in worker process.
+    """
+    stat = Path(path).stat()
+    metadata: Dict[str, object] = {'size': stat.st_size, 'mtime': stat.st_mtime}
+    try:
+        with open(path, 'rb') as f:
+            metadata.update(parse_avi(f))
+    except (RiffError, struct.error, OSError):
+        pass
+    return metadata
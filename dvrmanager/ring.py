@@ -0,0 +1,143 @@
+"""
+Shared memory ring buffer for passing records between processes
+"""
+import multiprocessing
+import platform
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.synchronize import Lock
+from typing import List, Optional
+
+# Capacity, write position, read position and count of dropped records, each an unsigned 64-bit integer
+_HEADER_FIELDS = 4
+_CAPACITY, _WRITE, _READ, _DROPPED = range(_HEADER_FIELDS)
+_HEADER_SIZE = _HEADER_FIELDS * 8
+_LENGTH = struct.Struct('<I')
+#: Architectures whose stores become visible to other processors in program order
+_ORDERED_STORES = {'x86_64', 'amd64', 'i386', 'i686', 'x86'}
+
+
+def stores_ordered() -> bool:
+    return platform.machine().lower() in _ORDERED_STORES
+
+
+class RingBuffer:
+    """
+    Single producer, single consumer ring of variable size records in shared memory.
+
+    Only producer advances write position and only consumer advances read position, each with a single aligned
+    64-bit store. Positions grow monotonically, and a record is made visible only after its data is written.
+    Threads of the producing process are serialized by a lock local to that process.
+
+    Python has no memory fence, so where stores may become visible out of order, as on ARM, positions are
+    published and taken under a lock shared by both processes, whose acquire and release order memory.
+    On x86 stores are seen in program order, and producer and consumer share no lock. Ring created with
+    `name=None` decides, and the other side is given its `lock`.
+    """
+
+    def __init__(self, name: Optional[str] = None, capacity: int = 4 * 1024 * 1024,
+                 lock: Optional[Lock] = None, synchronized: Optional[bool] = None):
+        self._owner = name is None
+        if self._owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=_HEADER_SIZE + capacity)
+            if synchronized is None:
+                synchronized = not stores_ordered()
+            lock = multiprocessing.get_context('spawn').Lock() if synchronized else None
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        #: Lock shared with the other side of ring, None if positions are published without one
+        self.lock = lock
+        self._header = self._shm.buf[:_HEADER_SIZE].cast('Q')
+        if self._owner:
+            self._header[_WRITE] = self._header[_READ] = self._header[_DROPPED] = 0
+            self._header[_CAPACITY] = capacity
+        self.capacity = self._header[_CAPACITY]
+        self._data = self._shm.buf[_HEADER_SIZE:_HEADER_SIZE + self.capacity]
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def dropped(self) -> int:
+        return self._header[_DROPPED]
+
+    def put(self, data: bytes, block: bool = True, timeout: Optional[float] = None) -> bool:
+        """
+        Append record. If ring is full, wait until consumer frees space if `block` is set, otherwise drop the record.
+        Return False if record was dropped.
+        """
+        size = _LENGTH.size + len(data)
+        if size > self.capacity:
+            raise ValueError(f'Record of {len(data)} bytes does not fit ring of {self.capacity} bytes')
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._lock:
+            write = self._header[_WRITE]
+            while self.capacity - (write - self._load(_READ)) < size:
+                if not block or (deadline is not None and time.monotonic() >= deadline):
+                    self._header[_DROPPED] += 1
+                    return False
+                time.sleep(0.001)
+
+            self._write(write, _LENGTH.pack(len(data)))
+            self._write(write + _LENGTH.size, data)
+            self._store(_WRITE, write + size)
+        return True
+
+    def get(self, max_records: Optional[int] = None) -> List[bytes]:
+        """
+        Take records appended since previous call, without waiting
+        """
+        records = []
+        read = self._header[_READ]
+        write = self._load(_WRITE)
+        while read < write and (max_records is None or len(records) < max_records):
+            length, = _LENGTH.unpack(self._read(read, _LENGTH.size))
+            records.append(self._read(read + _LENGTH.size, length))
+            read += _LENGTH.size + length
+        self._store(_READ, read)
+        return records
+
+    def _load(self, field: int) -> int:
+        """
+        Load position stored by the other side, data it wrote before storing it is visible afterwards
+        """
+        if self.lock is None:
+            return self._header[field]
+        with self.lock:
+            return self._header[field]
+
+    def _store(self, field: int, value: int):
+        """
+        Store position after data it covers is written or read
+        """
+        if self.lock is None:
+            self._header[field] = value
+            return
+        with self.lock:
+            self._header[field] = value
+
+    def _write(self, position: int, data: bytes):
+        offset = position % self.capacity
+        head = min(len(data), self.capacity - offset)
+        self._data[offset:offset + head] = data[:head]
+        self._data[:len(data) - head] = data[head:]
+
+    def _read(self, position: int, size: int) -> bytes:
+        offset = position % self.capacity
+        head = min(size, self.capacity - offset)
+        return bytes(self._data[offset:offset + head]) + bytes(self._data[:size - head])
+
+    def close(self):
+        """
+        Detach from shared memory, and free it if this ring created it
+        """
+        self._header.release()
+        self._data.release()
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
@@ -1,6 +1,10 @@
+import enum
 import logging
+import os
+import tempfile
+import threading
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import List, Tuple, Optional
 
 from pydantic import BaseModel, ValidationError
 
@@ -9,13 +13,57 @@ from dvrmanager import config
 logger = logging.getLogger(__name__)
 
 
+class Durability(str, enum.Enum):
+    #: Leave flushing to operating system
+    NONE = 'none'
+    #: Flush destination filesystem once, after all files of a drive are copied
+    SESSION = 'session'
+    #: Flush every file right after it is copied
+    FILE = 'file'
+
+
+class Priority(str, enum.Enum):
+    """
+    Transfers of a drive are paused while a drive of higher priority is being copied
+    """
+    URGENT = 'urgent'
+    NORMAL = 'normal'
+    #: Also copied with idle I/O priority, so it yields the disk to other processes
+    BACKGROUND = 'background'
+
+
 class ExportItem(BaseModel):
+    """
+    Import rule of a drive. A drive may have several rules, each file is imported by the first rule it matches.
+    Drive-wide options (unmount, automatic, priority and bandwidth limit) are taken from the first rule of a drive.
+    """
     drive_name: str
     drive_path: Optional[Path] = None
+    #: More patterns relative to drive root, files matching `drive_path` or any of them are imported
+    include: Tuple[str, ...] = ()
+    #: Files matching any of these patterns are not imported by this rule
+    exclude: Tuple[str, ...] = ()
+    #: Size limits in KiB of imported files, 0 for no limit
+    min_size: int = 0
+    max_size: int = 0
+    #: Only files modified within this many days are imported, 0 for no limit
+    max_age: int = 0
+    #: Subdirectory of session directory files of this rule are copied to, empty for session directory itself
+    destination: str = ''
 
     delete: bool = True
     unmount: bool = True
     automatic: bool = True
+    verify: bool = True
+    durability: Durability = Durability.SESSION
+    priority: Priority = Priority.NORMAL
+    #: Copy bandwidth limit in MiB/s, 0 for no limit
+    bandwidth_limit: int = 0
+    #: Files smaller than this many KiB are stored in a single tar per session, 0 to copy every file as is
+    container_threshold: int = 0
+
+    def patterns(self) -> List[str]:
+        return ([str(self.drive_path)] if self.drive_path else []) + list(self.include)
 
     @classmethod
     def create_default(cls) -> 'ExportItem':
@@ -30,9 +78,41 @@ class ExportItem(BaseModel):
 
 class Settings(BaseModel):
     target_directory: Path
+    #: Additional directories that receive a copy of every import, written while the source is read once
+    mirror_directories: Tuple[Path, ...] = ()
 
     export_items: Tuple[ExportItem, ...]
 
+    transfer_workers: int = 8
+    source_concurrency: int = 1
+    destination_concurrency: int = 4
+
+    copy_buffer_size: int = 8 * 1024 * 1024
+    kernel_copy: bool = True
+    preallocate: bool = True
+    #: Partial copies are flushed and journaled every this many bytes, so an interrupted copy resumes from there.
+    #: 0 to always copy from start
+    checkpoint_size: int = 64 * 1024 * 1024
+    #: Drop copied data from page cache behind the copy, so bulk imports do not push other programs' data out of memory
+    drop_cache: bool = True
+    #: Copy with O_DIRECT in aligned blocks, bypassing page cache, where filesystems support it
+    direct_io: bool = False
+    progress_interval: float = 0.5
+    hash_algorithm: str = 'blake2b'
+    #: Archived files with the same contents are stored once and linked from every session
+    deduplicate: bool = False
+
+    #: Archive size budget in GiB, oldest sessions are evicted to stay within it. 0 for no limit
+    retention_max_size: int = 0
+    #: Sessions older than this many days are evicted. 0 for no limit
+    retention_max_age: int = 0
+    #: Free space in GiB required on target filesystem, imports that would leave less are refused
+    min_free_space: int = 1
+    #: Evict oldest sessions to keep `min_free_space` instead of refusing imports
+    retention_free_space: bool = False
+
+    log_capacity: int = 10000
+
     @classmethod
     def create_default(cls) -> 'Settings':
         return Settings(
@@ -57,9 +137,94 @@ class Settings(BaseModel):
         return settings
 
     def save(self):
-        self.path().parent.mkdir(parents=True, exist_ok=True)
-        self.path().write_text(self.json())
+        self.write(self.json())
+
+    @classmethod
+    def write(cls, data: str):
+        """
+        Atomically replace settings file with `data`, so it is never left half-written
+        """
+        path = cls.path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=f'.{path.name}.', dir=path.parent)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except:
+            os.unlink(tmp_path)
+            raise
 
     @staticmethod
     def path() -> Path:
         return config.SETTINGS_DIR / 'settings.json'
+
+
+class SettingsStore:
+    """
+    Owns mutable settings edited by UI. Changes made within `delay` seconds are coalesced into a single
+    background write, and readers get a snapshot that is not affected by further edits.
+    """
+
+    def __init__(self, settings: Settings, delay: float = 1.0):
+        self._settings = settings
+        self._delay = delay
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._snapshot: Optional[Settings] = None
+
+    @property
+    def settings(self) -> Settings:
+        return self._settings
+
+    def snapshot(self) -> Settings:
+        """
+        Return a copy of current settings. It must not be modified.
+        """
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = self._settings.copy(deep=True)
+            return self._snapshot
+
+    def replace(self, settings: Settings):
+        """
+        Use `settings` edited elsewhere, without writing them
+        """
+        with self._lock:
+            self._settings = settings
+            self._snapshot = None
+
+    def changed(self):
+        with self._lock:
+            self._snapshot = None
+            if self._timer is None:
+                self._timer = threading.Timer(self._delay, self._write)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """
+        Write pending changes right away
+        """
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+            self._save()
+
+    def _write(self):
+        with self._lock:
+            if self._timer is None:
+                return
+            self._timer = None
+        self._save()
+
+    def _save(self):
+        try:
+            data = self._settings.json()
+            Settings.write(data)
+            logger.debug(f'Settings saved: {data}')
+        except:
+            logger.exception(f'Error saving settings to {Settings.path()}')
@@ -0,0 +1,92 @@
+"""
+Bandwidth limiting and I/O priorities
+"""
+import ctypes
+import logging
+import platform
+import sys
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# ioprio_set(2) syscall numbers by architecture
+_IOPRIO_SET = {
+    'x86_64': 251,
+    'i386': 289,
+    'i686': 289,
+    'aarch64': 30,
+    'arm64': 30,
+    'armv7l': 314,
+}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+IOPRIO_CLASS_BE = 2
+IOPRIO_CLASS_IDLE = 3
+
+_libc = None
+
+
+class TokenBucket:
+    """
+    Limits throughput to `rate` bytes per second, allowing bursts of up to one second worth of data.
+    Rate can be changed while transfers are running, zero rate means no limit.
+
+    While `paused` returns True, consumers wait, which lets more important transfers take the bandwidth.
+    """
+
+    def __init__(self, rate: float = 0, paused: Callable[[], bool] = None, pause_check_interval: float = 0.2):
+        self._rate = rate
+        self._paused = paused
+        self._pause_check_interval = pause_check_interval
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    @rate.setter
+    def rate(self, value: float):
+        with self._lock:
+            self._rate = value
+            self._tokens = min(self._tokens, value)
+
+    def consume(self, amount: int):
+        while self._paused is not None and self._paused():
+            time.sleep(self._pause_check_interval)
+
+        with self._lock:
+            if not self._rate:
+                return
+            now = time.monotonic()
+            self._tokens = min(self._rate, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            # Tokens may go negative, following consumers then wait until the debt is paid off
+            self._tokens -= amount
+            delay = -self._tokens / self._rate if self._tokens < 0 else 0
+
+        if delay:
+            time.sleep(delay)
+
+
+def set_io_priority(io_class: int, level: int = 4) -> bool:
+    """
+    Set I/O scheduling class and level of calling thread with Linux ioprio_set(2).
+    Return False if not supported on this platform.
+    """
+    global _libc
+    syscall = _IOPRIO_SET.get(platform.machine())
+    if not sys.platform.startswith('linux') or syscall is None:
+        return False
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+
+    ioprio = (io_class << _IOPRIO_CLASS_SHIFT) | level
+    if _libc.syscall(syscall, _IOPRIO_WHO_PROCESS, threading.get_native_id(), ioprio) != 0:
+        logger.debug(f'ioprio_set failed: {ctypes.get_errno()}')
+        return False
+    return True
+
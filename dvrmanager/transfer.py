@@ -0,0 +1,174 @@
+"""
+Transfer scheduling
+"""
+import collections
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def destination_device(path: Path) -> int:
+    """
+    Return device id of filesystem that will hold `path`, even if `path` does not exist yet
+    """
+    path = Path(path).absolute()
+    for parent in (path, *path.parents):
+        try:
+            return os.stat(parent).st_dev
+        except FileNotFoundError:
+            continue
+    return 0
+
+
+class TransferTask:
+    def __init__(self, fn: Callable[[], Any], source_key: Hashable, destination_key: Hashable):
+        self.fn = fn
+        self.source_key = source_key
+        self.destination_key = destination_key
+        self.future: Future = Future()
+        self.queued_at = time.monotonic()
+
+
+class TransferScheduler:
+    """
+    Runs per-file transfer tasks on a fixed set of worker threads.
+
+    Tasks are queued per source device and handed out round-robin, so that every attached drive makes progress,
+    while at most `per_source_limit` tasks read from one source device and at most `per_destination_limit` tasks
+    write to one destination filesystem at any time. Sources with higher priority are served first.
+    """
+
+    def __init__(self, max_workers: int = 8, per_source_limit: int = 1, per_destination_limit: int = 4):
+        self.max_workers = max(1, max_workers)
+        self.per_source_limit = max(1, per_source_limit)
+        self.per_destination_limit = max(1, per_destination_limit)
+
+        self._condition = threading.Condition()
+        self._queues: Dict[Hashable, Deque[TransferTask]] = collections.OrderedDict()
+        self._active_sources: Dict[Hashable, int] = collections.Counter()
+        self._active_destinations: Dict[Hashable, int] = collections.Counter()
+        self._priorities: Dict[Hashable, int] = {}
+        self._queue_depth = 0
+        self._active_workers = 0
+        self._shutdown = False
+
+        self._workers: List[threading.Thread] = []
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._worker, name=f'transfer-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, fn: Callable[[], Any], source_key: Hashable, destination_key: Hashable) -> Future:
+        task = TransferTask(fn, source_key, destination_key)
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError('Transfer scheduler is shut down')
+            self._queues.setdefault(source_key, collections.deque()).append(task)
+            self._queue_depth += 1
+            self._condition.notify()
+        return task.future
+
+    def set_priority(self, source_key: Hashable, priority: int):
+        """
+        Set priority of source, affecting already queued tasks too
+        """
+        with self._condition:
+            self._priorities[source_key] = priority
+            self._condition.notify_all()
+
+    def priority(self, source_key: Hashable) -> int:
+        return self._priorities.get(source_key, 0)
+
+    def preempted(self, source_key: Hashable) -> bool:
+        """
+        Return True if tasks of a source with higher priority are running, so `source_key` transfers should yield
+        """
+        priority = self._priorities.get(source_key, 0)
+        with self._condition:
+            return any(
+                active and self._priorities.get(key, 0) > priority for key, active in self._active_sources.items()
+            )
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue_depth
+
+    @property
+    def active_workers(self) -> int:
+        return self._active_workers
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                'queue_depth': self._queue_depth,
+                'active_workers': self._active_workers,
+                'max_workers': self.max_workers,
+                'active_sources': {str(k): v for k, v in self._active_sources.items() if v},
+                'active_destinations': {str(k): v for k, v in self._active_destinations.items() if v},
+            }
+
+    def shutdown(self, wait: bool = True):
+        with self._condition:
+            self._shutdown = True
+            for queue in self._queues.values():
+                for task in queue:
+                    task.future.cancel()
+            self._queues.clear()
+            self._queue_depth = 0
+            self._condition.notify_all()
+
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def _take(self) -> Optional[TransferTask]:
+        # Sort is stable, so sources of equal priority keep their round-robin order
+        for source_key in sorted(self._queues, key=lambda key: -self._priorities.get(key, 0)):
+            queue = self._queues[source_key]
+            # Rotate source so the next lookup starts from another drive
+            self._queues.move_to_end(source_key)
+
+            if self._active_sources[source_key] >= self.per_source_limit:
+                continue
+            if self._active_destinations[queue[0].destination_key] >= self.per_destination_limit:
+                continue
+
+            task = queue.popleft()
+            if not queue:
+                del self._queues[source_key]
+            self._queue_depth -= 1
+            return task
+        return None
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                task = self._take()
+                while task is None:
+                    if self._shutdown:
+                        return
+                    self._condition.wait()
+                    task = self._take()
+
+                self._active_sources[task.source_key] += 1
+                self._active_destinations[task.destination_key] += 1
+                self._active_workers += 1
+
+            try:
+                if task.future.set_running_or_notify_cancel():
+                    try:
+                        task.future.set_result(task.fn())
+                    except BaseException as e:
+                        task.future.set_exception(e)
+            finally:
+                with self._condition:
+                    self._active_sources[task.source_key] -= 1
+                    self._active_destinations[task.destination_key] -= 1
+                    self._active_workers -= 1
+                    self._condition.notify_all()
@@ -0,0 +1,95 @@
+import datetime
+import logging
+
+from PyQt6.QtCore import QDateTime
+from PyQt6.QtWidgets import (
+    QDialog, QFormLayout, QLineEdit, QDateTimeEdit, QPushButton, QTableWidget, QTableWidgetItem, QVBoxLayout,
+    QHeaderView, QCheckBox, QHBoxLayout, QWidget,
+)
+
+from dvrmanager.catalog import Catalog
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogDialog(QDialog):
+    """
+    Search imported footage by drive, label and recording time
+    """
+    COLUMNS = ('Recorded', 'Drive', 'Label', 'Duration', 'Resolution', 'Path')
+
+    def __init__(self, catalog: Catalog, parent: QWidget = None):
+        self._catalog = catalog
+
+        super(CatalogDialog, self).__init__(parent)
+
+        self.setupUi()
+
+    # noinspection PyMethodOverriding
+    def setupUi(self):
+        self.setWindowTitle('Footage catalog')
+        self.resize(900, 500)
+
+        self.drive_edit = QLineEdit(self)
+        self.label_edit = QLineEdit(self)
+        self.time_range_checkbox = QCheckBox('Recorded between', self)
+        self.start_edit = QDateTimeEdit(QDateTime.currentDateTime().addDays(-7), self)
+        self.end_edit = QDateTimeEdit(QDateTime.currentDateTime(), self)
+        for edit in (self.start_edit, self.end_edit):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat('yyyy-MM-dd HH:mm')
+        self.search_button = QPushButton('Search', self)
+
+        time_range_layout = QHBoxLayout()
+        time_range_layout.addWidget(self.start_edit)
+        time_range_layout.addWidget(self.end_edit)
+
+        form_layout = QFormLayout()
+        form_layout.addRow('Drive', self.drive_edit)
+        form_layout.addRow('Label', self.label_edit)
+        form_layout.addRow(self.time_range_checkbox, time_range_layout)
+        form_layout.addRow(self.search_button)
+
+        self.results_table = QTableWidget(0, len(self.COLUMNS), self)
+        self.results_table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.results_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.results_table.horizontalHeader().setStretchLastSection(True)
+        self.results_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(form_layout)
+        layout.addWidget(self.results_table)
+
+        self.search_button.clicked.connect(self.search)
+        self.drive_edit.returnPressed.connect(self.search)
+        self.label_edit.returnPressed.connect(self.search)
+
+    def search(self):
+        try:
+            start = end = None
+            if self.time_range_checkbox.isChecked():
+                start = self.start_edit.dateTime().toSecsSinceEpoch()
+                end = self.end_edit.dateTime().toSecsSinceEpoch()
+
+            entries = self._catalog.query(
+                drive=self.drive_edit.text().strip() or None,
+                label=self.label_edit.text().strip() or None,
+                start=start,
+                end=end,
+            )
+        except:
+            logger.exception('Error searching catalog')
+            return
+
+        self.results_table.setRowCount(len(entries))
+        for row, entry in enumerate(entries):
+            values = (
+                datetime.datetime.fromtimestamp(entry.recorded_at).strftime('%Y-%m-%d %H:%M:%S'),
+                entry.drive,
+                entry.label,
+                str(datetime.timedelta(seconds=round(entry.duration))) if entry.duration is not None else '',
+                f'{entry.width}x{entry.height}' if entry.width else '',
+                entry.path,
+            )
+            for column, value in enumerate(values):
+                self.results_table.setItem(row, column, QTableWidgetItem(value))
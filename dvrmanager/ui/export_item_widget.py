@@ -2,9 +2,9 @@ import logging
 from pathlib import Path
 
 from PyQt6 import QtCore
-from PyQt6.QtWidgets import QWidget, QLineEdit, QCheckBox
+from PyQt6.QtWidgets import QWidget, QLineEdit, QCheckBox, QComboBox, QSpinBox
 
-from dvrmanager.settings import ExportItem
+from dvrmanager.settings import Durability, ExportItem, Priority
 from dvrmanager.ui.export_item_widget_form import Ui_Form
 
 logger = logging.getLogger(__name__)
@@ -29,9 +29,25 @@ class ExportItemWidget(Ui_Form, QWidget):
 
         self._link_text_setting(self.drive_name_edit, 'drive_name')
         self._link_text_setting(self.drive_path_edit, 'drive_path', Path)
+        self.drive_path_edit.setToolTip('Pattern relative to drive root, start with **/ to match at any depth')
         self._link_bool_setting(self.delete_checkbox, 'delete')
         self._link_bool_setting(self.unmount_checkbox, 'unmount')
         self._link_bool_setting(self.automatic_checkbox, 'automatic')
+        self._link_bool_setting(self.verify_checkbox, 'verify')
+        self._link_choice_setting(self.durability_combo, 'durability', Durability)
+        self._link_choice_setting(self.priority_combo, 'priority', Priority)
+        self._link_int_setting(self.bandwidth_limit_spinbox, 'bandwidth_limit')
+        self._link_int_setting(self.container_threshold_spinbox, 'container_threshold')
+        self.container_threshold_spinbox.setToolTip('Smaller files are stored in a single tar per import')
+        self._link_patterns_setting(self.include_edit, 'include')
+        self.include_edit.setToolTip('More comma separated patterns of files to import')
+        self._link_patterns_setting(self.exclude_edit, 'exclude')
+        self.exclude_edit.setToolTip('Comma separated patterns of files not to import, relative to drive root')
+        self._link_int_setting(self.min_size_spinbox, 'min_size')
+        self._link_int_setting(self.max_size_spinbox, 'max_size')
+        self._link_int_setting(self.max_age_spinbox, 'max_age')
+        self._link_text_setting(self.destination_edit, 'destination')
+        self.destination_edit.setToolTip('Subdirectory of import directory files of this item are copied to')
 
         self.automatic_checkbox.toggled.connect(self.run_button.setDisabled)
         self.run_button.setDisabled(self.automatic_checkbox.isChecked())
@@ -47,6 +63,17 @@ class ExportItemWidget(Ui_Form, QWidget):
         edit_widget.setText(str(getattr(self._export_item, key)))
         edit_widget.textChanged.connect(slot)
 
+    def _link_patterns_setting(self, edit_widget: QLineEdit, key: str):
+        def slot(value):
+            try:
+                setattr(self._export_item, key, tuple(p.strip() for p in value.split(',') if p.strip()))
+                self.settings_changed.emit()
+            except:
+                logger.exception(f'Error saving setting {edit_widget.objectName()} {key} {value}')
+
+        edit_widget.setText(', '.join(getattr(self._export_item, key)))
+        edit_widget.textChanged.connect(slot)
+
     def _link_bool_setting(self, checkbox_widget: QCheckBox, key: str):
         def slot(value):
             try:
@@ -57,3 +84,27 @@ class ExportItemWidget(Ui_Form, QWidget):
 
         checkbox_widget.setChecked(getattr(self._export_item, key))
         checkbox_widget.toggled.connect(slot)
+
+    def _link_int_setting(self, spinbox_widget: QSpinBox, key: str):
+        def slot(value):
+            try:
+                setattr(self._export_item, key, value)
+                self.settings_changed.emit()
+            except:
+                logger.exception(f'Error saving setting {spinbox_widget.objectName()} {key} {value}')
+
+        spinbox_widget.setValue(getattr(self._export_item, key))
+        spinbox_widget.valueChanged.connect(slot)
+
+    def _link_choice_setting(self, combo_widget: QComboBox, key: str, choices: type):
+        def slot(index):
+            try:
+                setattr(self._export_item, key, combo_widget.itemData(index))
+                self.settings_changed.emit()
+            except:
+                logger.exception(f'Error saving setting {combo_widget.objectName()} {key} {index}')
+
+        for choice in choices:
+            combo_widget.addItem(choice.value, choice)
+        combo_widget.setCurrentIndex(combo_widget.findData(getattr(self._export_item, key)))
+        combo_widget.currentIndexChanged.connect(slot)
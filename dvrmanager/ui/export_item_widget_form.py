@@ -52,6 +52,74 @@ class Ui_Form(object):
         self.run_button = QtWidgets.QPushButton(self.export_item_group_box)
         self.run_button.setObjectName("run_button")
         self.export_item_layout.setWidget(3, QtWidgets.QFormLayout.ItemRole.FieldRole, self.run_button)
+        self.verify_checkbox = QtWidgets.QCheckBox(self.export_item_group_box)
+        self.verify_checkbox.setObjectName("verify_checkbox")
+        self.export_item_layout.setWidget(4, QtWidgets.QFormLayout.ItemRole.LabelRole, self.verify_checkbox)
+        self.durability_label = QtWidgets.QLabel(self.export_item_group_box)
+        self.durability_label.setObjectName("durability_label")
+        self.export_item_layout.setWidget(5, QtWidgets.QFormLayout.ItemRole.LabelRole, self.durability_label)
+        self.durability_combo = QtWidgets.QComboBox(self.export_item_group_box)
+        self.durability_combo.setObjectName("durability_combo")
+        self.export_item_layout.setWidget(5, QtWidgets.QFormLayout.ItemRole.FieldRole, self.durability_combo)
+        self.priority_label = QtWidgets.QLabel(self.export_item_group_box)
+        self.priority_label.setObjectName("priority_label")
+        self.export_item_layout.setWidget(6, QtWidgets.QFormLayout.ItemRole.LabelRole, self.priority_label)
+        self.priority_combo = QtWidgets.QComboBox(self.export_item_group_box)
+        self.priority_combo.setObjectName("priority_combo")
+        self.export_item_layout.setWidget(6, QtWidgets.QFormLayout.ItemRole.FieldRole, self.priority_combo)
+        self.bandwidth_limit_label = QtWidgets.QLabel(self.export_item_group_box)
+        self.bandwidth_limit_label.setObjectName("bandwidth_limit_label")
+        self.export_item_layout.setWidget(7, QtWidgets.QFormLayout.ItemRole.LabelRole, self.bandwidth_limit_label)
+        self.bandwidth_limit_spinbox = QtWidgets.QSpinBox(self.export_item_group_box)
+        self.bandwidth_limit_spinbox.setMaximum(10000)
+        self.bandwidth_limit_spinbox.setObjectName("bandwidth_limit_spinbox")
+        self.export_item_layout.setWidget(7, QtWidgets.QFormLayout.ItemRole.FieldRole, self.bandwidth_limit_spinbox)
+        self.container_threshold_label = QtWidgets.QLabel(self.export_item_group_box)
+        self.container_threshold_label.setObjectName("container_threshold_label")
+        self.export_item_layout.setWidget(8, QtWidgets.QFormLayout.ItemRole.LabelRole, self.container_threshold_label)
+        self.container_threshold_spinbox = QtWidgets.QSpinBox(self.export_item_group_box)
+        self.container_threshold_spinbox.setMaximum(1048576)
+        self.container_threshold_spinbox.setObjectName("container_threshold_spinbox")
+        self.export_item_layout.setWidget(8, QtWidgets.QFormLayout.ItemRole.FieldRole, self.container_threshold_spinbox)
+        self.include_label = QtWidgets.QLabel(self.export_item_group_box)
+        self.include_label.setObjectName("include_label")
+        self.export_item_layout.setWidget(9, QtWidgets.QFormLayout.ItemRole.LabelRole, self.include_label)
+        self.include_edit = QtWidgets.QLineEdit(self.export_item_group_box)
+        self.include_edit.setObjectName("include_edit")
+        self.export_item_layout.setWidget(9, QtWidgets.QFormLayout.ItemRole.FieldRole, self.include_edit)
+        self.exclude_label = QtWidgets.QLabel(self.export_item_group_box)
+        self.exclude_label.setObjectName("exclude_label")
+        self.export_item_layout.setWidget(10, QtWidgets.QFormLayout.ItemRole.LabelRole, self.exclude_label)
+        self.exclude_edit = QtWidgets.QLineEdit(self.export_item_group_box)
+        self.exclude_edit.setObjectName("exclude_edit")
+        self.export_item_layout.setWidget(10, QtWidgets.QFormLayout.ItemRole.FieldRole, self.exclude_edit)
+        self.min_size_label = QtWidgets.QLabel(self.export_item_group_box)
+        self.min_size_label.setObjectName("min_size_label")
+        self.export_item_layout.setWidget(11, QtWidgets.QFormLayout.ItemRole.LabelRole, self.min_size_label)
+        self.min_size_spinbox = QtWidgets.QSpinBox(self.export_item_group_box)
+        self.min_size_spinbox.setMaximum(1073741824)
+        self.min_size_spinbox.setObjectName("min_size_spinbox")
+        self.export_item_layout.setWidget(11, QtWidgets.QFormLayout.ItemRole.FieldRole, self.min_size_spinbox)
+        self.max_size_label = QtWidgets.QLabel(self.export_item_group_box)
+        self.max_size_label.setObjectName("max_size_label")
+        self.export_item_layout.setWidget(12, QtWidgets.QFormLayout.ItemRole.LabelRole, self.max_size_label)
+        self.max_size_spinbox = QtWidgets.QSpinBox(self.export_item_group_box)
+        self.max_size_spinbox.setMaximum(1073741824)
+        self.max_size_spinbox.setObjectName("max_size_spinbox")
+        self.export_item_layout.setWidget(12, QtWidgets.QFormLayout.ItemRole.FieldRole, self.max_size_spinbox)
+        self.max_age_label = QtWidgets.QLabel(self.export_item_group_box)
+        self.max_age_label.setObjectName("max_age_label")
+        self.export_item_layout.setWidget(13, QtWidgets.QFormLayout.ItemRole.LabelRole, self.max_age_label)
+        self.max_age_spinbox = QtWidgets.QSpinBox(self.export_item_group_box)
+        self.max_age_spinbox.setMaximum(36500)
+        self.max_age_spinbox.setObjectName("max_age_spinbox")
+        self.export_item_layout.setWidget(13, QtWidgets.QFormLayout.ItemRole.FieldRole, self.max_age_spinbox)
+        self.destination_label = QtWidgets.QLabel(self.export_item_group_box)
+        self.destination_label.setObjectName("destination_label")
+        self.export_item_layout.setWidget(14, QtWidgets.QFormLayout.ItemRole.LabelRole, self.destination_label)
+        self.destination_edit = QtWidgets.QLineEdit(self.export_item_group_box)
+        self.destination_edit.setObjectName("destination_edit")
+        self.export_item_layout.setWidget(14, QtWidgets.QFormLayout.ItemRole.FieldRole, self.destination_edit)
         self.verticalLayout_6.addLayout(self.export_item_layout)
         self.gridLayout.addWidget(self.export_item_group_box, 0, 0, 1, 1)
 
@@ -67,3 +135,24 @@ class Ui_Form(object):
         self.delete_checkbox.setText(_translate("Form", "Delete"))
         self.automatic_checkbox.setText(_translate("Form", "Automatic"))
         self.run_button.setText(_translate("Form", "Run"))
+        self.verify_checkbox.setText(_translate("Form", "Verify"))
+        self.durability_label.setText(_translate("Form", "Durability"))
+        self.priority_label.setText(_translate("Form", "Priority"))
+        self.bandwidth_limit_label.setText(_translate("Form", "Bandwidth limit"))
+        self.bandwidth_limit_spinbox.setSpecialValueText(_translate("Form", "Unlimited"))
+        self.bandwidth_limit_spinbox.setSuffix(_translate("Form", " MiB/s"))
+        self.container_threshold_label.setText(_translate("Form", "Container files below"))
+        self.container_threshold_spinbox.setSpecialValueText(_translate("Form", "Disabled"))
+        self.container_threshold_spinbox.setSuffix(_translate("Form", " KiB"))
+        self.include_label.setText(_translate("Form", "Include"))
+        self.exclude_label.setText(_translate("Form", "Exclude"))
+        self.min_size_label.setText(_translate("Form", "Min size"))
+        self.min_size_spinbox.setSpecialValueText(_translate("Form", "No limit"))
+        self.min_size_spinbox.setSuffix(_translate("Form", " KiB"))
+        self.max_size_label.setText(_translate("Form", "Max size"))
+        self.max_size_spinbox.setSpecialValueText(_translate("Form", "No limit"))
+        self.max_size_spinbox.setSuffix(_translate("Form", " KiB"))
+        self.max_age_label.setText(_translate("Form", "Max age"))
+        self.max_age_spinbox.setSpecialValueText(_translate("Form", "No limit"))
+        self.max_age_spinbox.setSuffix(_translate("Form", " days"))
+        self.destination_label.setText(_translate("Form", "Destination"))
@@ -0,0 +1,93 @@
+"""
+Bounded log model for list views
+"""
+import threading
+from typing import Any, List, Optional
+
+from PyQt6 import QtCore
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, QObject, QTimer, Qt
+
+
+class RingBuffer:
+    """
+    Fixed-capacity buffer where item 0 is the newest one and the oldest items are overwritten when full
+    """
+
+    def __init__(self, capacity: int):
+        self._items: List[Any] = [None] * capacity
+        self._capacity = capacity
+        self._next = 0
+        self._count = 0
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i: int) -> Any:
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        return self._items[(self._next - 1 - i) % self._capacity]
+
+    def append(self, item: Any):
+        self._items[self._next] = item
+        self._next = (self._next + 1) % self._capacity
+        self._count = min(self._count + 1, self._capacity)
+
+    def drop_oldest(self, count: int):
+        count = min(count, self._count)
+        for i in range(self._count - count, self._count):
+            self._items[(self._next - 1 - i) % self._capacity] = None
+        self._count -= count
+
+
+class LogModel(QAbstractListModel):
+    """
+    Newest-first log of at most `capacity` entries. `append` may be called from any thread,
+    entries are added to the model in batches once per `flush_interval` milliseconds.
+    """
+
+    def __init__(self, capacity: int = 10000, flush_interval: int = 16, parent: Optional[QObject] = None):
+        super(LogModel, self).__init__(parent)
+        self._entries = RingBuffer(capacity)
+        self._pending: List[str] = []
+        self._lock = threading.Lock()
+
+        self._flush_timer = QTimer(self)
+        self._flush_timer.timeout.connect(self.flush)
+        self._flush_timer.start(flush_interval)
+
+    def append(self, text: str):
+        with self._lock:
+            self._pending.append(text)
+
+    @QtCore.pyqtSlot()
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending[-self._entries.capacity:], []
+
+        overflow = len(self._entries) + len(batch) - self._entries.capacity
+        if overflow > 0:
+            first = len(self._entries) - overflow
+            self.beginRemoveRows(QModelIndex(), first, len(self._entries) - 1)
+            self._entries.drop_oldest(overflow)
+            self.endRemoveRows()
+
+        self.beginInsertRows(QModelIndex(), 0, len(batch) - 1)
+        for text in batch:
+            self._entries.append(text)
+        self.endInsertRows()
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._entries)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid() or index.row() >= len(self._entries):
+            return None
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return self._entries[index.row()]
+        return None
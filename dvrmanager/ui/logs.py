@@ -0,0 +1,40 @@
+"""
+Logging handlers for UI
+"""
+import logging
+from typing import Optional
+
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QStatusBar
+
+
+class StatusBarHandler(logging.Handler):
+    """
+    Shows latest log message in status bar.
+
+    Records may be emitted from any thread, handler only remembers the latest message, and a timer
+    in GUI thread shows it, so status bar is updated at most `1000 / update_interval` times per second.
+    """
+
+    def __init__(self, status_bar: QStatusBar, update_interval: int = 250):
+        self._status_bar = status_bar
+        self._message: Optional[str] = None
+
+        super(StatusBarHandler, self).__init__()
+
+        self._timer = QTimer(status_bar)
+        self._timer.timeout.connect(self._show_message)
+        self._timer.start(update_interval)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._message = self.format(record)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def _show_message(self):
+        message, self._message = self._message, None
+        if message is not None:
+            self._status_bar.showMessage(message, 5000)
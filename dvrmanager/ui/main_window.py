@@ -1,35 +1,39 @@
 import logging
+import os
 from pathlib import Path
+from typing import Tuple
 
 from PyQt6 import QtCore
-from PyQt6.QtCore import QThreadPool, QThread
-from PyQt6.QtWidgets import QMainWindow, QApplication
+from PyQt6.QtWidgets import QMainWindow, QApplication, QGroupBox, QFormLayout, QLabel, QPushButton
 
 from dvrmanager import logs
-from dvrmanager.settings import ExportItem, Settings
+from dvrmanager.settings import ExportItem, Settings, SettingsStore
+from dvrmanager.ui import logs as ui_logs
 from dvrmanager.ui.export_item_widget import ExportItemWidget
+from dvrmanager.ui.log_model import LogModel
 from dvrmanager.ui.main_window_form import Ui_MainWindow
 
 logger = logging.getLogger(__name__)
 
 
+def _parse_paths(value: str) -> Tuple[Path, ...]:
+    return tuple(Path(path.strip()) for path in value.split(os.pathsep) if path.strip())
+
+
 class MainWindowBase(Ui_MainWindow, QMainWindow):
     settings_changed = QtCore.pyqtSignal()
 
     def __init__(self, app: QApplication, settings: Settings):
+        self._settings_store = SettingsStore(settings)
         self._settings = settings
         self._app = app
 
         super(MainWindowBase, self).__init__()
 
         self.setupUi()
+        self.setup_stats_panel()
         self.load_settings_export_items()
         self.setup_statusbar_logging()
-        self.setup_threads()
-
-    def setup_threads(self):
-        self._thread_pool = QThreadPool.globalInstance()
-        logger.debug(f'Thread pool size: {QThread.idealThreadCount()}')
 
     def load_settings_export_items(self):
         for export_item in self._settings.export_items:
@@ -39,15 +43,61 @@ class MainWindowBase(Ui_MainWindow, QMainWindow):
     def setupUi(self):
         super(MainWindowBase, self).setupUi(self)
         self.add_export_item_button.clicked.connect(self.add_new_export_item)
+
+        self.catalog_button = QPushButton('Search footage', self.settings_group_box)
+        self.verticalLayout_3.insertWidget(self.verticalLayout_3.indexOf(self.add_export_item_button) + 1, self.catalog_button)
         self.settings_changed.connect(self.on_settings_changed)
 
+        self.log_model = LogModel(self._settings.log_capacity, parent=self)
+        self.log_list_view.setModel(self.log_model)
+
         # self.target_directory_edit.setReadOnly(True)
         self.target_directory_edit.setText(str(self._settings.target_directory))
         self.target_directory_edit.textChanged.connect(self._link_text_setting('target_directory', Path))
 
+        self.mirror_directories_edit.setToolTip(f'Directories that receive a copy of every import, separated by {os.pathsep}')
+        self.mirror_directories_edit.setText(os.pathsep.join(str(path) for path in self._settings.mirror_directories))
+        self.mirror_directories_edit.textChanged.connect(self._link_text_setting('mirror_directories', _parse_paths))
+
+    def setup_stats_panel(self):
+        self.stats_group_box = QGroupBox('Statistics', self.log_group_box)
+        self.stats_layout = QFormLayout(self.stats_group_box)
+        self._stats_labels = {}
+        for key, title in (
+                ('sessions', 'Active imports'),
+                ('files', 'Files'),
+                ('bytes', 'Copied'),
+                ('throughput', 'Throughput'),
+                ('queue', 'Queue / workers'),
+                ('queue_wait', 'Avg queue wait'),
+        ):
+            label = QLabel('-', self.stats_group_box)
+            self.stats_layout.addRow(title, label)
+            self._stats_labels[key] = label
+        self.verticalLayout.insertWidget(0, self.stats_group_box)
+
+    def update_stats_panel(self, stats: dict):
+        active = stats['active']
+        throughput = sum(s['throughput'] for s in active)
+        queue_wait = [s['average_queue_wait'] for s in active if s['files'] + s['errors']]
+        scheduler = stats['scheduler']
+
+        self._stats_labels['sessions'].setText(str(stats['active_sessions']))
+        self._stats_labels['files'].setText(f'{stats["totals"]["files"]} ({stats["totals"]["errors"]} errors)')
+        self._stats_labels['bytes'].setText(f'{stats["totals"]["bytes"] / 1024 ** 3:.2f} GB')
+        self._stats_labels['throughput'].setText(f'{throughput / 1024 ** 2:.1f} MB/s')
+        self._stats_labels['queue'].setText(f'{scheduler["queue_depth"]} / {scheduler["active_workers"]} of {scheduler["max_workers"]}')
+        self._stats_labels['queue_wait'].setText(f'{sum(queue_wait) / len(queue_wait):.2f} s' if queue_wait else '-')
+
     @QtCore.pyqtSlot(str)
     def add_ui_log_entry(self, text):
-        self.log_list_widget.insertItem(0, text)
+        """Safe to call from any thread"""
+        self.log_model.append(text)
+
+    @QtCore.pyqtSlot(str, int, int)
+    def show_transfer_progress(self, path: str, done: int, total: int):
+        percent = done * 100 // total if total else 100
+        self.statusBar().showMessage(f'{Path(path).name}: {percent}% ({done // 1024 ** 2}/{total // 1024 ** 2} MB)', 5000)
 
     def _link_text_setting(self, key: str, ttype: type = str):
         def slot(value):
@@ -57,9 +107,7 @@ class MainWindowBase(Ui_MainWindow, QMainWindow):
         return slot
 
     def on_settings_changed(self):
-        logger.info('Settings saved')
-        logger.debug(self._settings.json())
-        self._settings.save()
+        self._settings_store.changed()
 
     def remove_export_item(self, export_item_widget: ExportItemWidget, export_item: ExportItem):
         self.export_items_layout.removeWidget(export_item_widget)
@@ -86,11 +134,10 @@ class MainWindowBase(Ui_MainWindow, QMainWindow):
 
     def closeEvent(self, *args, **kwargs):
         """Terminate application if main window closed"""
+        self._settings_store.flush()
         self._app.quit()
-        self._thread_pool.waitForDone()
 
     def setup_statusbar_logging(self):
-        logger = logging.getLogger('dvrmanager')
-        handler = logs.StatusBarHandler(self.statusBar())
+        handler = ui_logs.StatusBarHandler(self.statusBar())
         handler.setLevel(logging.INFO)
-        logger.addHandler(handler)
+        logs.add_handler(handler)
@@ -44,6 +44,12 @@ class Ui_MainWindow(object):
         self.export_label_edit = QtWidgets.QLineEdit(self.settings_group_box)
         self.export_label_edit.setObjectName("export_label_edit")
         self.settings_layout.setWidget(1, QtWidgets.QFormLayout.ItemRole.FieldRole, self.export_label_edit)
+        self.mirror_directories_label = QtWidgets.QLabel(self.settings_group_box)
+        self.mirror_directories_label.setObjectName("mirror_directories_label")
+        self.settings_layout.setWidget(2, QtWidgets.QFormLayout.ItemRole.LabelRole, self.mirror_directories_label)
+        self.mirror_directories_edit = QtWidgets.QLineEdit(self.settings_group_box)
+        self.mirror_directories_edit.setObjectName("mirror_directories_edit")
+        self.settings_layout.setWidget(2, QtWidgets.QFormLayout.ItemRole.FieldRole, self.mirror_directories_edit)
         self.export_items_layout.addLayout(self.settings_layout)
         self.verticalLayout_3.addLayout(self.export_items_layout)
         self.add_export_item_button = QtWidgets.QPushButton(self.settings_group_box)
@@ -61,18 +67,18 @@ class Ui_MainWindow(object):
         self.log_group_box.setObjectName("log_group_box")
         self.verticalLayout = QtWidgets.QVBoxLayout(self.log_group_box)
         self.verticalLayout.setObjectName("verticalLayout")
-        self.log_list_widget = QtWidgets.QListWidget(self.log_group_box)
+        self.log_list_view = QtWidgets.QListView(self.log_group_box)
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Policy.Fixed, QtWidgets.QSizePolicy.Policy.Expanding)
         sizePolicy.setHorizontalStretch(0)
         sizePolicy.setVerticalStretch(0)
-        sizePolicy.setHeightForWidth(self.log_list_widget.sizePolicy().hasHeightForWidth())
-        self.log_list_widget.setSizePolicy(sizePolicy)
-        self.log_list_widget.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.NoSelection)
-        self.log_list_widget.setProperty("isWrapping", True)
-        self.log_list_widget.setWordWrap(True)
-        self.log_list_widget.setSelectionRectVisible(False)
-        self.log_list_widget.setObjectName("log_list_widget")
-        self.verticalLayout.addWidget(self.log_list_widget)
+        sizePolicy.setHeightForWidth(self.log_list_view.sizePolicy().hasHeightForWidth())
+        self.log_list_view.setSizePolicy(sizePolicy)
+        self.log_list_view.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.NoSelection)
+        self.log_list_view.setLayoutMode(QtWidgets.QListView.LayoutMode.Batched)
+        self.log_list_view.setUniformItemSizes(True)
+        self.log_list_view.setSelectionRectVisible(False)
+        self.log_list_view.setObjectName("log_list_view")
+        self.verticalLayout.addWidget(self.log_list_view)
         self.horizontalLayout.addWidget(self.log_group_box)
         MainWindow.setCentralWidget(self.centralwidget)
         self.statusbar = QtWidgets.QStatusBar(MainWindow)
@@ -88,5 +94,6 @@ class Ui_MainWindow(object):
         self.settings_group_box.setTitle(_translate("MainWindow", "Settings"))
         self.target_directory_label.setText(_translate("MainWindow", "Target directory"))
         self.export_label_label.setText(_translate("MainWindow", "Export label"))
+        self.mirror_directories_label.setText(_translate("MainWindow", "Mirror directories"))
         self.add_export_item_button.setText(_translate("MainWindow", "Add"))
         self.log_group_box.setTitle(_translate("MainWindow", "Log"))
@@ -1,109 +1,119 @@
-import datetime
 import logging
-import shutil
-import time
-from pathlib import Path
-from typing import Dict, Iterable, Tuple
+import sqlite3
+from typing import Optional
 
-import pydantic
-from PyQt6 import QtCore
-from PyQt6.QtCore import QTimer, QObject, QRunnable, QThread
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QPushButton
 
-from dvrmanager.fs import get_fs_manager
+from dvrmanager.catalog import Catalog
+from dvrmanager.planner import describe
+from dvrmanager.ui.catalog_dialog import CatalogDialog
 from dvrmanager.ui.main_window import MainWindowBase
+from dvrmanager.worker import WorkerProcess
 
 logger = logging.getLogger(__name__)
 
 
-class BaseJob(QObject):
-    finished = QtCore.pyqtSignal()
-
-    def run(self):
-        raise NotImplementedError()
-
-
-class MoveFilesJob(BaseJob):
-    file_done = QtCore.pyqtSignal(Path)
-    progress_str = QtCore.pyqtSignal(str)
-
-    def __init__(self, files: Tuple[Tuple[Path, Path], ...]):
-        self._files = files
-        super(MoveFilesJob, self).__init__()
-
-    def run(self):
-        """Long-running task."""
-        try:
-            fs = get_fs_manager()
-
-            for file_from, file_to in self._files:
-                file_to.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copyfile(src=file_from, dst=file_to)
-                self.progress_str.emit(f'{file_from} -> {file_to}')
-                self.file_done.emit(file_from)
-
-            self.finished.emit()
-        except:
-            logger.exception('run')
-
-
 class MainWindow(MainWindowBase):
-    drive_attached = QtCore.pyqtSignal(str)
-    drive_detached = QtCore.pyqtSignal(str)
+    """
+    Imports run in engine worker process, whose events are polled from GUI thread
+    """
+    #: Milliseconds between polls of engine events
+    EVENTS_INTERVAL = 40
+    #: Milliseconds settings edits are coalesced for before they are sent to engine
+    SETTINGS_DELAY = 1000
 
     def __init__(self, *args, **kwargs):
         super(MainWindow, self).__init__(*args, **kwargs)
 
-        self._drive_scan_timer = QTimer(self)
-        self._drive_scan_timer.timeout.connect(self.scan_drives)
-        self._drive_scan_timer.start(1000)
+        self._worker = WorkerProcess(self._settings_store.snapshot(), self.export_label_edit.text())
+        self._worker.start()
+        # Catalog is written by engine process, it is only queried here
+        self._catalog: Optional[Catalog] = None
 
-        self._drive_state: Dict[str, bool] = {}
+        self.export_label_edit.textChanged.connect(self._worker.set_label)
+        self.catalog_button.clicked.connect(self.show_catalog)
 
-        self.drive_attached.connect(self.find_matches)
+        self.stop_imports_button = QPushButton('Stop imports', self.settings_group_box)
+        self.stop_imports_button.setToolTip('Abort running imports, e.g. when a card stopped responding')
+        self.verticalLayout_3.insertWidget(self.verticalLayout_3.indexOf(self.catalog_button) + 1, self.stop_imports_button)
+        self.stop_imports_button.clicked.connect(self.stop_imports)
 
-        self._fs = get_fs_manager()
+        self.plan_imports_button = QPushButton('Plan imports', self.settings_group_box)
+        self.plan_imports_button.setToolTip('Show what importing attached drives would copy and how long it would take')
+        self.verticalLayout_3.insertWidget(self.verticalLayout_3.indexOf(self.stop_imports_button), self.plan_imports_button)
+        self.plan_imports_button.clicked.connect(lambda: self._worker.plan())
 
-    def find_matches(self, drive_name: str):
-        try:
-            for export_item in self._settings.export_items:
-                if export_item.drive_name == drive_name:
-                    drive_path = export_item.drive_path
-                    break
-            else:
-                return
+        self._events_timer = QTimer(self)
+        self._events_timer.timeout.connect(self.process_events)
+        self._events_timer.start(self.EVENTS_INTERVAL)
 
-            matches = self._fs.find_matches(drive_name, drive_path)
-            self.add_ui_log_entry(f'Drive {drive_name} has {len(matches)} matched files by {drive_path}')
+        # Every keystroke in settings changes them, engine gets them once typing pauses
+        self._settings_timer = QTimer(self)
+        self._settings_timer.setSingleShot(True)
+        self._settings_timer.setInterval(self.SETTINGS_DELAY)
+        self._settings_timer.timeout.connect(self.send_settings)
 
-            file_move = []
-            for file_from in matches:
-                file_move.append((file_from, Path(self._settings.target_directory) / datetime.date.today().isoformat() / (self.export_label_edit.text().strip() or 'default') / drive_name / file_from.name))
+    def on_settings_changed(self):
+        super(MainWindow, self).on_settings_changed()
+        if not self._settings_timer.isActive():
+            self._settings_timer.start()
 
-            job = MoveFilesJob(tuple(file_move))
-            job.progress_str.connect(self.add_ui_log_entry)
-            job.finished.connect(lambda: self._fs.unmount(drive_name))
-            self._thread_pool.start(job.run)
+    def send_settings(self):
+        try:
+            self._worker.update_settings(self._settings_store.snapshot())
+        except:
+            logger.exception('send_settings')
+
+    def closeEvent(self, *args, **kwargs):
+        self._events_timer.stop()
+        self._settings_timer.stop()
+        self._worker.stop()
+        self.process_events()
+        if self._catalog is not None:
+            self._catalog.close()
+        super(MainWindow, self).closeEvent(*args, **kwargs)
+
+    def stop_imports(self):
+        try:
+            self._worker.restart()
+            self.add_ui_log_entry('Imports stopped, interrupted files will be resumed when their drive is attached again')
         except:
-            logger.exception('find_matches')
+            logger.exception('stop_imports')
+
+    def show_catalog(self):
+        if self._catalog is None:
+            try:
+                self._catalog = Catalog(read_only=True)
+            except sqlite3.Error:
+                logger.exception('Error opening catalog')
+                self.add_ui_log_entry('Footage catalog can not be opened, see log for details')
+                return
+        dialog = CatalogDialog(self._catalog, self)
+        dialog.show()
 
-    def scan_drives(self):
+    def process_events(self):
         try:
-            new_state = {}
-            for export_item in self._settings.export_items:
-                if not export_item.automatic:
-                    continue
-                new_state[export_item.drive_name] = self._fs.drive_exists(export_item.drive_name)
-
-            for drive, attached in new_state.items():
-                if attached and not self._drive_state.get(drive, False):
-                    self.drive_attached.emit(drive)
-                    logger.info(f'Detected drive attach: {drive}')
-                    self.add_ui_log_entry(f'Drive attached: {drive}')
-                elif not attached and self._drive_state.get(drive, False):
-                    self.drive_detached.emit(drive)
-                    logger.info(f'Detected drive detach: {drive}')
-                    self.add_ui_log_entry(f'Drive detached: {drive}')
-
-            self._drive_state.update(new_state)
+            self._worker.ensure_running()
+            progress = stats = None
+            for kind, *args in self._worker.events():
+                if kind == 'entry':
+                    self.add_ui_log_entry(args[0])
+                elif kind == 'bytes':
+                    progress = args
+                elif kind == 'stats':
+                    stats = args[0]
+                elif kind == 'attached':
+                    self.add_ui_log_entry(f'Drive attached: {args[0]}')
+                elif kind == 'plan':
+                    self.add_ui_log_entry(describe(args[0]))
+                elif kind == 'detached':
+                    self.add_ui_log_entry(f'Drive detached: {args[0]}')
+
+            # Only the latest progress and stats of a poll are shown
+            if progress is not None:
+                self.show_transfer_progress(*progress)
+            if stats is not None:
+                self.update_stats_panel(stats)
         except:
-            logger.exception('scan_drives')
+            logger.exception('process_events')
@@ -0,0 +1,365 @@
+"""
+Out-of-process import engine
+
+Engine runs in a worker process, so copying, hashing and logging of an import never compete with UI for the GIL,
+and a worker wedged on a card read can be killed without killing the application.
+Commands are sent to the worker over a pipe, events come back through a shared memory ring buffer.
+
+Events are tuples:
+    ('entry', text)                 Import progress message
+    ('bytes', path, done, total)    Byte progress of a transfer, dropped if ring is full
+    ('stats', stats)                Engine stats, once per second, dropped if ring is full
+    ('attached', drive)             Export item drive was attached
+    ('detached', drive)             Export item drive was detached
+    ('finished', drive)             Import of a drive finished
+    ('plan', summary)               Transfer plan summary of an attached drive, in reply to plan command
+"""
+import logging
+import multiprocessing
+import os
+import pickle
+import signal
+import threading
+import time
+from multiprocessing.connection import Connection
+from multiprocessing.synchronize import Lock
+from typing import Any, Iterable, List, Optional, Set, Tuple
+
+from dvrmanager import logs
+from dvrmanager.ring import RingBuffer
+from dvrmanager.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+Event = Tuple[Any, ...]
+
+
+class WorkerProcess:
+    """
+    Starts and controls import engine process. Used from UI thread only.
+
+    A worker that exits unexpectedly is restarted, after `restart_delay` seconds doubled with every restart
+    that did not stay up for `stable_after` seconds, up to `max_restart_delay`. After `max_restarts` such restarts
+    in a row worker is given up until restarted explicitly.
+    """
+
+    def __init__(self, settings: Settings, label: str = '', ring_capacity: int = 4 * 1024 * 1024,
+                 stop_timeout: float = 10.0, restart_delay: float = 1.0, max_restart_delay: float = 60.0,
+                 max_restarts: int = 5, stable_after: float = 60.0):
+        self._context = multiprocessing.get_context('spawn')
+        self._settings_json = settings.json()
+        self._label = label
+        self._ring_capacity = ring_capacity
+        self._stop_timeout = stop_timeout
+        self._restart_delay = restart_delay
+        self._max_restart_delay = max_restart_delay
+        self._max_restarts = max_restarts
+        self._stable_after = stable_after
+        self._restarts = 0
+        self._restart_at: Optional[float] = None
+        self._started_at = 0.0
+        self._process: Optional[multiprocessing.Process] = None
+        self._connection: Optional[Connection] = None
+        self._ring: Optional[RingBuffer] = None
+        self._pending: List[Event] = []
+        self._attached: Set[str] = set()
+
+    @property
+    def attached(self) -> Set[str]:
+        return set(self._attached)
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def start(self, assume_attached: Iterable[str] = ()):
+        """
+        Start worker process. Drives in `assume_attached` are not imported until they are attached again.
+        """
+        self._ring = RingBuffer(capacity=self._ring_capacity)
+        self._connection, child_connection = self._context.Pipe()
+        # Not a daemon, since engine starts catalog worker processes itself
+        self._process = self._context.Process(
+            target=_main,
+            args=(
+                self._settings_json, self._label, self._ring.name, self._ring.lock, child_connection,
+                sorted(assume_attached),
+            ),
+            name='dvrmanager-engine',
+        )
+        self._process.start()
+        self._started_at = time.monotonic()
+        child_connection.close()
+        logger.info(f'Started engine process {self._process.pid}')
+
+    def update_settings(self, settings: Settings):
+        settings_json = settings.json()
+        # Engine rescans drives on every update, so edits that end where they started are not sent
+        if settings_json == self._settings_json:
+            return
+        self._settings_json = settings_json
+        self._send('settings', self._settings_json)
+
+    def set_label(self, label: str):
+        self._label = label
+        self._send('label', label)
+
+    def plan(self):
+        """
+        Ask worker for transfer plans of attached drives, they come back as plan events
+        """
+        self._send('plan')
+
+    def events(self) -> List[Event]:
+        """
+        Return events published since previous call, without waiting. Log records of worker are passed
+        to logging of this process instead of being returned.
+        """
+        events, self._pending = self._pending, []
+        if self._ring is not None:
+            events.extend(pickle.loads(data) for data in self._ring.get())
+
+        result = []
+        for event in events:
+            kind = event[0]
+            if kind == 'log':
+                record = logging.makeLogRecord(event[1])
+                logging.getLogger(record.name).handle(record)
+                continue
+            if kind == 'attached':
+                self._attached.add(event[1])
+            elif kind == 'detached':
+                self._attached.discard(event[1])
+            result.append(event)
+        return result
+
+    def ensure_running(self) -> bool:
+        """
+        Restart worker if it exited unexpectedly, once its restart delay passed. Return False if it is not running.
+        Restarts are reported as entry events.
+        """
+        if self._process is not None:
+            if self._process.is_alive():
+                return True
+            self._on_exited(self._process.exitcode)
+        if self._restart_at is None:
+            return self._process is not None
+        if time.monotonic() < self._restart_at:
+            return False
+        self._restart_at = None
+        self._restarts += 1
+        self.start(self._attached)
+        return False
+
+    def _on_exited(self, exitcode: Optional[int]):
+        # Events published before exit are kept for the next call
+        self._pending = self.events()
+        self._cleanup()
+        # Worker that stayed up for a while did not fail at startup, so it is restarted as if for the first time
+        if time.monotonic() - self._started_at >= self._stable_after:
+            self._restarts = 0
+        if self._restarts >= self._max_restarts:
+            text = (
+                f'Engine process exited with code {exitcode} after {self._restarts} restarts in a row, '
+                f'not restarting it. Check the log and use Stop imports to start it again'
+            )
+            logger.error(text)
+            self._pending.append(('entry', text))
+            return
+        delay = min(self._restart_delay * 2 ** self._restarts, self._max_restart_delay)
+        text = f'Engine process exited with code {exitcode}, restarting in {delay:.0f}s'
+        logger.error(text)
+        self._pending.append(('entry', text))
+        self._restart_at = time.monotonic() + delay
+
+    def restart(self):
+        """
+        Kill worker with all its imports and start a new one. Attached drives are not imported again.
+        """
+        self.kill()
+        self._restarts = 0
+        self._restart_at = None
+        self.start(self._attached)
+
+    def stop(self):
+        """
+        Ask worker to finish and wait for it, kill it if it does not finish in time
+        """
+        if self._process is None:
+            return
+        self._send('shutdown')
+        self._process.join(self._stop_timeout)
+        if self._process.is_alive():
+            logger.warning(f'Engine process did not stop in {self._stop_timeout}s, killing it')
+        self.kill()
+
+    def kill(self):
+        if self._process is None:
+            return
+        if self._process.is_alive():
+            # Worker leads its own process group, so catalog worker processes it started are killed along with it
+            try:
+                os.killpg(self._process.pid, signal.SIGKILL)
+            except (AttributeError, OSError):
+                self._process.kill()
+            # Process blocked in uninterruptible I/O exits only once the I/O returns, it is left behind
+            self._process.join(1.0)
+            if self._process.is_alive():
+                logger.error(f'Engine process {self._process.pid} did not exit, abandoning it')
+        # Events published before exit are kept for the next call
+        self._pending = self.events()
+        self._cleanup()
+
+    def _cleanup(self):
+        if self._connection is not None:
+            self._connection.close()
+        if self._ring is not None:
+            self._ring.close()
+        self._process = self._connection = self._ring = None
+
+    def _send(self, *command):
+        if self._connection is None:
+            return
+        try:
+            self._connection.send(command)
+        except OSError:
+            logger.warning(f'Engine process is not running, {command[0]} command is lost')
+
+
+class _Publisher:
+    """
+    Publishes events to ring buffer from any thread of worker process
+    """
+
+    def __init__(self, ring: RingBuffer, timeout: float = 5.0):
+        self._ring = ring
+        self._timeout = timeout
+
+    def __call__(self, *event, block: bool = True) -> bool:
+        # A consumer that stopped reading only makes worker drop events, it never blocks imports for long
+        try:
+            return self._ring.put(pickle.dumps(event, pickle.HIGHEST_PROTOCOL), block=block, timeout=self._timeout)
+        except ValueError:
+            return False
+
+
+class _EventLogHandler(logging.Handler):
+    """
+    Forwards log records to main process. Records are already prepared by QueueHandler, so they can be pickled.
+    """
+
+    def __init__(self, publish: _Publisher):
+        super(_EventLogHandler, self).__init__()
+        self._publish = publish
+
+    def emit(self, record: logging.LogRecord):
+        self._publish('log', dict(record.__dict__))
+
+
+class _Worker:
+    def __init__(self, publish: _Publisher, settings: Settings, label: str, connection: Connection,
+                 assume_attached: List[str]):
+        # Engine is imported in worker process only
+        from dvrmanager.engine import Engine
+        from dvrmanager.settings import SettingsStore
+
+        self._publish = publish
+        self._label = label
+        self._connection = connection
+        self._settings_store = SettingsStore(settings)
+        self._engine = Engine(self._settings_store)
+        self._engine.assume_attached(assume_attached)
+        self._stop = threading.Event()
+        self._drives_changed = threading.Event()
+
+    def run(self):
+        from dvrmanager.daemon import watch_drives
+
+        threading.Thread(target=self._control, name='worker-control', daemon=True).start()
+        threading.Thread(target=self._publish_stats, name='worker-stats', daemon=True).start()
+        watch_drives(self._engine, self._stop, self._drives_changed, self._on_attached, self._on_detached)
+        self._engine.shutdown(wait=True)
+
+    def _control(self):
+        while True:
+            try:
+                command, *args = self._connection.recv()
+            except (EOFError, OSError):
+                # Main process is gone
+                command, args = 'shutdown', []
+
+            try:
+                if command == 'settings':
+                    self._settings_store.replace(Settings.parse_raw(args[0]))
+                    self._engine.apply_settings()
+                    self._drives_changed.set()
+                elif command == 'label':
+                    self._label = args[0]
+                elif command == 'plan':
+                    # Walking drives may take a while, commands are not held up by it
+                    threading.Thread(target=self._plan, name='worker-plan', daemon=True).start()
+                elif command == 'shutdown':
+                    self._stop.set()
+                    self._drives_changed.set()
+                    return
+            except:
+                logger.exception(f'Error handling {command} command')
+
+    def _publish_stats(self):
+        while not self._stop.wait(1.0):
+            try:
+                stats = self._engine.stats()
+                # Per-transfer records are not shown by UI
+                for session in stats['active']:
+                    session.pop('records', None)
+                self._publish('stats', stats, block=False)
+            except:
+                logger.exception('Error publishing stats')
+
+    def _plan(self):
+        for drive in self._engine.drive_export_items():
+            try:
+                transfer_plan = self._engine.plan(drive, self._label)
+                if transfer_plan is not None:
+                    self._publish('plan', transfer_plan.summary())
+            except:
+                logger.exception(f'Error planning import of {drive}')
+
+    def _on_attached(self, drive: str):
+        from dvrmanager.retention import InsufficientSpaceError
+
+        self._publish('attached', drive)
+        try:
+            job = self._engine.create_job(drive, self._label)
+        except InsufficientSpaceError as e:
+            logger.error(f'Not importing {drive}: {e}')
+            self._publish('entry', f'Not importing {drive}: {e}')
+            return
+        if job is None:
+            return
+
+        job.progress_str = lambda text: self._publish('entry', text)
+        job.bytes_progress = lambda path, done, total: self._publish('bytes', path, done, total, block=False)
+        job.finished = lambda: self._publish('finished', drive)
+        threading.Thread(target=job.run, name=f'import-{drive}', daemon=True).start()
+
+    def _on_detached(self, drive: str):
+        self._publish('detached', drive)
+
+
+def _main(settings_json: str, label: str, ring_name: str, ring_lock: Optional[Lock], connection: Connection,
+          assume_attached: List[str]):
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    ring = RingBuffer(ring_name, lock=ring_lock)
+    publish = _Publisher(ring)
+    logs.configure_worker(_EventLogHandler(publish))
+    try:
+        _Worker(publish, Settings.parse_raw(settings_json), label, connection, assume_attached).run()
+    except:
+        logger.exception('Engine process failed')
+        raise
+    finally:
+        # Remaining records have to be published while ring is still attached
+        logs.stop()
+        ring.close()
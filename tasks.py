@@ -0,0 +1,17 @@
+from invoke import task
+
+
+@task(help={
+    'scale': 'Multiplier for synthetic card file counts and sizes',
+    'repeat': 'Number of runs per measurement',
+    'output': 'File to write JSON results to',
+    'baseline': 'JSON results of previous run to compare with',
+})
+def bench(c, scale=1.0, repeat=3, output='', baseline=''):
+    """Run import performance benchmarks"""
+    args = [f'--scale {scale}', f'--repeat {repeat}']
+    if output:
+        args.append(f'--output {output}')
+    if baseline:
+        args.append(f'--baseline {baseline}')
+    c.run(f'python -m benchmarks.bench {" ".join(args)}', pty=False)
@@ -0,0 +1,27 @@
+import sqlite3
+
+import pytest
+
+from dvrmanager.catalog import Catalog, FootageEntry
+
+
+def test_read_only_catalog_queries_without_writing(tmp_path):
+    path = tmp_path / 'catalog.sqlite3'
+    catalog = Catalog(path)
+    entry = FootageEntry('/archive/clip.avi', 'CARD', 'default', 1.0, 60.0, 1920, 1080, 1024)
+    catalog.add([entry])
+
+    reader = Catalog(path, read_only=True)
+    try:
+        assert reader.query() == [entry]
+        with pytest.raises(sqlite3.OperationalError):
+            reader.remove(tmp_path)
+    finally:
+        reader.close()
+        catalog.close()
+
+
+def test_read_only_catalog_is_not_created(tmp_path):
+    with pytest.raises(sqlite3.OperationalError):
+        Catalog(tmp_path / 'catalog.sqlite3', read_only=True)
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,38 @@
+import os
+import tarfile
+
+from dvrmanager.container import SessionContainer, read_index
+
+
+def add(container: SessionContainer, tmp_path, name: str, data: bytes):
+    path = tmp_path / 'source'
+    path.write_bytes(data)
+    return container.add(name, data, os.stat(path))
+
+
+def test_index_offsets_point_at_member_data(tmp_path):
+    container = SessionContainer(tmp_path / 'small-files.tar', 'blake2b')
+    members = {'DCIM/0001.gps': b'gps' * 1000, 'DCIM/0002.gps': b'', 'DCIM/0003.gps': os.urandom(513)}
+    for name, data in members.items():
+        add(container, tmp_path, name, data)
+    assert container.close(verify=True) == []
+
+    entries = read_index(container.path)
+    with open(container.path, 'rb') as f:
+        for entry in entries:
+            f.seek(entry.offset)
+            assert f.read(entry.size) == members[entry.name]
+    with tarfile.open(container.path) as tar:
+        assert tar.getnames() == list(members)
+
+
+def test_verify_returns_members_whose_data_does_not_match(tmp_path):
+    container = SessionContainer(tmp_path / 'small-files.tar', 'blake2b')
+    add(container, tmp_path, 'DCIM/0001.gps', b'first')
+    second = add(container, tmp_path, 'DCIM/0002.gps', b'second')
+    container._tar.fileobj.flush()
+    with open(container.path, 'r+b') as f:
+        f.seek(second.offset)
+        f.write(b'S')
+
+    assert container.close(verify=True) == [second]
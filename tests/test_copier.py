@@ -0,0 +1,29 @@
+import errno
+import os
+
+from dvrmanager import copier
+from dvrmanager.copier import BufferedCopyEngine, CopyEngine
+
+
+def test_preallocation_is_skipped_where_filesystem_does_not_support_it(tmp_path, monkeypatch):
+    def fallocate(fd: int, offset: int, length: int) -> bool:
+        raise OSError(errno.EOPNOTSUPP, os.strerror(errno.EOPNOTSUPP))
+
+    monkeypatch.setattr(copier, 'fallocate', fallocate)
+    path = tmp_path / 'clip.avi'
+    with open(path, 'wb') as f:
+        CopyEngine._preallocate(f.fileno(), 1024 * 1024)
+
+    assert path.stat().st_size == 0
+
+
+def test_fsync_flushes_destination_directory_after_rename(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(copier, 'sync_directory', lambda path: synced.append((path, (path / 'clip.avi').exists())))
+    src = tmp_path / 'clip.avi'
+    src.write_bytes(b'data')
+    dst = tmp_path / 'archive' / 'clip.avi'
+
+    BufferedCopyEngine().copy(src, dst, fsync=True)
+
+    assert synced == [(dst.parent, True)]
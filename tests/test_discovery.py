@@ -0,0 +1,34 @@
+from pathlib import Path
+
+from dvrmanager.discovery import FileRule, PathPattern, RuleMatcher
+
+
+def make_card(root: Path, *paths: str) -> Path:
+    for path in paths:
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_bytes(b'data')
+    return root
+
+
+def relative_matches(root: Path, matches) -> list:
+    return sorted(match[0].relative_to(root).as_posix() for match in matches)
+
+
+def test_trailing_double_star_matches_files_at_any_depth(tmp_path):
+    card = make_card(tmp_path, 'DCIM/a.avi', 'DCIM/100/b.avi', 'DCIM/100/x/c.avi', 'GPS/g.nmea')
+
+    assert relative_matches(card, PathPattern('DCIM/**').iter_matches(card)) == [
+        'DCIM/100/b.avi', 'DCIM/100/x/c.avi', 'DCIM/a.avi',
+    ]
+    assert relative_matches(card, PathPattern('**').iter_matches(card)) == [
+        'DCIM/100/b.avi', 'DCIM/100/x/c.avi', 'DCIM/a.avi', 'GPS/g.nmea',
+    ]
+    # Directory itself is not a match
+    assert not PathPattern('DCIM/**').match(('DCIM',))
+
+
+def test_trailing_double_star_excludes_directory_contents(tmp_path):
+    card = make_card(tmp_path, 'DCIM/a.avi', 'DCIM/100/b.avi', 'DCIM/100/x/c.avi')
+    matcher = RuleMatcher([FileRule(['**/*.avi'], ['DCIM/100/**'])])
+
+    assert relative_matches(card, matcher.iter_matches(card)) == ['DCIM/a.avi']
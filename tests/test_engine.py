@@ -0,0 +1,318 @@
+import os
+import sys
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from dvrmanager import engine as engine_module, retention
+from dvrmanager.catalog import Catalog
+from dvrmanager.dedup import BlobStore
+from dvrmanager.engine import Engine
+from dvrmanager.fs import FSManager
+from dvrmanager.index import ImportIndex
+from dvrmanager.journal import TransferJournal
+from dvrmanager.metrics import MetricsRecorder
+from dvrmanager.retention import InsufficientSpaceError, Retention, RetentionIndex
+from dvrmanager.settings import ExportItem, Settings, SettingsStore
+
+DRIVE_NAME = 'CARD'
+
+
+class DirectoryFS(FSManager):
+    def __init__(self, root: Path):
+        self._root = root
+
+    def drive_path(self, drive_name: str) -> Optional[Path]:
+        return self._root
+
+    def drive_exists(self, drive_name: str) -> bool:
+        return self._root.exists()
+
+    def unmount(self, drive_name: str):
+        pass
+
+
+@pytest.fixture
+def card(tmp_path):
+    card = tmp_path / 'card'
+    card.mkdir()
+    return card
+
+
+@pytest.fixture
+def make_engine(tmp_path, card):
+    engines = []
+
+    def make_engine(*export_items: ExportItem, **settings) -> Engine:
+        state = tmp_path / 'state'
+        engine = Engine(
+            SettingsStore(Settings(
+                target_directory=tmp_path / 'archive', export_items=export_items, **{'min_free_space': 0, **settings},
+            )),
+            fs=DirectoryFS(card),
+            index=ImportIndex(state / 'index.sqlite3'),
+            metrics=MetricsRecorder(state / 'stats'),
+            catalog=Catalog(state / 'catalog.sqlite3'),
+            retention=Retention(RetentionIndex(state / 'retention.sqlite3')),
+            blob_store=BlobStore(state / 'blobs.sqlite3'),
+            journal=TransferJournal(state / 'journal.sqlite3'),
+        )
+        engines.append(engine)
+        return engine
+
+    yield make_engine
+    for engine in engines:
+        engine.shutdown(wait=True)
+
+
+def write(path: Path, data: bytes) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def run_import(engine: Engine) -> Path:
+    job = engine.create_job(DRIVE_NAME, 'test')
+    job.run()
+    return engine.session_directories(DRIVE_NAME, 'test')[0]
+
+
+def test_files_with_same_name_in_different_directories_are_kept(card, make_engine):
+    write(card / 'NORMAL' / '0001.avi', b'normal')
+    write(card / 'EVENT' / '0001.avi', b'event')
+    engine = make_engine(ExportItem(drive_name=DRIVE_NAME, drive_path=Path('*/*.avi'), unmount=False))
+
+    session = run_import(engine)
+
+    assert (session / 'NORMAL' / '0001.avi').read_bytes() == b'normal'
+    assert (session / 'EVENT' / '0001.avi').read_bytes() == b'event'
+    assert not list(card.rglob('*.avi'))
+
+
+def test_export_items_route_files_with_same_name_to_their_destinations(card, make_engine):
+    write(card / 'NORMAL' / '0001.avi', b'normal')
+    write(card / 'EVENT' / '0001.avi', b'event')
+    engine = make_engine(
+        ExportItem(drive_name=DRIVE_NAME, drive_path=Path('EVENT/*.avi'), destination='locked', unmount=False),
+        ExportItem(drive_name=DRIVE_NAME, drive_path=Path('NORMAL/*.avi'), destination='video', unmount=False),
+    )
+
+    session = run_import(engine)
+
+    assert (session / 'video' / 'NORMAL' / '0001.avi').read_bytes() == b'normal'
+    assert (session / 'locked' / 'EVENT' / '0001.avi').read_bytes() == b'event'
+
+
+def test_file_with_destination_taken_by_another_export_item_is_not_imported(card, make_engine):
+    write(card / 'y' / 'z.avi', b'first')
+    write(card / 'z.avi', b'second')
+    engine = make_engine(
+        ExportItem(drive_name=DRIVE_NAME, drive_path=Path('y/*.avi'), destination='x', unmount=False),
+        ExportItem(drive_name=DRIVE_NAME, drive_path=Path('*.avi'), destination='x/y', unmount=False),
+    )
+
+    plan = engine.plan(DRIVE_NAME, 'test')
+    [planned] = plan.files
+    [skipped] = plan.skipped
+    data = planned.source.read_bytes()
+    session = run_import(engine)
+
+    assert skipped.reason == f'same destination as {planned.source}'
+    assert (session / 'x' / 'y' / 'z.avi').read_bytes() == data
+    assert skipped.source.exists()
+
+
+def test_session_durability_verifies_copies_without_flushing_each_file(card, make_engine, monkeypatch):
+    write(card / 'DCIM' / '0001.avi', b'first')
+    write(card / 'DCIM' / '0002.avi', b'second')
+    engine = make_engine(ExportItem(drive_name=DRIVE_NAME, drive_path=Path('DCIM/*.avi'), unmount=False))
+    fsync = os.fsync
+    flushed = []
+    monkeypatch.setattr(os, 'fsync', lambda fd: (flushed.append(fd), fsync(fd)))
+
+    session = run_import(engine)
+
+    assert (session / 'DCIM' / '0001.avi').read_bytes() == b'first'
+    assert not flushed
+    assert not list(card.rglob('*.avi'))
+
+
+def test_files_are_not_recorded_or_deleted_if_session_sync_fails(card, make_engine, monkeypatch):
+    write(card / 'DCIM' / '0001.avi', b'first')
+    engine = make_engine(ExportItem(drive_name=DRIVE_NAME, drive_path=Path('DCIM/*.avi'), unmount=False))
+
+    def sync_filesystem(path: Path) -> bool:
+        raise OSError('sync failed')
+
+    monkeypatch.setattr(engine_module, 'sync_filesystem', sync_filesystem)
+    run_import(engine)
+
+    assert (card / 'DCIM' / '0001.avi').exists()
+    assert [planned.source for planned in engine.plan(DRIVE_NAME, 'test').files] == [card / 'DCIM' / '0001.avi']
+
+
+def old_session(tmp_path: Path) -> Path:
+    return write(tmp_path / 'archive' / '2020-01-01' / 'default' / 'C' / 'clip.avi', b'old').parent
+
+
+def test_low_free_space_refuses_import_without_evicting(tmp_path, card, make_engine, monkeypatch):
+    write(card / 'DCIM' / '0001.avi', b'first')
+    session = old_session(tmp_path)
+    engine = make_engine(ExportItem(drive_name=DRIVE_NAME, drive_path=Path('DCIM/*.avi'), unmount=False),
+                         min_free_space=1)
+    monkeypatch.setattr(engine_module, 'free_space', lambda path: 1024 ** 2)
+    monkeypatch.setattr(retention, 'free_space', lambda path: 1024 ** 2)
+
+    with pytest.raises(InsufficientSpaceError):
+        engine.create_job(DRIVE_NAME, 'test')
+
+    assert (session / 'clip.avi').exists()
+
+
+def test_low_free_space_evicts_oldest_sessions_when_enabled(tmp_path, card, make_engine, monkeypatch):
+    write(card / 'DCIM' / '0001.avi', b'first')
+    session = old_session(tmp_path)
+    engine = make_engine(ExportItem(drive_name=DRIVE_NAME, drive_path=Path('DCIM/*.avi'), unmount=False),
+                         min_free_space=1, retention_free_space=True)
+    free = lambda path: 1024 ** 2 if session.exists() else 2 * 1024 ** 3
+    monkeypatch.setattr(engine_module, 'free_space', free)
+    monkeypatch.setattr(retention, 'free_space', free)
+
+    assert engine.create_job(DRIVE_NAME, 'test') is not None
+    assert not session.exists()
+
+
+@pytest.mark.parametrize('label', ['car/1', '..', 'C:\\car'])
+def test_label_is_a_single_session_directory_level(tmp_path, make_engine, label):
+    engine = make_engine()
+
+    [directory] = engine.session_directories(DRIVE_NAME, label)
+
+    assert directory.parents[2] == tmp_path / 'archive'
+
+
+def test_session_that_does_not_fit_is_refused_before_copying(tmp_path, card, make_engine, monkeypatch):
+    write(card / 'DCIM' / '0001.avi', bytes(4096))
+    session = old_session(tmp_path)
+    engine = make_engine(ExportItem(drive_name=DRIVE_NAME, drive_path=Path('DCIM/*.avi'), unmount=False),
+                         retention_free_space=True)
+    monkeypatch.setattr(engine_module, 'free_space', lambda path: 1024)
+    monkeypatch.setattr(retention, 'free_space', lambda path: 1024)
+
+    run_import(engine)
+
+    assert (card / 'DCIM' / '0001.avi').exists()
+    assert not engine.session_directories(DRIVE_NAME, 'test')[0].exists()
+    assert (session / 'clip.avi').exists()
+
+
+def test_sessions_of_running_imports_are_not_evicted(card, make_engine, monkeypatch):
+    engine = make_engine(ExportItem(drive_name=DRIVE_NAME, drive_path=Path('DCIM/*.avi'), unmount=False),
+                         min_free_space=1, retention_free_space=True)
+    [running] = engine.session_directories('OTHER', 'test')
+    write(running / 'clip.avi', b'running')
+    free = {'space': 2 * 1024 ** 3}
+    monkeypatch.setattr(engine_module, 'free_space', lambda path: free['space'])
+    monkeypatch.setattr(retention, 'free_space', lambda path: free['space'])
+    engine.reserve_space([running], 0)
+    free['space'] = 1024 ** 2
+
+    with pytest.raises(InsufficientSpaceError):
+        engine.create_job(DRIVE_NAME, 'test')
+
+    assert (running / 'clip.avi').exists()
+
+
+def test_session_is_synced_file_by_file_off_linux(card, make_engine, monkeypatch):
+    write(card / 'DCIM' / '0001.avi', b'first')
+    engine = make_engine(ExportItem(drive_name=DRIVE_NAME, drive_path=Path('DCIM/*.avi'), unmount=False))
+    monkeypatch.setattr(sys, 'platform', 'win32')
+
+    session = run_import(engine)
+
+    assert (session / 'DCIM' / '0001.avi').read_bytes() == b'first'
+    assert not (card / 'DCIM' / '0001.avi').exists()
+
+
+class Interrupted(Exception):
+    pass
+
+
+def interrupt_after_checkpoint(engine: Engine, monkeypatch) -> Path:
+    """
+    Import card, failing copy right after its first checkpoint is journaled as if the process was killed there.
+    Return session directory.
+    """
+    checkpoint = TransferJournal.checkpoint
+
+    def checkpoint_and_fail(journal, *args):
+        checkpoint(journal, *args)
+        raise Interrupted()
+
+    with monkeypatch.context() as patch:
+        patch.setattr(TransferJournal, 'checkpoint', checkpoint_and_fail)
+        return run_import(engine)
+
+
+RESUMABLE = dict(checkpoint_size=64 * 1024, copy_buffer_size=16 * 1024, kernel_copy=False)
+
+
+def test_interrupted_copy_resumes_from_its_last_checkpoint(card, make_engine, monkeypatch):
+    data = os.urandom(512 * 1024)
+    source = write(card / 'DCIM' / '0001.avi', data)
+    engine = make_engine(ExportItem(drive_name=DRIVE_NAME, drive_path=Path('DCIM/*.avi'), unmount=False), **RESUMABLE)
+    session = interrupt_after_checkpoint(engine, monkeypatch)
+    partial = session / 'DCIM' / '.0001.avi.part'
+    assert partial.stat().st_size >= 64 * 1024
+    assert source.exists()
+
+    job = engine.create_job(DRIVE_NAME, 'test')
+    messages = []
+    job.progress_str = messages.append
+    job.run()
+
+    assert 'Resuming 1 interrupted transfers from CARD' in messages
+    assert (session / 'DCIM' / '0001.avi').read_bytes() == data
+    assert not partial.exists()
+    assert not source.exists()
+
+
+def grow(path: Path):
+    with open(path, 'ab') as f:
+        f.write(b'more')
+
+
+def touch(path: Path):
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+@pytest.mark.parametrize('change', [grow, touch])
+def test_changed_source_restarts_interrupted_copy_from_start(card, make_engine, monkeypatch, change):
+    source = write(card / 'DCIM' / '0001.avi', os.urandom(512 * 1024))
+    engine = make_engine(ExportItem(drive_name=DRIVE_NAME, drive_path=Path('DCIM/*.avi'), unmount=False), **RESUMABLE)
+    session = interrupt_after_checkpoint(engine, monkeypatch)
+    partial = session / 'DCIM' / '.0001.avi.part'
+    assert partial.exists()
+    change(source)
+
+    job = engine.create_job(DRIVE_NAME, 'test')
+    resume_points = job.start_journal([(source, source.stat())])
+
+    assert resume_points[source].offset == 0
+    assert not partial.exists()
+
+
+def test_changed_session_directory_restarts_interrupted_copy_from_start(card, make_engine, monkeypatch):
+    source = write(card / 'DCIM' / '0001.avi', os.urandom(512 * 1024))
+    engine = make_engine(ExportItem(drive_name=DRIVE_NAME, drive_path=Path('DCIM/*.avi'), unmount=False), **RESUMABLE)
+    session = interrupt_after_checkpoint(engine, monkeypatch)
+    partial = session / 'DCIM' / '.0001.avi.part'
+    assert partial.exists()
+
+    job = engine.create_job(DRIVE_NAME, 'other')
+    resume_points = job.start_journal([(source, source.stat())])
+
+    assert resume_points[source].offset == 0
+    assert not partial.exists()
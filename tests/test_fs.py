@@ -0,0 +1,14 @@
+import os
+import sys
+
+from dvrmanager.fs import sync_filesystem
+
+
+def test_sync_filesystem_is_not_supported_off_linux(tmp_path, monkeypatch):
+    def open_directory(path, flags, *args):
+        raise PermissionError(13, 'Permission denied', str(path))
+
+    monkeypatch.setattr(sys, 'platform', 'win32')
+    monkeypatch.setattr(os, 'open', open_directory)
+
+    assert sync_filesystem(tmp_path) is False
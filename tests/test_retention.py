@@ -0,0 +1,46 @@
+import functools
+import hashlib
+import os
+from pathlib import Path
+
+from dvrmanager import retention
+from dvrmanager.dedup import BlobStore
+from dvrmanager.retention import Retention, RetentionIndex
+
+MIB = 1024 * 1024
+
+
+def used_space(root: Path) -> int:
+    """Bytes taken by files under `root`, counting hardlinked files once"""
+    inodes = {}
+    for directory, _, files in os.walk(root):
+        for name in files:
+            stat = os.stat(os.path.join(directory, name))
+            inodes[stat.st_dev, stat.st_ino] = stat.st_size
+    return sum(inodes.values())
+
+
+def test_evicting_deduplicated_sessions_frees_their_stored_copies(tmp_path, monkeypatch):
+    root = tmp_path / 'archive'
+    store = BlobStore(tmp_path / 'blobs.sqlite3')
+    for day in range(1, 6):
+        session = root / f'2020-01-0{day}' / 'default' / 'CARD'
+        session.mkdir(parents=True)
+        data = bytes([day]) * MIB
+        path = session / 'clip.avi'
+        path.write_bytes(data)
+        store.add(root, path, hashlib.blake2b(data).hexdigest())
+
+    # Filesystem of 6 MiB holding 5 MiB of archive
+    monkeypatch.setattr(retention, 'free_space', lambda path: 6 * MIB - used_space(root))
+    index = RetentionIndex(tmp_path / 'retention.sqlite3')
+    try:
+        evicted = Retention(index).enforce(
+            root, min_free=2 * MIB, after_evict=functools.partial(store.collect, root),
+        )
+    finally:
+        index.close()
+        store.close()
+
+    assert [session.date for session in evicted] == ['2020-01-01']
+    assert used_space(root) == 4 * MIB
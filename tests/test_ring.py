@@ -0,0 +1,40 @@
+import multiprocessing
+import pickle
+import time
+
+import pytest
+
+from dvrmanager.ring import RingBuffer
+
+
+def produce(name, lock, count):
+    ring = RingBuffer(name, lock=lock)
+    try:
+        for i in range(count):
+            # Records of varying size wrap around the ring at different offsets
+            ring.put(pickle.dumps((i, bytes([i % 256]) * (i % 97))), block=True, timeout=30)
+    finally:
+        ring.close()
+
+
+@pytest.mark.parametrize('synchronized', [False, True])
+def test_records_pass_between_processes_in_order(synchronized):
+    count = 20000
+    ring = RingBuffer(capacity=4096, synchronized=synchronized)
+    assert (ring.lock is not None) == synchronized
+    context = multiprocessing.get_context('spawn')
+    process = context.Process(target=produce, args=(ring.name, ring.lock, count))
+    process.start()
+    try:
+        received = []
+        deadline = time.monotonic() + 60
+        while len(received) < count and time.monotonic() < deadline:
+            received.extend(pickle.loads(data) for data in ring.get())
+        process.join(10)
+    finally:
+        if process.is_alive():
+            process.kill()
+        ring.close()
+
+    assert process.exitcode == 0
+    assert received == [(i, bytes([i % 256]) * (i % 97)) for i in range(count)]
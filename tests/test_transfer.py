@@ -0,0 +1,75 @@
+import threading
+import time
+from typing import Callable, Dict, Hashable, List
+
+from dvrmanager.transfer import TransferScheduler
+
+
+class Concurrency:
+    """
+    Tracks the most tasks running at once by key
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: Dict[Hashable, int] = {}
+        self.peak: Dict[Hashable, int] = {}
+
+    def task(self, key: Hashable) -> Callable[[], None]:
+        def run():
+            with self._lock:
+                self._active[key] = self._active.get(key, 0) + 1
+                self.peak[key] = max(self.peak.get(key, 0), self._active[key])
+            time.sleep(0.02)
+            with self._lock:
+                self._active[key] -= 1
+
+        return run
+
+
+def test_tasks_of_one_source_run_within_its_limit():
+    scheduler = TransferScheduler(max_workers=4, per_source_limit=2, per_destination_limit=4)
+    concurrency = Concurrency()
+    try:
+        futures = [scheduler.submit(concurrency.task('card'), 'card', f'disk-{i}') for i in range(8)]
+        for future in futures:
+            future.result(timeout=10)
+    finally:
+        scheduler.shutdown()
+
+    assert concurrency.peak['card'] == 2
+
+
+def test_tasks_writing_one_destination_run_within_its_limit():
+    scheduler = TransferScheduler(max_workers=8, per_source_limit=1, per_destination_limit=2)
+    concurrency = Concurrency()
+    try:
+        futures = [scheduler.submit(concurrency.task('disk'), f'card-{i % 4}', 'disk') for i in range(8)]
+        for future in futures:
+            future.result(timeout=10)
+    finally:
+        scheduler.shutdown()
+
+    assert concurrency.peak['disk'] == 2
+
+
+def test_sources_with_higher_priority_are_served_first():
+    scheduler = TransferScheduler(max_workers=1)
+    started = threading.Event()
+    release = threading.Event()
+    order: List[str] = []
+    try:
+        blocker = scheduler.submit(lambda: (started.set(), release.wait(10)), 'blocker', 'disk')
+        assert started.wait(10)
+        futures = [
+            scheduler.submit(lambda source=source: order.append(source), source, 'disk')
+            for source in ('low', 'high', 'low', 'high')
+        ]
+        scheduler.set_priority('high', 1)
+        release.set()
+        for future in (blocker, *futures):
+            future.result(timeout=10)
+    finally:
+        scheduler.shutdown()
+
+    assert order == ['high', 'high', 'low', 'low']
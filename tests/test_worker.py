@@ -0,0 +1,58 @@
+from pathlib import Path
+
+from dvrmanager import worker
+from dvrmanager.settings import Settings
+from dvrmanager.worker import WorkerProcess
+
+
+class ExitedProcess:
+    exitcode = 1
+
+    def is_alive(self) -> bool:
+        return False
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_failing_worker_is_restarted_with_backoff_and_then_given_up(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(worker.time, 'monotonic', clock)
+    process = WorkerProcess(Settings(target_directory=Path('archive'), export_items=()), restart_delay=1.0,
+                            max_restart_delay=60.0, max_restarts=3)
+    started = []
+
+    def start(assume_attached=()):
+        started.append(clock.now)
+        process._process = ExitedProcess()
+        process._started_at = clock.now
+
+    monkeypatch.setattr(process, 'start', start)
+    process.start()
+    for _ in range(100):
+        process.ensure_running()
+        clock.now += 0.5
+
+    # Exits are noticed on the poll after them
+    assert started == [0.0, 1.0, 3.5, 8.0]
+    entries = [text for kind, text in process.events() if kind == 'entry']
+    assert [entry.rsplit(' ', 1)[-1] for entry in entries[:3]] == ['1s', '2s', '4s']
+    assert 'not restarting' in entries[3]
+    assert len(entries) == 4
+
+
+def test_unchanged_settings_are_not_sent(monkeypatch):
+    settings = Settings(target_directory=Path('archive'), export_items=())
+    process = WorkerProcess(settings)
+    sent = []
+    monkeypatch.setattr(process, '_send', lambda *command: sent.append(command[0]))
+
+    process.update_settings(settings.copy())
+    process.update_settings(settings.copy(update={'transfer_workers': 2}))
+
+    assert sent == ['settings']